@@ -0,0 +1,159 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from records import Kline
+from utils import setup_logging, interval_to_ms
+
+logger = setup_logging(__name__)
+
+# epoch starts on Thursday, exchange weeks start on Monday 00:00 UTC
+WEEK_OFFSET = 4 * 24 * 60 * 60 * 1000
+
+
+def bucket_start(open_time: int, interval: str) -> int:
+    """Returns open time of interval candle containing open_time
+
+    Args:
+        open_time (int): ms
+        interval (str): kline interval e.g. "4h"
+
+    Returns:
+        int: open time aligned to exchange boundary in ms
+    """
+    length = interval_to_ms(interval)
+    offset = WEEK_OFFSET if interval.endswith("w") else 0
+    return open_time - (open_time - offset) % length
+
+
+class _Bucket:
+    __slots__ = ("open_time", "open", "high", "low", "close", "volume", "quote_asset_volume", "trades_amount",
+                 "next_open_time", "complete")
+
+    def __init__(self, open_time, kline, base_ms):
+        self.open_time = open_time
+        self.open = kline.open
+        self.high = kline.high
+        self.low = kline.low
+        self.close = kline.close
+        self.volume = kline.volume
+        self.quote_asset_volume = kline.quote_asset_volume
+        self.trades_amount = kline.trades_amount
+        self.next_open_time = kline.open_time + base_ms
+        # bucket joined mid-way (start up, unsubscribed period) misses candles
+        self.complete = kline.open_time == open_time
+
+    def add(self, kline, base_ms):
+        if kline.open_time != self.next_open_time:
+            self.complete = False
+        self.next_open_time = kline.open_time + base_ms
+
+        self.high = max(self.high, kline.high)
+        self.low = min(self.low, kline.low)
+        self.close = kline.close
+        self.volume += kline.volume
+        self.quote_asset_volume += kline.quote_asset_volume
+        self.trades_amount += kline.trades_amount
+
+    def to_kline(self, pair, interval, length, closed):
+        return Kline(
+            self.open_time, self.open, self.high, self.low, self.close, self.volume,
+            self.open_time + length - 1, self.quote_asset_volume, self.trades_amount,
+            pair, interval, closed,
+        )
+
+
+class TimeframeAggregator:
+    """
+    Builds higher interval candles of pairs from closed base interval klines.
+
+    Only base stream (e.g. 1m) is subscribed, every closed base kline
+    extends in-progress candle of each higher interval and closes it on
+    the last base candle of the interval. Candles are aligned to exchange
+    boundaries (UTC, weeks from Monday). Candle missing some base candles,
+    e.g. the first one after start up, is not emitted.
+    """
+
+    def __init__(self, base: str = "1m"):
+        """
+        Args:
+            base (str, optional): interval of subscribed stream. Defaults to "1m".
+        """
+        self.base = base
+        self.base_ms = interval_to_ms(base)
+
+        self.intervals: Dict[str, List[Tuple[str, int]]] = {}     # pair -> [(interval, length ms)]
+        self.buckets: Dict[Tuple[str, str], _Bucket] = {}         # (pair, interval) -> in-progress candle
+        self.skipped = 0            # incomplete candles not emitted
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    def add(self, pair: str, intervals: Iterable[str]) -> None:
+        """Aggregates intervals of pair
+
+        Raises:
+            ValueError: interval is not a multiple of base interval
+
+        Args:
+            pair (str): pair e.g. "btcusdt"
+            intervals (Iterable[str]): intervals e.g. ["5m", "1h"], base interval itself is ignored
+        """
+        pair = pair.upper()
+        current = self.intervals.setdefault(pair, [])
+        for interval in intervals:
+            length = interval_to_ms(interval)
+            if length % self.base_ms:
+                raise ValueError(f"Interval {interval} is not a multiple of {self.base}")
+            if length == self.base_ms or any(known == interval for known, _ in current):
+                continue
+            current.append((interval, length))
+
+    def remove(self, pair: str) -> None:
+        pair = pair.upper()
+        for interval, _ in self.intervals.pop(pair, ()):
+            self.buckets.pop((pair, interval), None)
+
+    def update(self, kline: Kline) -> List[Kline]:
+        """Adds closed base kline
+
+        Args:
+            kline (Kline): kline of base interval, others are ignored
+
+        Returns:
+            List[Kline]: higher interval klines closed by this kline
+        """
+        if not kline.closed or kline.interval != self.base:
+            return []
+
+        closed = []
+        for interval, length in self.intervals.get(kline.pair, ()):
+            key = (kline.pair, interval)
+            start = bucket_start(kline.open_time, interval)
+
+            bucket = self.buckets.get(key, None)
+            if bucket is None or bucket.open_time != start:
+                if bucket is not None:
+                    # last base candles of previous bucket never came
+                    self.skipped += 1
+                bucket = self.buckets[key] = _Bucket(start, kline, self.base_ms)
+            else:
+                bucket.add(kline, self.base_ms)
+
+            if kline.open_time + self.base_ms == start + length:
+                del self.buckets[key]
+                if bucket.complete:
+                    closed.append(bucket.to_kline(kline.pair, interval, length, True))
+                else:
+                    self.skipped += 1
+                    self.logger.debug(f"Skipped incomplete {kline.pair} {interval} candle {start}")
+
+        return closed
+
+    def partial(self, pair: str, interval: str) -> Optional[Kline]:
+        """Returns in-progress candle built from closed base candles so far
+
+        Returns:
+            Kline: unclosed kline, None if no base candle of current interval was seen
+        """
+        bucket = self.buckets.get((pair.upper(), interval), None)
+        if bucket is None:
+            return None
+        return bucket.to_kline(pair.upper(), interval, interval_to_ms(interval), False)
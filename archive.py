@@ -0,0 +1,295 @@
+import json
+import os
+
+import numpy as np
+
+from records import Kline
+from utils import setup_logging, ms_to_datetime, lazy_import
+
+logger = setup_logging(__name__)
+
+# SQLAlchemy is loaded only by export and import of candles
+database = lazy_import("database")
+
+# every column is stored as float64, times as epoch ms are exact up to year 287396
+COLUMNS = (
+    "open_time", "open", "high", "low", "close", "volume",
+    "close_time", "quote_asset_volume", "trades_amount",
+)
+COLUMN_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+
+INDEX_FILE = "index.json"
+
+
+def read_index(path):
+    """Reads segments listed in index of archive directory
+
+    Args:
+        path (str): archive directory
+
+    Returns:
+        list: dicts with file, start, end, rows, empty if there is no index yet
+    """
+    index_path = os.path.join(path, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path) as f:
+        return json.load(f)["segments"]
+
+
+def write_index(path, segments, **fields):
+    """Replaces index of archive directory atomically, readers never see partial index
+
+    Args:
+        path (str): archive directory
+        segments (list): dicts with file, start, end, rows in chronological order
+        fields: other values stored in index e.g. columns
+    """
+    index_path = os.path.join(path, INDEX_FILE)
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({**fields, "segments": segments}, f)
+    os.replace(tmp_path, index_path)
+
+
+class ArchiveSeries:
+    """
+    Append-only columnar archive of closed candles of single pair and interval.
+
+    Candles are written in segments, .npy files holding (columns x rows)
+    float64 array, so every column of a segment is contiguous. Segments are
+    listed in small json index. Reads memory-map segments, a range inside
+    single segment is returned as zero-copy views, `compact` merges small
+    segments so that whole history becomes one segment.
+    """
+
+    def __init__(self, path, segment_rows=1440):
+        os.makedirs(path, exist_ok=True)
+
+        self.path = path
+        self.segment_rows = segment_rows
+        self.segments = read_index(path)    # dicts with file, start, end, rows
+        self.buffer = []                    # rows waiting for next segment
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    @property
+    def last_open_time(self):
+        if self.buffer:
+            return self.buffer[-1][0]
+        return self.segments[-1]["end"] if self.segments else None
+
+    def _write_index(self):
+        write_index(self.path, self.segments, columns=COLUMNS)
+
+    def append(self, kline):
+        """Buffers closed kline, segment is written once buffer holds segment_rows candles
+
+        Args:
+            kline (models.Kline): closed kline, older than archived ones are ignored
+        """
+        last = self.last_open_time
+        if last is not None and kline.open_time <= last:
+            return
+
+        self.buffer.append((
+            kline.open_time, kline.open, kline.high, kline.low, kline.close, kline.volume,
+            kline.close_time, kline.quote_asset_volume, kline.trades_amount,
+        ))
+        if len(self.buffer) >= self.segment_rows:
+            self.flush()
+
+    def append_columns(self, columns):
+        """Writes candles given as columns (see DbManager.load_range) as new segment
+
+        Args:
+            columns (dict): column name -> np.ndarray, in chronological order
+        """
+        self.flush()
+
+        data = np.vstack([np.asarray(columns[name], dtype=np.float64) for name in COLUMNS])
+        last = self.last_open_time
+        if last is not None:
+            data = data[:, data[0] > last]
+        self._write_segment(data)
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        data = np.array(self.buffer, dtype=np.float64).T
+        self.buffer = []
+        self._write_segment(data)
+
+    def _save_segment(self, data):
+        """Saves segment file without adding it to index
+
+        Args:
+            data (np.ndarray): (columns, rows) matrix sorted by open time
+
+        Returns:
+            dict: index entry of saved segment
+        """
+        start, end = int(data[0, 0]), int(data[0, -1])
+        name = f"{start}_{end}.npy"
+        np.save(os.path.join(self.path, name), np.ascontiguousarray(data))
+        return {"file": name, "start": start, "end": end, "rows": data.shape[1]}
+
+    def _write_segment(self, data):
+        if data.shape[1] == 0:
+            return
+
+        self.segments.append(self._save_segment(data))
+        self._write_index()
+
+    def _open_segment(self, segment):
+        return np.load(os.path.join(self.path, segment["file"]), mmap_mode="r")
+
+    def read(self, start=None, end=None):
+        """Reads archived candles with open time in [start, end)
+
+        Range covered by single segment is returned as zero-copy views of
+        memory-mapped file, ranges spanning more segments are concatenated.
+
+        Args:
+            start (int, optional): first open time in ms
+            end (int, optional): open time in ms where range ends, exclusive
+
+        Returns:
+            dict: column name -> np.ndarray
+        """
+        parts = []
+        for segment in self.segments:
+            if start is not None and segment["end"] < start:
+                continue
+            if end is not None and segment["start"] >= end:
+                break
+
+            data = self._open_segment(segment)
+            first = 0 if start is None else np.searchsorted(data[0], start)
+            last = data.shape[1] if end is None else np.searchsorted(data[0], end)
+            parts.append(data[:, first:last])
+
+        if not parts:
+            data = np.empty((len(COLUMNS), 0), dtype=np.float64)
+        elif len(parts) == 1:
+            data = parts[0]
+        else:
+            data = np.concatenate(parts, axis=1)
+
+        return {name: data[i] for i, name in enumerate(COLUMNS)}
+
+    def compact(self, max_rows=10_000_000):
+        """Merges consecutive segments into segments of up to max_rows candles
+
+        Args:
+            max_rows (int, optional): max rows of merged segment. Defaults to 10M.
+        """
+        self.flush()
+
+        groups, group, rows = [], [], 0
+        for segment in self.segments:
+            if group and rows + segment["rows"] > max_rows:
+                groups.append(group)
+                group, rows = [], 0
+            group.append(segment)
+            rows += segment["rows"]
+        if group:
+            groups.append(group)
+
+        if len(groups) == len(self.segments):
+            return
+
+        # index is replaced only once all merged files exist, old files are
+        # removed only once index no longer refers to them
+        segments = []
+        for group in groups:
+            if len(group) == 1:
+                segments.append(group[0])
+                continue
+            data = np.concatenate([self._open_segment(segment) for segment in group], axis=1)
+            segments.append(self._save_segment(data))
+
+        old, self.segments = self.segments, segments
+        self._write_index()
+
+        # readers holding memory maps keep access to unlinked files
+        kept = {segment["file"] for segment in self.segments}
+        for segment in old:
+            if segment["file"] not in kept:
+                os.remove(os.path.join(self.path, segment["file"]))
+
+        self.logger.info(f"Compacted {len(old)} segments into {len(self.segments)}")
+
+
+class CandleArchive:
+    """
+    Archive series keyed by (pair, interval), stored under root/PAIR/interval
+    """
+
+    def __init__(self, root="archive", segment_rows=1440):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.series = {}
+
+    def get(self, pair, interval):
+        key = (pair.upper(), interval)
+        series = self.series.get(key, None)
+
+        if series is None:
+            path = os.path.join(self.root, *key)
+            series = self.series[key] = ArchiveSeries(path, self.segment_rows)
+
+        return series
+
+    def append(self, kline):
+        self.get(kline.pair, kline.interval).append(kline)
+
+    def flush(self):
+        for series in self.series.values():
+            series.flush()
+
+    def compact(self):
+        for series in self.series.values():
+            series.compact()
+
+    def export_from_db(self, db, pair, interval, chunk_size=100000):
+        """Appends candles stored in database which are newer than archived ones
+
+        Args:
+            db (database.DbManager): database manager
+            pair (string): pair e.g. "BTCUSDT"
+            interval (string): kline interval e.g. "1m"
+            chunk_size (int, optional): rows per written segment. Defaults to 100000.
+        """
+        series = self.get(pair, interval)
+        series.flush()
+
+        last = series.last_open_time
+        start = None if last is None else ms_to_datetime(last + 1)
+
+        for chunk in db.iter_candles(pair, interval, start=start, chunk_size=chunk_size):
+            columns = {name: [getattr(row, name) for row in chunk] for name in COLUMNS}
+            columns["open_time"] = database.to_epoch_ms(columns["open_time"])
+            columns["close_time"] = database.to_epoch_ms(columns["close_time"])
+            series.append_columns(columns)
+
+    def import_to_db(self, db, pair, interval, chunk_size=10000):
+        """Upserts archived candles into database
+
+        Args:
+            db (database.DbManager): database manager
+            pair (string): pair e.g. "BTCUSDT"
+            interval (string): kline interval e.g. "1m"
+            chunk_size (int, optional): rows per transaction. Defaults to 10000.
+        """
+        columns = self.get(pair, interval).read()
+        rows = len(columns["open_time"])
+
+        for first in range(0, rows, chunk_size):
+            values = np.vstack([columns[name][first:first + chunk_size] for name in COLUMNS]).T
+            klines = [
+                Kline(int(v[0]), v[1], v[2], v[3], v[4], v[5], int(v[6]), v[7], int(v[8]), pair.upper(), interval, True)
+                for v in values.tolist()
+            ]
+            db.bulk_upsert([database.DbManager.to_row(kline.to_candlestick()) for kline in klines])
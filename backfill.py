@@ -0,0 +1,113 @@
+import asyncio
+
+from datetime import datetime, timedelta, timezone
+from time import time
+
+from exceptions import BadResponseError
+from utils import setup_logging, interval_to_ms, datetime_to_ms, lazy_import
+
+logger = setup_logging(__name__)
+
+aiohttp = lazy_import("aiohttp")
+
+
+class Backfill:
+    """
+    Fills historical candlesticks for many pairs and intervals concurrently.
+
+    Every series resumes from the newest candlestick already stored, the
+    missing range is split into pages of KLINES_LIMIT candlesticks which are
+    fetched concurrently on shared session. Request weight is throttled by
+    client rate limiter and pages are handed to client write-behind writer.
+    """
+
+    def __init__(self, client, concurrency=20, lookback=timedelta(days=30), max_buffered=20000):
+        """
+        Args:
+            client (binance.Binance): connector inside its async context
+            concurrency (int, optional): max requests in flight. Defaults to 20.
+            lookback (timedelta, optional): history fetched for series without stored candlesticks. Defaults to 30 days.
+            max_buffered (int, optional): writer buffer size at which fetching waits for flush. Defaults to 20000.
+        """
+        self.client = client
+        self.lookback = lookback
+        self.max_buffered = max_buffered
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        self.pages = 0
+        self.candlesticks = 0
+        self.failed = []            # (pair, interval, start_time) of failed pages
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    async def run(self, pairs, intervals, end_time=None):
+        """Backfills every pair and interval combination
+
+        Args:
+            pairs (list): pairs e.g. ["btcusdt"]
+            intervals (list): kline intervals e.g. ["1m", "1h"]
+            end_time (int, optional): backfill up to this time in ms. Defaults to now.
+        """
+        end_time = end_time or int(time() * 1000)
+        started = time()
+
+        pages = []
+        for pair in pairs:
+            for interval in intervals:
+                pages.extend(await self._plan(pair, interval, end_time))
+
+        self.logger.info(f"Backfilling {len(pages)} pages for {len(pairs)} pairs and {len(intervals)} intervals")
+        await asyncio.gather(*(self._fetch_page(*page) for page in pages))
+        await self.client.writer.flush()
+
+        self.logger.info(
+            f"Backfilled {self.candlesticks} candlesticks in {self.pages} pages "
+            f"in {time() - started:.1f}s, {len(self.failed)} pages failed"
+        )
+
+    async def _plan(self, pair, interval, end_time):
+        """Splits missing range of single series into pages
+
+        Returns:
+            list: (pair, interval, start_time, end_time) of every page
+        """
+        interval_ms = interval_to_ms(interval)
+
+        loop = asyncio.get_event_loop()
+        latest = await loop.run_in_executor(None, self.client.db.latest_open_time, pair, interval)
+
+        if latest is not None:
+            # newest stored candlestick is fetched again, it might not have been closed
+            start_time = datetime_to_ms(latest)
+        else:
+            start_time = end_time - int(self.lookback.total_seconds() * 1000)
+            start_time -= start_time % interval_ms
+
+        page_ms = self.client.KLINES_LIMIT * interval_ms
+        return [
+            (pair, interval, page_start, min(page_start + page_ms - 1, end_time))
+            for page_start in range(start_time, end_time, page_ms)
+        ]
+
+    async def _fetch_page(self, pair, interval, start_time, end_time):
+        async with self._semaphore:
+            try:
+                candlesticks = await self.client.fetch_candlesticks(
+                    pair, self.client.KLINES_LIMIT, interval, start_time, end_time, cache=False
+                )
+            except (BadResponseError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.logger.warning(f"Failed to fetch {pair} {interval} from {start_time}: {e}")
+                self.failed.append((pair, interval, start_time))
+                return
+
+        # in-progress candlestick is left to websocket stream
+        now = datetime.now(timezone.utc)
+        candlesticks = [c for c in candlesticks if c.close_time < now]
+
+        self.pages += 1
+        self.candlesticks += len(candlesticks)
+        self.client.writer.put(candlesticks)
+
+        # backpressure when database can't keep up
+        if len(self.client.writer.buffer) >= self.max_buffered:
+            await self.client.writer.flush()
@@ -0,0 +1,201 @@
+import itertools
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import database
+from ta import CrossoverDetector
+from utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# (open_time, open, high, low, close)
+Candle = Tuple[datetime, float, float, float, float]
+
+
+@dataclass(frozen=True)
+class BacktestConfig:
+    pair: str
+    interval: str
+    short_window: int
+    long_window: int
+    ma: str = "sma"                         # "sma" or "ema"
+    fee: float = 0.001                      # fee rate per fill
+    stop_loss: Optional[float] = None       # fraction below entry, e.g. 0.02
+    take_profit: Optional[float] = None     # fraction above entry, e.g. 0.05
+    trailing_stop: Optional[float] = None   # fraction below highest high since entry
+    initial_balance: float = 1000.0
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+
+@dataclass
+class Trade:
+    entry_time: datetime
+    entry_price: float
+    quantity: float
+    exit_time: Optional[datetime] = None
+    exit_price: Optional[float] = None
+    reason: Optional[str] = None            # "signal", "stop_loss", "take_profit", "trailing_stop", "end"
+    pnl: float = 0.0
+
+
+@dataclass
+class BacktestResult:
+    config: BacktestConfig
+    trades: List[Trade] = field(default_factory=list)
+    candles: int = 0
+    final_balance: float = 0.0
+    max_drawdown: float = 0.0
+
+    @property
+    def return_pct(self):
+        return (self.final_balance / self.config.initial_balance - 1) * 100
+
+
+class Backtest:
+    """
+    Replays candles through crossover detector used by live bot and
+    simulates long-only spot trading.
+
+    Signals are computed on candle close and filled at next candle open.
+    Stop loss, trailing stop and take profit are checked against candle
+    low/high, stop first as it is the conservative assumption.
+    """
+
+    def __init__(self, config: BacktestConfig):
+        self.config = config
+        self.detector = getattr(CrossoverDetector, config.ma)(config.short_window, config.long_window)
+
+        self.balance = config.initial_balance
+        self.trade = None           # open trade
+        self.pending = None         # signal to fill at next open
+        self.stop = None
+        self.target = None
+        self.peak_equity = config.initial_balance
+
+        self.result = BacktestResult(config)
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    def run(self, db: Optional[database.DbManager] = None) -> BacktestResult:
+        """Streams candles of configured pair and interval from database and replays them
+
+        Args:
+            db (database.DbManager, optional): database manager. Defaults to new instance.
+
+        Returns:
+            BacktestResult: result
+        """
+        db = db or database.DbManager()
+        chunks = db.iter_candles(self.config.pair, self.config.interval, self.config.start, self.config.end)
+
+        candles = (
+            (row.open_time, float(row.open), float(row.high), float(row.low), float(row.close))
+            for chunk in chunks
+            for row in chunk
+        )
+        return self.replay(candles)
+
+    def replay(self, candles: Iterable[Candle]) -> BacktestResult:
+        last = None
+        for candle in candles:
+            self._on_candle(candle)
+            last = candle
+
+        if self.trade is not None:
+            self._exit(last[0], last[4], "end")
+
+        self.result.final_balance = self.balance
+        return self.result
+
+    def _on_candle(self, candle: Candle):
+        open_time, open, high, low, close = candle
+        self.result.candles += 1
+
+        # fill signal from previous close
+        if self.pending == 1 and self.trade is None:
+            self._enter(open_time, open)
+        elif self.pending == -1 and self.trade is not None:
+            self._exit(open_time, open, "signal")
+        self.pending = None
+
+        if self.trade is not None:
+            self._check_exits(open_time, open, high, low)
+
+        if self.trade is not None and self.config.trailing_stop is not None:
+            self.stop = max(self.stop or 0.0, high * (1 - self.config.trailing_stop))
+
+        signal = self.detector.update(close, closed=True)
+        if signal is not None:
+            self.pending = signal.signal
+
+        self._update_drawdown(close)
+
+    def _check_exits(self, open_time, open, high, low):
+        if self.stop is not None and low <= self.stop:
+            # gap below stop fills at open
+            reason = "stop_loss" if self.config.trailing_stop is None else "trailing_stop"
+            self._exit(open_time, min(open, self.stop), reason)
+        elif self.target is not None and high >= self.target:
+            self._exit(open_time, max(open, self.target), "take_profit")
+
+    def _enter(self, time, price):
+        quantity = self.balance * (1 - self.config.fee) / price
+        self.trade = Trade(time, price, quantity)
+        self.balance = 0.0
+
+        if self.config.stop_loss is not None:
+            self.stop = price * (1 - self.config.stop_loss)
+        if self.config.trailing_stop is not None:
+            self.stop = max(self.stop or 0.0, price * (1 - self.config.trailing_stop))
+        if self.config.take_profit is not None:
+            self.target = price * (1 + self.config.take_profit)
+
+    def _exit(self, time, price, reason):
+        trade = self.trade
+        self.balance = trade.quantity * price * (1 - self.config.fee)
+
+        trade.exit_time = time
+        trade.exit_price = price
+        trade.reason = reason
+        trade.pnl = self.balance - trade.quantity * trade.entry_price / (1 - self.config.fee)
+        self.result.trades.append(trade)
+
+        self.trade = None
+        self.stop = None
+        self.target = None
+
+    def _update_drawdown(self, close):
+        equity = self.balance if self.trade is None else self.trade.quantity * close
+        self.peak_equity = max(self.peak_equity, equity)
+        drawdown = 1 - equity / self.peak_equity
+        self.result.max_drawdown = max(self.result.max_drawdown, drawdown)
+
+
+def run_backtest(config: BacktestConfig) -> BacktestResult:
+    """Runs backtest against database, entry point of sweep worker processes"""
+    # connections inherited from parent process must not be reused
+    database.get_engine().dispose(close=False)
+    return Backtest(config).run()
+
+
+def sweep(base: BacktestConfig, grid: Dict[str, List[Any]], processes: Optional[int] = None) -> List[BacktestResult]:
+    """Runs backtest for every combination of parameters in parallel
+
+    Args:
+        base (BacktestConfig): config with common parameters
+        grid (Dict[str, List[Any]]): parameter name -> values, e.g. {"short_window": [5, 10]}
+        processes (int, optional): worker processes. Defaults to CPU count.
+
+    Returns:
+        List[BacktestResult]: results in order of parameter combinations
+    """
+    names = list(grid)
+    configs = [replace(base, **dict(zip(names, values))) for values in itertools.product(*grid.values())]
+    configs = [config for config in configs if config.short_window < config.long_window]
+
+    logger.info(f"Running {len(configs)} backtests")
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(run_backtest, configs))
@@ -0,0 +1,55 @@
+"""
+Benchmark of order placement against in-process mock exchange.
+
+Places orders with OrderManager through signed REST requests and reports
+throughput and signal to ack latency percentiles.
+
+Usage:
+    python -m benchmarks.orders [orders] [max_in_flight]
+"""
+import asyncio
+import json
+import sys
+
+from time import perf_counter
+
+import numpy as np
+
+import binance
+from mock_exchange import MockExchange
+from orders import OrderManager
+
+
+async def bench(count, max_in_flight):
+    async with MockExchange(prices={"BTCUSDT": 30000.0}) as exchange:
+        client = binance.Binance(api_key=exchange.api_key, api_secret=exchange.api_secret)
+        client.API_URL = exchange.url
+        # bucket is sized for exchange limits, benchmark measures local overhead
+        client.rate_limiter = None
+
+        async with client:
+            manager = OrderManager(client, max_in_flight=max_in_flight)
+
+            started = perf_counter()
+            placed = await asyncio.gather(*(manager.place("BTCUSDT", "BUY", 0.001) for _ in range(count)))
+            elapsed = perf_counter() - started
+
+    latencies = np.array([order.latency for order in placed if order.latency is not None]) * 1000
+    return {
+        "orders": count,
+        "max_in_flight": max_in_flight,
+        "acked": len(latencies),
+        "orders_per_sec": round(count / elapsed),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "latency_ms_p99": round(float(np.percentile(latencies, 99)), 2),
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_in_flight = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print(json.dumps(asyncio.run(bench(count, max_in_flight))))
+
+
+if __name__ == "__main__":
+    main()
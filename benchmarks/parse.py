@@ -0,0 +1,79 @@
+"""
+Microbenchmark of kline frame parsing, frames/sec on single core.
+
+Compares legacy path (json module, ORM Candlestick with eager json
+conversion for every frame) with fast path (optional orjson, Kline record,
+ORM object only for closed klines).
+
+Usage:
+    python -m benchmarks.parse [frames]
+"""
+import json
+import sys
+
+from time import perf_counter
+
+from models import Candlestick, Kline
+from utils import convert_timestamp, json_loads
+
+CLOSED_EVERY = 100      # roughly 1% of frames close a kline
+
+
+def make_frames(count):
+    frames = []
+    start = 1600000000000
+    for i in range(count):
+        open_time = start + (i // CLOSED_EVERY) * 60000
+        frames.append(json.dumps({
+            "stream": "btcusdt@kline_1m",
+            "data": {
+                "e": "kline", "E": open_time + i % CLOSED_EVERY * 500, "s": "BTCUSDT",
+                "k": {
+                    "t": open_time, "T": open_time + 59999, "s": "BTCUSDT", "i": "1m",
+                    "f": 100, "L": 200, "o": "10500.10000000", "c": f"{10500 + i % 17}.25000000",
+                    "h": "10520.00000000", "l": "10490.00000000", "v": "12.34500000", "n": 100,
+                    "x": i % CLOSED_EVERY == CLOSED_EVERY - 1, "q": "129600.00000000",
+                    "V": "6.10000000", "Q": "64000.00000000", "B": "0"
+                }
+            }
+        }, separators=(",", ":")))
+    return frames
+
+
+def legacy_parse(frame):
+    data = json.loads(frame)["data"]
+    c = Candlestick.extract_candlestick_from_wss(data["k"])
+    c.json      # was built in Candlestick.__init__
+    convert_timestamp(data.get("E"))
+    return c
+
+
+def fast_parse(frame):
+    kline = Kline.from_wss(json_loads(frame)["data"]["k"])
+    if kline.closed:
+        kline.to_candlestick()
+    return kline
+
+
+def bench(parse, frames):
+    started = perf_counter()
+    for frame in frames:
+        parse(frame)
+    return len(frames) / (perf_counter() - started)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    frames = make_frames(count)
+
+    results = {
+        "frames": count,
+        "legacy_frames_per_sec": round(bench(legacy_parse, frames)),
+        "fast_frames_per_sec": round(bench(fast_parse, frames)),
+    }
+    results["speedup"] = round(results["fast_frames_per_sec"] / results["legacy_frames_per_sec"], 1)
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+End-to-end benchmark replaying recorded kline frames through the bot.
+
+Fixture is gzipped JSON lines of [receive offset ms, raw frame]. Frames are
+served by fake combined stream websocket server running in separate process
+and consumed by Binance connector through full parse -> TA -> persist
+pipeline writing to temporary SQLite database. Reports frames/sec,
+frame-to-signal latency (frame received to TA stage done) percentiles and
+peak RSS of the bot process as single JSON line, optionally appended to a
+file so results can be compared across commits.
+
+Usage:
+    python -m benchmarks.replay [--fixture PATH] [--speed X] [--output FILE]
+    python -m benchmarks.replay generate [--fixture PATH] [--pairs N] [--minutes N]
+    python -m benchmarks.replay record --pairs btcusdt,ethusdt [--fixture PATH] [--seconds N]
+
+Speed 0 replays as fast as possible, 1 in recorded time, 10 ten times faster.
+Default fixture is generated (random walk, seeded) when it doesn't exist.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import tempfile
+
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+
+from aiohttp import web
+from sqlalchemy import func, select
+
+import binance
+import database
+import indicators
+import ta
+from models import Candlestick
+from utils import interval_to_ms
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "klines.jsonl.gz")
+
+FRAME_PERIOD = 2000     # ms between frames of single kline stream
+
+
+def load_fixture(path):
+    with gzip.open(path, "rt") as f:
+        return [json.loads(line) for line in f]
+
+
+def generate(path, pairs=10, intervals=("1m", "5m"), minutes=30, seed=1):
+    """Writes fixture of kline frames of random walk prices
+
+    Every stream gets frame each FRAME_PERIOD, staggered across streams,
+    last frame of candle is closed like on exchange.
+
+    Returns:
+        int: number of frames
+    """
+    rng = random.Random(seed)
+    symbols = [f"PAIR{i}USDT" for i in range(pairs)]
+    prices = {symbol: rng.uniform(1, 50000) for symbol in symbols}
+    start = 1600000000000
+    streams = [(symbol, interval) for symbol in symbols for interval in intervals]
+
+    frames = []
+    for tick in range(0, minutes * 60000, FRAME_PERIOD):
+        for i, (symbol, interval) in enumerate(streams):
+            if interval == intervals[0]:
+                prices[symbol] *= 1 + rng.gauss(0, 0.0005)
+            length = interval_to_ms(interval)
+            open_time = start + tick // length * length
+            price = f"{prices[symbol]:.8f}"
+            offset = tick + i * FRAME_PERIOD // len(streams)
+
+            frames.append([offset, json.dumps({
+                "stream": f"{symbol.lower()}@kline_{interval}",
+                "data": {
+                    "e": "kline", "E": start + offset, "s": symbol,
+                    "k": {
+                        "t": open_time, "T": open_time + length - 1, "s": symbol, "i": interval,
+                        "f": tick, "L": tick + 10, "o": price, "c": price, "h": price, "l": price,
+                        "v": "12.34500000", "n": 10, "x": (tick + FRAME_PERIOD) % length == 0,
+                        "q": "129600.00000000", "V": "6.10000000", "Q": "64000.00000000", "B": "0"
+                    }
+                }
+            }, separators=(",", ":"))])
+
+    _write_fixture(path, frames)
+    return len(frames)
+
+
+def record(path, pairs, intervals=("1m",), seconds=60):
+    """Records frames of live kline streams into fixture
+
+    Returns:
+        int: number of frames
+    """
+    return asyncio.run(_record(path, pairs, intervals, seconds))
+
+
+async def _record(path, pairs, intervals, seconds):
+    frames = []
+    client = binance.Binance()
+
+    async def handle(data):
+        frames.append([round((perf_counter() - started) * 1000), data])
+
+    started = perf_counter()
+    client._handle_wss_data = handle
+    async with client:
+        await client.subscribe_klines(pairs, intervals)
+        await asyncio.sleep(seconds)
+
+    # subscription replies are not replayed
+    frames = [frame for frame in frames if '"stream"' in frame[1]]
+    _write_fixture(path, frames)
+    return len(frames)
+
+
+def _write_fixture(path, frames):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with gzip.open(path, "wt") as f:
+        for frame in frames:
+            f.write(json.dumps(frame, separators=(",", ":")) + "\n")
+
+
+def serve(path, speed, conn):
+    """Fake websocket server process, replays fixture to every connection"""
+    asyncio.run(_serve(path, speed, conn))
+
+
+async def _serve(path, speed, conn):
+    frames = load_fixture(path)
+    streams = sorted({json.loads(frame)["stream"] for _, frame in frames})
+
+    async def stream(request):
+        wss = web.WebSocketResponse()
+        await wss.prepare(request)
+
+        started = perf_counter()
+        for offset, frame in frames:
+            if speed:
+                delay = offset / 1000 / speed - (perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await wss.send_str(frame)
+
+        # keep connection open until client closes it
+        async for _ in wss:
+            pass
+        return wss
+
+    app = web.Application()
+    app.router.add_get("/stream", stream)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+
+    conn.send((site._server.sockets[0].getsockname()[1], streams, len(frames)))
+    # parent sends anything when benchmark is done
+    await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+    await runner.cleanup()
+
+
+class ReplayBinance(binance.Binance):
+    """
+    Connector timing every frame from websocket receive to end of TA stage.
+
+    Frames travel the pipeline together with their receive time, handlers
+    of the connector are otherwise unchanged.
+    """
+
+    def __init__(self, url, **kw):
+        super().__init__(**kw)
+        self.WSS_URL = url
+        self.received = 0
+        self.first_received = None
+        self.latencies = []
+
+    async def _handle_wss_data(self, data):
+        now = perf_counter()
+        if self.first_received is None:
+            self.first_received = now
+        self.received += 1
+        await self.pipeline.put((now, data))
+
+    def _parse_frame(self, item):
+        received, data = item
+        kline = super()._parse_frame(data)
+        return None if kline is None else (received, kline)
+
+    def _analyse(self, item):
+        received, kline = item
+        result = super()._analyse(kline)
+        self.latencies.append(perf_counter() - received)
+        return result
+
+    @staticmethod
+    def _is_unclosed_frame(item):
+        return binance.Binance._is_unclosed_frame(item[1])
+
+    @staticmethod
+    def _is_unclosed_kline(item):
+        return binance.Binance._is_unclosed_kline(item[1])
+
+
+def add_strategies(client, streams):
+    """Registers TA of typical strategy on every stream"""
+    for stream in streams:
+        pair, interval = stream.split("@kline_")
+        client.add_crossover(pair, interval, ta.CrossoverDetector(ta.StreamingEMA(9), ta.StreamingEMA(21)))
+        client.add_evaluator(pair, interval, indicators.Evaluator([
+            ("crossover", {"short_window": 9, "long_window": 21, "ma": "ema"}),
+            ("macd", {}),
+            ("rsi", {}),
+        ]))
+
+
+async def replay(port, streams, total):
+    client = ReplayBinance(f"ws://127.0.0.1:{port}")
+    add_strategies(client, streams)
+
+    async with client:
+        await client.subscribe(streams, client._handle_kline)
+        while client.received < total:
+            await asyncio.sleep(0.01)
+    # leaving context drains pipeline and flushes writer
+    elapsed = perf_counter() - client.first_received
+
+    with database.get_engine().connect() as connection:
+        written = connection.execute(select(func.count()).select_from(Candlestick)).scalar()
+
+    latencies = np.array(client.latencies) * 1000
+    return {
+        "frames": total,
+        "elapsed": round(elapsed, 3),
+        "frames_per_sec": round(total / elapsed),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+        "latency_ms_p99": round(float(np.percentile(latencies, 99)), 3),
+        "dropped": sum(stage["dropped"] for stage in client.pipeline.metrics().values()),
+        "candles_written": written,
+    }
+
+
+def run(fixture=FIXTURE, speed=0.0):
+    """Runs benchmark against fake server process
+
+    Returns:
+        dict: results
+    """
+    if not os.path.exists(fixture):
+        generate(fixture)
+
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe()
+    server = context.Process(target=serve, args=(fixture, speed, child), daemon=True)
+    server.start()
+
+    try:
+        port, streams, total = parent.recv()
+        with tempfile.TemporaryDirectory() as directory:
+            database.configure(f"sqlite:///{os.path.join(directory, 'replay.db')}")
+            results = asyncio.run(replay(port, streams, total))
+            database.engine.dispose()
+    finally:
+        parent.send(True)
+        server.join(5)
+
+    return {
+        "benchmark": "replay",
+        "fixture": os.path.basename(fixture),
+        "speed": speed,
+        **results,
+        # kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "commit": _commit(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.replay")
+    parser.add_argument("command", nargs="?", default="run", choices=("run", "generate", "record"))
+    parser.add_argument("--fixture", default=FIXTURE)
+    parser.add_argument("--speed", type=float, default=0.0, help="replay speed, 0 as fast as possible")
+    parser.add_argument("--output", help="file results are appended to as JSON line")
+    parser.add_argument("--pairs", default="10", help="number of generated pairs or recorded pairs e.g. btcusdt,ethusdt")
+    parser.add_argument("--minutes", type=int, default=30, help="generated minutes")
+    parser.add_argument("--seconds", type=int, default=60, help="recorded seconds")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        print(json.dumps({"fixture": args.fixture, "frames": generate(args.fixture, int(args.pairs), minutes=args.minutes)}))
+        return
+    if args.command == "record":
+        print(json.dumps({"fixture": args.fixture, "frames": record(args.fixture, args.pairs.split(","), seconds=args.seconds)}))
+        return
+
+    results = json.dumps(run(args.fixture, args.speed))
+    print(results)
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(results + "\n")
+
+
+if __name__ == "__main__":
+    main()
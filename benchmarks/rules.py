@@ -0,0 +1,69 @@
+"""
+Benchmark of rule engine evaluation per price tick.
+
+Keeps given number of stop loss, take profit and trailing stop rules active
+on single pair (fired rules are replaced) while replaying random walk, and
+reports mean and p99 evaluation time per tick.
+
+Usage:
+    python -m benchmarks.rules [rules] [ticks]
+"""
+import json
+import random
+import sys
+
+from time import perf_counter
+
+import numpy as np
+
+import rules
+
+PAIR = "BTCUSDT"
+
+
+def add_rule(engine, rng, price):
+    kind = rng.randrange(3)
+    if kind == 0:
+        return engine.add_stop_loss(PAIR, price * (1 - rng.uniform(0.005, 0.1)))
+    if kind == 1:
+        return engine.add_take_profit(PAIR, price * (1 + rng.uniform(0.005, 0.1)))
+    return engine.add_trailing_stop(PAIR, rng.uniform(0.005, 0.1), price)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+
+    rng = random.Random(1)
+    engine = rules.RuleEngine()
+    price = 30000.0
+    for _ in range(count):
+        add_rule(engine, rng, price)
+
+    durations = np.empty(ticks)
+    fired = 0
+    for tick in range(ticks):
+        price *= 1 + rng.gauss(0, 0.0005)
+
+        started = perf_counter()
+        triggered = engine.on_price(PAIR, price)
+        durations[tick] = perf_counter() - started
+
+        fired += len(triggered)
+        for _ in triggered:
+            add_rule(engine, rng, price)
+
+    durations *= 1e6
+    print(json.dumps({
+        "rules": count,
+        "ticks": ticks,
+        "fired": fired,
+        "tick_us_mean": round(float(durations.mean()), 2),
+        "tick_us_p50": round(float(np.percentile(durations, 50)), 2),
+        "tick_us_p99": round(float(np.percentile(durations, 99)), 2),
+        "tick_us_max": round(float(durations.max()), 2),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark of process startup, ms from spawning interpreter to running event loop.
+
+Every run spawns fresh interpreter which imports given modules, starts
+asyncio loop and reports time from its first coroutine. Bare interpreter
+with asyncio is measured the same way as baseline. Heavy dependencies
+loaded by then are listed, they should be loaded on first use only.
+
+Target is under 200ms to ready event loop with bot imported.
+
+Usage:
+    python -m benchmarks.startup [runs] [modules...]
+"""
+import json
+import os
+import subprocess
+import sys
+
+from time import time
+
+import numpy as np
+
+TARGET_MS = 200
+# dependencies which should not be loaded before they are used
+HEAVY = ("numpy", "sqlalchemy", "talib", "aiohttp", "aiohttp.web", "psycopg", "asyncpg")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import sys
+import time
+import asyncio
+{imports}
+
+async def ready():
+    loaded = [name for name in {heavy!r} if name in sys.modules and not type(sys.modules[name]).__name__.startswith("_Lazy")]
+    print(time.time(), " ".join(loaded))
+
+asyncio.run(ready())
+"""
+
+
+def measure(modules, runs):
+    """Spawns interpreters importing modules
+
+    Returns:
+        tuple: (median ms to ready event loop, heavy modules loaded)
+    """
+    code = CHILD.format(imports="\n".join(f"import {module}" for module in modules), heavy=HEAVY)
+    durations = []
+    for _ in range(runs):
+        started = time()
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        ready, *loaded = output.split()
+        durations.append((float(ready) - started) * 1000)
+    return float(np.median(durations)), loaded
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    modules = sys.argv[2:] or ["bot"]
+
+    baseline, _ = measure([], runs)
+    ready, loaded = measure(modules, runs)
+
+    print(json.dumps({
+        "modules": modules,
+        "runs": runs,
+        "baseline_ms": round(baseline, 1),
+        "ready_ms": round(ready, 1),
+        "imports_ms": round(ready - baseline, 1),
+        "target_ms": TARGET_MS,
+        "heavy_loaded": loaded,
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark of aggTrade ingestion, trades/sec on single core.
+
+Replays random walk aggTrade frames through parse stage routing
+(json decoding, TradeIngest.handle) and batch decoding with time, tick,
+volume and dollar bar builders. BTCUSDT peaks at a few thousand aggregate
+trades per second, sustained rate should stay well above that.
+
+Usage:
+    python -m benchmarks.trades [trades] [batch size]
+"""
+import json
+import random
+import sys
+
+from time import perf_counter
+
+import trades
+from utils import json_loads
+
+PAIR = "BTCUSDT"
+
+
+def make_frames(count, seed=1):
+    rng = random.Random(seed)
+    price = 30000.0
+    start = 1700000000000
+    frames = []
+    for i in range(count):
+        price *= 1 + rng.gauss(0, 0.00001)
+        timestamp = start + i * 2
+        frames.append(json.dumps({
+            "stream": "btcusdt@aggTrade",
+            "data": {
+                "e": "aggTrade", "E": timestamp, "s": PAIR, "a": i, "p": f"{price:.2f}",
+                "q": f"{rng.expovariate(20):.5f}", "f": i * 2, "l": i * 2 + rng.randint(0, 2),
+                "T": timestamp, "m": rng.random() < 0.5, "M": True,
+            }
+        }, separators=(",", ":")))
+    return frames
+
+
+def builders():
+    return [trades.TimeBars("1s"), trades.TickBars(100), trades.VolumeBars(10), trades.DollarBars(1e6)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    frames = make_frames(count)
+    pair_builders = builders()
+
+    parsing = building = 0.0
+    bars = 0
+    for start in range(0, count, batch_size):
+        batch = []
+        started = perf_counter()
+        for frame in frames[start:start + batch_size]:
+            # what parse stage and TradeIngest.handle do per frame
+            batch.append(json_loads(frame)["data"])
+        parsed = perf_counter()
+
+        decoded = trades.decode(batch)
+        for builder in pair_builders:
+            bars += len(builder.update(PAIR, decoded))
+        building += perf_counter() - parsed
+        parsing += parsed - started
+
+    print(json.dumps({
+        "trades": count,
+        "batch_size": batch_size,
+        "bars": bars,
+        "parse_us_per_trade": round(parsing / count * 1e6, 3),
+        "decode_and_bars_us_per_trade": round(building / count * 1e6, 3),
+        "trades_per_sec": round(count / (parsing + building)),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,32 @@
 
-import logging
+import hashlib
+import hmac
 import json
-from datetime import datetime
+import logging
+import os
+
+from time import time
+from urllib.parse import urlencode
 
 import engine
-import database
-from models import Candlestick
-from utils import setup_logging, convert_timestamp
+from pipeline import Pipeline, Stage, BLOCK, DROP_OLDEST
+from rules import RuleEngine
+from aggregator import TimeframeAggregator
+from ratelimit import WeightLimiter
+from records import Kline
+from utils import setup_logging, interval_to_ms, json_loads, lazy_import
 from exceptions import BadResponseError
 
 from pprint import pprint
 
+# SQLAlchemy and NumPy are loaded when connector is created, not on import
+database = lazy_import("database")
+orderbook = lazy_import("orderbook")
+store = lazy_import("store")
+trades = lazy_import("trades")
+# TA-Lib is loaded when indicators are first used
+cache = lazy_import("cache")
+
 logger = setup_logging(__name__)
 
 
@@ -19,13 +35,74 @@ class Binance(engine.Connector):
     WSS_URL = "wss://stream.binance.com:9443"
     API_URI = "/api/v3"
     WSS_URI = "/ws"
-    
-    def __init__(self):
+    WSS_COMBINED_URI = "/stream"
+    MAX_STREAMS_PER_CONNECTION = 1024
+    REQUEST_WEIGHT_PER_MINUTE = 6000
+    KLINES_LIMIT = 1000     # max candlesticks per klines request
+    RECV_WINDOW = 5000      # ms signed request stays valid for
+    BASE_INTERVAL = "1m"    # stream higher intervals are aggregated from, see subscribe_timeframes
+    # seconds REST responses are cached for
+    SERVER_TIME_TTL = 1
+    EXCHANGE_INFO_TTL = 60 * 60
+    CLOSED_KLINES_TTL = 60 * 60     # pages of closed klines never change
+    EXCHANGE_INFO_WEIGHT = 20
+
+    # default settings of processing stages, see pipeline.Stage
+    STAGE_CONFIG = {
+        "parse": {"workers": 1, "maxsize": 10000, "policy": DROP_OLDEST},
+        "ta": {"workers": 1, "maxsize": 10000, "policy": DROP_OLDEST},
+        "persist": {"workers": 1, "maxsize": 10000, "policy": BLOCK},
+    }
+
+    def __init__(self, stage_config=None, candle_capacity=1000, archive=None, api_key=None, api_secret=None):
+        """
+        Args:
+            stage_config (dict, optional): per stage overrides of STAGE_CONFIG e.g. {"parse": {"workers": 2}}
+            candle_capacity (int, optional): candles kept in memory per pair and interval. Defaults to 1000.
+            archive (archive.CandleArchive, optional): columnar archive closed candles are appended to. Defaults to None.
+            api_key (string, optional): API key for signed requests. Defaults to BINANCE_API_KEY env variable.
+            api_secret (string, optional): API secret for signed requests. Defaults to BINANCE_API_SECRET env variable.
+        """
         super().__init__()
 
+        self.api_key = api_key or os.environ.get("BINANCE_API_KEY", None)
+        self.api_secret = api_secret or os.environ.get("BINANCE_API_SECRET", None)
+
         self.db = database.DbManager()
+        self.writer = database.CandlestickWriter(self.db)
+        self.store = store.CandleStore(candle_capacity)
+        self._indicators = None
+        self.archive = archive
+        self.crossovers = {}        # (pair, interval) -> list of CrossoverDetector
+        self.evaluators = {}        # (pair, interval) -> list of indicators.Evaluator
+        self.rules = RuleEngine(on_trigger=self._handle_rule)
+        self.books = orderbook.OrderBooks(self)
+        self.aggregator = TimeframeAggregator(self.BASE_INTERVAL)
+        self.trades = trades.TradeIngest(self)
+        self.last_closed = {}       # (pair, interval) -> open time of last closed candlestick in ms
+        self.rate_limiter = WeightLimiter(self.REQUEST_WEIGHT_PER_MINUTE)
         self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
 
+        self.pipeline = self._build_pipeline(stage_config or {})
+
+    async def __aenter__(self):
+        await super().__aenter__()
+
+        self.writer.start()
+        self.add_shutdown_hook(self.writer.stop)
+        self.add_shutdown_hook(self.books.close)
+        self.add_shutdown_hook(self.trades.close)
+        if self.archive is not None:
+            self.add_shutdown_hook(self._flush_archive)
+        return self
+
+    @property
+    def indicators(self):
+        """Indicator cache of candle store, created on first use as it loads TA-Lib"""
+        if self._indicators is None:
+            self._indicators = cache.IndicatorCache(self.store)
+        return self._indicators
+
     @property
     def api_endpoint(self):
         return f"{self.API_URL}{self.API_URI}"
@@ -39,29 +116,348 @@ class Binance(engine.Connector):
         url = f"{self.wss_endpoint}/{endpoint}"
         await super()._wss_listen(url)
 
-    def _handle_wss_data(self, data):
-        """handles data from incoming data frames
+    def _combined_stream_url(self, streams):
+        return f"{self.WSS_URL}{self.WSS_COMBINED_URI}?streams={'/'.join(streams)}"
+
+    def _subscription_message(self, method, streams, request_id):
+        return {
+            "method": method,
+            "params": streams,
+            "id": request_id
+        }
+
+    async def _on_reconnect(self, streams):
+        """Fills candlesticks closed while connection was down
+
+        Missing candlesticks are fetched over REST and queued for TA stage
+        before any frame of the new connection, so indicators never see holes.
+
+        Args:
+            streams (list): streams carried by reopened connection
+        """
+        for stream in streams:
+            if "@kline_" not in stream:
+                continue
+
+            pair, interval = stream.split("@kline_")
+            last = self.last_closed.get((pair.upper(), interval), None)
+            if last is None:
+                continue
+
+            filled = await self._fill_gap(pair, interval, int(last) + interval_to_ms(interval))
+            if filled:
+                self.logger.info(f"Filled {filled} missing {pair} {interval} candlesticks")
+
+    async def _fill_gap(self, pair, interval, start_time):
+        ta_stage = self.pipeline.stage("ta")
+        filled = 0
+
+        while True:
+            try:
+                klines = await self.fetch_klines(pair, self.KLINES_LIMIT, interval, start_time, cache=False)
+            except BadResponseError as e:
+                self.logger.warning(f"Failed to fill gap of {pair} {interval}: {e}")
+                return filled
+
+            closed = [kline for kline in klines if kline.closed]
+            for kline in closed:
+                await ta_stage.put(kline)
+            filled += len(closed)
+
+            if len(klines) < self.KLINES_LIMIT or len(closed) < len(klines):
+                return filled
+            start_time = klines[-1].open_time + interval_to_ms(interval)
+
+    async def subscribe_klines(self, pairs, intervals):
+        """Subscribes to kline streams for every pair and interval combination
+
+        Args:
+            pairs (list): pairs e.g. ["btcusdt", "ethusdt"]
+            intervals (list): kline intervals e.g. ["1m", "15m"]
+        """
+        streams = [f"{pair.lower()}@kline_{interval}" for pair in pairs for interval in intervals]
+        await self.subscribe(streams, self._handle_kline)
+
+    async def unsubscribe_klines(self, pairs, intervals):
+        streams = [f"{pair.lower()}@kline_{interval}" for pair in pairs for interval in intervals]
+        await self.unsubscribe(streams)
+
+    async def subscribe_timeframes(self, pairs, intervals):
+        """Subscribes to BASE_INTERVAL kline stream only, higher intervals are aggregated from it
+
+        Closed candles of every interval go through TA and persistence like
+        subscribed ones, in-progress higher interval candles are not emitted.
+
+        Args:
+            pairs (list): pairs e.g. ["btcusdt", "ethusdt"]
+            intervals (list): intervals e.g. ["1m", "5m", "15m", "1h", "4h"]
+        """
+        for pair in pairs:
+            self.aggregator.add(pair, intervals)
+        await self.subscribe_klines(pairs, [self.BASE_INTERVAL])
+
+    async def unsubscribe_timeframes(self, pairs):
+        for pair in pairs:
+            self.aggregator.remove(pair)
+        await self.unsubscribe_klines(pairs, [self.BASE_INTERVAL])
+
+    async def subscribe_depth(self, pairs):
+        """Maintains local order books of pairs, see orderbook.OrderBooks
+
+        Args:
+            pairs (list): pairs e.g. ["btcusdt", "ethusdt"]
+        """
+        await self.books.subscribe(pairs)
+
+    async def unsubscribe_depth(self, pairs):
+        await self.books.unsubscribe(pairs)
+
+    async def subscribe_trades(self, pairs, builders):
+        """Builds bars of pairs from aggTrade streams, see trades.TradeIngest
+
+        Closed bars go through TA and persistence like klines.
+
+        Args:
+            pairs (list): pairs e.g. ["btcusdt"]
+            builders (callable): returns new bar builders for a pair e.g. lambda: [TimeBars("1s"), VolumeBars(10)]
+        """
+        await self.trades.subscribe(pairs, builders)
+
+    async def unsubscribe_trades(self, pairs):
+        await self.trades.unsubscribe(pairs)
+
+    def _build_pipeline(self, stage_config):
+        """Builds receive -> parse -> TA -> persist pipeline
+
+        Args:
+            stage_config (dict): per stage overrides of STAGE_CONFIG
+
+        Returns:
+            Pipeline: processing pipeline
+        """
+        handlers = {
+            "parse": (self._parse_frame, self._is_unclosed_frame),
+            "ta": (self._analyse, self._is_unclosed_kline),
+            "persist": (self._persist, None),
+        }
+
+        stages = []
+        for name, (handler, droppable) in handlers.items():
+            config = {**self.STAGE_CONFIG[name], **stage_config.get(name, {})}
+            stages.append(Stage(name, handler, droppable=droppable, **config))
+
+        return Pipeline(stages)
+
+    @staticmethod
+    def _is_unclosed_frame(frame):
+        # cheap check on raw frame, binance sends compact json
+        return '"x":false' in frame
+
+    @staticmethod
+    def _is_unclosed_kline(kline):
+        return not kline.closed
+
+    async def _handle_wss_data(self, data):
+        """hands incoming data frame over to processing pipeline
 
         Args:
             data (json): incoming data from websocket stream
         """
-        # self.logger.debug(json.loads(data))
+        await self.pipeline.put(data)
+
+    def _parse_frame(self, data):
+        """parses data frame and routes it to stream handler
+
+        Combined stream frames come wrapped in {"stream": ..., "data": ...}
+        envelope and are routed to handler registered for that stream.
+
+        Args:
+            data (json): incoming data from websocket stream
+
+        Returns:
+            any: result of stream handler, passed to next pipeline stage
+        """
+        data = json_loads(data)
+        stream = data.get("stream", None)
+
+        if stream is None:
+            # reply to SUBSCRIBE / UNSUBSCRIBE request
+            if "id" in data:
+                self.logger.info(f"Subscription response: {data}")
+                return
+            # frame from raw /ws stream
+            return self._handle_kline(data)
+
+        handler = self.handlers.get(stream, None)
+        if handler is None:
+            # frames can still arrive shortly after unsubscribing
+            return
+
+        return handler(data["data"])
+
+    def _handle_kline(self, data):
+        """parses kline payload
+
+        Args:
+            data (dict): kline event payload
+
+        Returns:
+            Kline: parsed kline
+        """
+        k_data = data.get('k', None)
+        if k_data is None:
+            return None
+
+        return Kline.from_wss(k_data)
+
+    def _analyse(self, kline):
+        """performs TA on parsed kline and on candles of aggregated intervals it closes
+
+        Args:
+            kline (Kline): parsed kline
+
+        Returns:
+            Kline | list: kline if it is closed and should be persisted,
+                list when it closed candles of aggregated intervals too
+        """
+        if not self._analyse_kline(kline) or not kline.closed:
+            return None
+
+        aggregated = [closed for closed in self.aggregator.update(kline) if self._analyse_kline(closed)]
+        return [kline] + aggregated if aggregated else kline
+
+    def _analyse_kline(self, kline):
+        """updates candle store, rules and indicators with kline
+
+        Returns:
+            bool: False if kline is duplicate of already closed candle
+        """
+        key = (kline.pair, kline.interval)
+
+        # duplicates from overlapping connections and gap fills
+        if kline.open_time <= self.last_closed.get(key, -1):
+            return False
+        if kline.closed:
+            self.last_closed[key] = kline.open_time
+
+        candles = self.store.update(kline)
+
+        # every frame carries last price, rules are evaluated on in-progress klines too
+        self.rules.on_price(kline.pair, kline.close)
+
+        for detector in self.crossovers.get(key, ()):
+            signal = detector.update(kline.close, kline.closed)
+            if signal is not None:
+                self._handle_signal(kline, signal)
+
+        evaluators = self.evaluators.get(key, ()) if kline.closed else ()
+        if evaluators:
+            # moving averages shared by evaluators are computed once per candle
+            closes = candles.column("close", closed_only=True)
+            series = self.indicators.bind(kline.pair, kline.interval)
+            for evaluator in evaluators:
+                signal_set = evaluator.evaluate(closes, kline.pair, kline.interval, kline.open_time, series)
+                if signal_set.signals:
+                    self._handle_signal_set(signal_set)
+
+        return True
+
+    def add_crossover(self, pair, interval, detector):
+        """Registers crossover detector evaluated on every kline of pair and interval
+
+        Detector is warmed up from closed candles already held in candle store.
+
+        Args:
+            pair (string): pair e.g. "btcusdt"
+            interval (string): kline interval e.g. "1m"
+            detector (ta.CrossoverDetector): crossover detector
+        """
+        candles = self.store.get(pair, interval)
+        detector.warm_up(candles.column("close", closed_only=True))
+        self.crossovers.setdefault((pair.upper(), interval), []).append(detector)
+
+    def add_evaluator(self, pair, interval, evaluator):
+        """Registers indicator evaluator run on every closed kline of pair and interval
+
+        Args:
+            pair (string): pair e.g. "BTCUSDT"
+            interval (string): kline interval e.g. "1m"
+            evaluator (indicators.Evaluator): evaluator of strategy indicators
+        """
+        self.evaluators.setdefault((pair.upper(), interval), []).append(evaluator)
+
+    def _handle_signal_set(self, signal_set):
+        for signal in signal_set.signals:
+            self.logger.info(f"{signal_set.pair} {signal_set.interval} {signal.indicator} signal: {signal.kind}")
+
+    def _handle_rule(self, rule, price):
+        self.logger.info(f"{rule.pair} {rule.kind} rule {rule.id} fired at {price}")
+
+    def _handle_signal(self, kline, signal):
+        kind = "provisional" if signal.provisional else "confirmed"
+        self.logger.info(f"{kline.pair} {kline.interval} {kind} crossover signal: {signal.signal}")
+
+    def _persist(self, klines):
+        """buffers closed kline(s) for bulk write, ORM object is built only here
+
+        Args:
+            klines (Kline | list): closed kline or klines
+        """
+        klines = klines if isinstance(klines, list) else [klines]
+        self.writer.put([kline.to_candlestick() for kline in klines])
+        if self.archive is not None:
+            for kline in klines:
+                self.archive.append(kline)
+
+    async def _flush_archive(self):
+        self.archive.flush()
+
+
+    def _sign(self, params):
+        assert self.api_key and self.api_secret, "API key and secret are required for signed requests"
+
+        query = urlencode({**params, "timestamp": int(time() * 1000), "recvWindow": self.RECV_WINDOW})
+        signature = hmac.new(self.api_secret.encode(), query.encode(), hashlib.sha256).hexdigest()
+
+        return f"{query}&signature={signature}", {"X-MBX-APIKEY": self.api_key}
+
+    async def create_order(self, params):
+        """Places order
+
+        Args:
+            params (dict): order parameters e.g. {"symbol": "BTCUSDT", "side": "BUY", "type": "MARKET", ...}
+
+        Raises:
+            BadResponseError: exchange responded with error
+
+        Returns:
+            dict: order response
+        """
+        return await self.request("order", params=params, method="POST", signed=True)
+
+    async def cancel_order(self, pair, client_order_id):
+        """Cancels order by client order id
 
-        ## Steps:
-        # 1. parse candlestick from data frame
-        data = json.loads(data)
-        c_data = data.get('k', None)
+        Raises:
+            BadResponseError: exchange responded with error
 
-        c = Candlestick.extract_candlestick_from_wss(c_data) if c_data is not None else None
-        print(f"{convert_timestamp(data.get('E'))} {c.pair} {c.interval}")
+        Returns:
+            dict: canceled order
+        """
+        params = {"symbol": pair.upper(), "origClientOrderId": client_order_id}
+        return await self.request("order", params=params, method="DELETE", signed=True)
 
-        # 2. perform TA 
-        # 3. generate signals
-        # 4. if candlestick is closed save to db
-        if c_data.get("x", None):
-            self.logger.info(f"Saving candlestick to database")
-            self.db.save(c)
+    async def get_order(self, pair, client_order_id):
+        """Fetches order by client order id
 
+        Raises:
+            BadResponseError: exchange responded with error
+
+        Returns:
+            dict: order
+        """
+        params = {"symbol": pair.upper(), "origClientOrderId": client_order_id}
+        return await self.request("order", params=params, weight=4, signed=True)
 
     async def get_server_time(self):
         """Fetches current binance server time
@@ -69,23 +465,109 @@ class Binance(engine.Connector):
         Returns:
             json: dict with "serverTime" key
         """
-        return await self._request("time")
+        return await self._request("time", ttl=self.SERVER_TIME_TTL)
+
+    async def get_exchange_info(self, pairs=None):
+        """Fetches trading rules and symbol information, cached for EXCHANGE_INFO_TTL
+
+        Args:
+            pairs (list, optional): pairs e.g. ["btcusdt"]. Defaults to None, all symbols.
+
+        Raises:
+            BadResponseError: exchange responded with error
+
+        Returns:
+            dict: exchange information
+        """
+        params = {}
+        if pairs:
+            params["symbols"] = json.dumps([pair.upper() for pair in pairs], separators=(",", ":"))
+        return await self.request("exchangeInfo", params=params, weight=self.EXCHANGE_INFO_WEIGHT, ttl=self.EXCHANGE_INFO_TTL)
+
+    async def get_candlesticks(self, pair, limit=10, interval="15m", start_time=None, end_time=None):
+        """Fetches candlesticks and buffers them for writing to db
+
+        Returns:
+            list: candlesticks as json, None on bad response
+        """
+        try:
+            objects = await self.fetch_candlesticks(pair, limit, interval, start_time, end_time)
+        except BadResponseError as e:
+            self.logger.info(e)
+            return None
+
+        self.writer.put(objects)
+
+        return [candlestick.json for candlestick in objects]
+
+    async def fetch_candlesticks(self, pair, limit=10, interval="15m", start_time=None, end_time=None, cache=True):
+        """Fetches page of candlesticks, see fetch_klines
+
+        Returns:
+            list: Candlestick objects
+        """
+        klines = await self.fetch_klines(pair, limit, interval, start_time, end_time, cache)
+        return [kline.to_candlestick() for kline in klines]
 
-    async def get_candlesticks(self, pair, limit=10, interval="15m"):
+    async def fetch_klines(self, pair, limit=10, interval="15m", start_time=None, end_time=None, cache=True):
+        """Fetches page of klines
+
+        Args:
+            pair (string): pair e.g. "btcusdt"
+            limit (int, optional): max candlesticks, up to KLINES_LIMIT. Defaults to 10.
+            interval (string, optional): kline interval. Defaults to "15m".
+            start_time (int, optional): first open time in ms
+            end_time (int, optional): last open time in ms
+            cache (bool, optional): cache page for CLOSED_KLINES_TTL when all its klines are closed,
+                pages read once (backfill, gap fill) shouldn't be. Defaults to True.
+
+        Raises:
+            BadResponseError: exchange responded with error
+
+        Returns:
+            list: Kline records, newest one is not closed when it is still in progress
+        """
+        now = time() * 1000
         params = {
             "symbol": pair.upper(),
             "interval": interval,
             "limit": limit
         }
+        if start_time is not None:
+            params["startTime"] = int(start_time)
+        if end_time is not None:
+            params["endTime"] = int(end_time)
+
+        response = await self.request(
+            "klines", params=params, weight=self._klines_weight(limit),
+            ttl=self.CLOSED_KLINES_TTL if cache and self._is_closed_page(interval, limit, start_time, end_time, now) else None,
+        )
 
+        return [
+            Kline.from_api(kline, pair.upper(), interval, closed=kline[6] < now)
+            for kline in response
+        ]
+
+    @staticmethod
+    def _is_closed_page(interval, limit, start_time, end_time, now):
+        """Whether all klines of page are already closed, so the page can be cached"""
+        if start_time is None and end_time is None:
+            return False
         try:
-            response = await self.request("klines", params=params)
-        except BadResponseError as e:
-            self.logger.info(e)
-            return None
+            length = interval_to_ms(interval)
+        except ValueError:
+            # months have no fixed length, such pages aren't cached
+            return False
 
-        objects = [Candlestick.extract_candlestick_from_api(candlestick, pair, interval) for candlestick in response]
-        
-        self.db.save(objects)
+        last_open_time = end_time if end_time is not None else start_time + (limit - 1) * length
+        return last_open_time + length <= now
 
-        return [candlestick.json for candlestick in objects]
+    @staticmethod
+    def _klines_weight(limit):
+        if limit <= 100:
+            return 1
+        if limit <= 500:
+            return 2
+        if limit <= 1000:
+            return 5
+        return 10
@@ -3,18 +3,35 @@ import logging
 import json
 
 import binance
+from backfill import Backfill
+from config import get_config
+from metrics import MetricsServer
 from utils import setup_logging
 
-# create logger
-logger = setup_logging(initial=True)
+PAIRS = ["ethusdt"]
+INTERVALS = ["1m"]
 
 async def main(loop):
+    # Prometheus scrape endpoint, off unless KUBERA_METRICS_PORT is set, KUBERA_METRICS_HOST exposes it
+    config = get_config()
+    if config.metrics_port is not None:
+        await MetricsServer().start(host=config.metrics_host, port=config.metrics_port)
+
     async with binance.Binance() as client:
         # response = await client.get_candlesticks("BTCUSDT")
         # print(response)
-        await client._wss_listen("ethusdt@kline_1m")
+
+        # fill candlesticks missed since last run
+        await Backfill(client).run(PAIRS, INTERVALS)
+
+        await client.subscribe_klines(PAIRS, INTERVALS)
+        await client.listen()
         
 
+# single process runtime, see supervisor.py for one sharded across processes
+if __name__ == "__main__":
+    # create logger
+    logger = setup_logging(initial=True)
 
-loop = asyncio.get_event_loop()
-loop.run_until_complete(main(loop))
\ No newline at end of file
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main(loop))
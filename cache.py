@@ -0,0 +1,191 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from utils import setup_logging, lazy_import
+
+logger = setup_logging(__name__)
+
+talib = lazy_import("talib")
+
+# calculates indicator of whole close array, e.g. talib.SMA
+TCompute = Callable[..., np.ndarray]
+# calculates newest value from cached values of closed candles and closes including in-progress candle
+TExtend = Callable[..., float]
+
+
+def _extend_sma(values: np.ndarray, closes: np.ndarray, timeperiod: int) -> float:
+    if len(closes) < timeperiod:
+        return np.nan
+    return float(np.mean(closes[-timeperiod:]))
+
+
+def _extend_ema(values: np.ndarray, closes: np.ndarray, timeperiod: int) -> float:
+    if len(closes) < timeperiod:
+        return np.nan
+    if len(closes) == timeperiod:
+        return float(np.mean(closes))
+
+    k = 2.0 / (timeperiod + 1)
+    return float(values[-1] + k * (closes[-1] - values[-1]))
+
+
+class CacheEntry:
+    __slots__ = ("version", "values", "partial_close", "partial_value")
+
+    def __init__(self, version, values):
+        self.version = version          # open time of newest closed candle
+        self.values = values            # indicator over closed candles
+        self.partial_close = None       # close of in-progress candle of partial_value
+        self.partial_value = None
+
+
+class IndicatorCache:
+    """
+    Memoizes indicator outputs of candle buffers of CandleStore.
+
+    Entries are keyed by (pair, interval, indicator, params) and hold values
+    calculated over closed candles together with version of the series, the
+    newest closed candle. Entry is recalculated once a new candle closes.
+    While only in-progress candle changes cached values are reused as prefix
+    and just the newest value is calculated by indicator extend function.
+    Entries are evicted in LRU order once max_bytes is exceeded.
+    """
+
+    def __init__(self, store, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            store (store.CandleStore): candle buffers
+            max_bytes (int, optional): memory budget of cached values. Defaults to 64 MiB.
+        """
+        self.store = store
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+        self.indicators: Dict[str, Tuple[TCompute, Optional[TExtend]]] = {}
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.partial_hits = 0       # closed candle values reused, newest value extended
+        self.misses = 0
+        self.evictions = 0
+
+        self.register("sma", talib.SMA, _extend_sma)
+        self.register("ema", talib.EMA, _extend_ema)
+
+    def register(self, name: str, compute: TCompute, extend: Optional[TExtend] = None) -> None:
+        """Registers indicator
+
+        Args:
+            name (str): indicator name used in keys
+            compute (TCompute): calculates indicator of close array, called with params as keywords
+            extend (TExtend, optional): calculates newest value from cached values, without it
+                indicator is recalculated over all closes when in-progress candle changes
+        """
+        self.indicators[name] = (compute, extend)
+
+    def get(self, pair: str, interval: str, name: str, **params) -> np.ndarray:
+        """Returns indicator of buffered closes, including in-progress candle
+
+        Args:
+            pair (str): pair e.g. "BTCUSDT"
+            interval (str): kline interval e.g. "1m"
+            name (str): registered indicator name e.g. "sma"
+            params: indicator parameters e.g. timeperiod=20
+
+        Returns:
+            np.ndarray: read-only indicator values aligned with buffered candles
+        """
+        compute, extend = self.indicators[name]
+        buffer = self.store.get(pair, interval)
+
+        closed = buffer.column("close", closed_only=True)
+        if not len(closed):
+            return compute(np.asarray(buffer.column("close"), dtype=np.float64), **params)
+
+        key = (pair.upper(), interval, name, tuple(sorted(params.items())))
+        version = buffer.column("open_time", closed_only=True)[-1]
+        entry = self._entry(key, version, lambda: compute(closed, **params))
+
+        if buffer.last_closed:
+            return entry.values
+
+        # in-progress candle, reuse values of closed candles as prefix
+        close = buffer.column("close", n=1)[-1]
+        if entry.partial_close != close:
+            if extend is not None:
+                self.partial_hits += 1
+                entry.partial_value = extend(entry.values, buffer.column("close"), **params)
+            else:
+                entry.partial_value = compute(buffer.column("close"), **params)[-1]
+            entry.partial_close = close
+
+        values = np.append(entry.values, entry.partial_value)
+        values.flags.writeable = False
+        return values
+
+    def bind(self, pair: str, interval: str) -> 'SeriesCache':
+        return SeriesCache(self, pair, interval)
+
+    def _entry(self, key, version, compute) -> CacheEntry:
+        entry = self.entries.get(key, None)
+
+        if entry is not None and entry.version == version:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        if entry is not None:
+            # new candle closed, entry is stale
+            self._remove(key)
+
+        self.misses += 1
+        values = compute()
+        values.flags.writeable = False
+
+        entry = self.entries[key] = CacheEntry(version, values)
+        self.nbytes += values.nbytes
+        self._evict()
+        return entry
+
+    def _remove(self, key) -> None:
+        entry = self.entries.pop(key)
+        self.nbytes -= entry.values.nbytes
+
+    def _evict(self) -> None:
+        # newest entry is kept even if it alone exceeds budget
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SeriesCache:
+    """
+    IndicatorCache bound to single pair and interval
+    """
+
+    def __init__(self, cache: IndicatorCache, pair: str, interval: str):
+        self.cache = cache
+        self.pair = pair
+        self.interval = interval
+
+    @property
+    def buffer(self):
+        return self.cache.store.get(self.pair, self.interval)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.cache.indicators
+
+    def get(self, name: str, **params) -> np.ndarray:
+        return self.cache.get(self.pair, self.interval, name, **params)
@@ -1,37 +1,223 @@
 import asyncio
-import aiohttp
 import logging
 import json
+import random
 
 from abc import abstractmethod
 from datetime import datetime
+from time import perf_counter
+
+from yarl import URL
 
 from base import Base
-from models import (
-    Candlestick
-)
-from utils import setup_logging
+from metrics import counter, histogram
+from rest import ResponseCache, SingleFlight, request_key
+from utils import setup_logging, SampledLogger, lazy_import
 from exceptions import BadResponseError
 
 logger = setup_logging(__name__)
 
+# HTTP client is loaded when session is opened
+aiohttp = lazy_import("aiohttp")
+
+FRAMES_RECEIVED = counter("ws_frames_total", "Websocket data frames received")
+RECONNECTS = counter("ws_reconnects_total", "Dropped websocket connections reopened")
+REST_REQUESTS = counter("rest_requests_total", "REST requests by endpoint and response status", labels=("endpoint", "status"))
+REST_WEIGHT = counter("rest_request_weight_total", "Request weight of sent REST requests", labels=("endpoint",))
+REST_LATENCY = histogram("rest_request_seconds", "REST request latency", labels=("endpoint",))
+REST_CACHE_HITS = counter("rest_cache_hits_total", "REST requests answered from response cache", labels=("endpoint",))
+REST_COALESCED = counter("rest_coalesced_total", "REST requests joined identical request in flight", labels=("endpoint",))
+
+
+class StreamConnection:
+    """
+    Single supervised websocket connection carrying one or more combined streams.
+
+    Dropped connections are reopened with jittered exponential backoff and
+    connector is notified so it can fill the gap before frames of the new
+    connection are processed. Connections older than connector
+    MAX_CONNECTION_AGE are rolled over: new socket is opened while the old
+    one keeps receiving, frames of the new one are buffered until the old one
+    is closed, so nothing is lost.
+    """
+
+    def __init__(self, connector, streams):
+        self.connector = connector
+        self.streams = set(streams)
+        self.wss = None
+        self.task = None
+        self.reconnects = 0
+        self._request_id = 0
+        self._closing = False
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    @property
+    def free_slots(self):
+        return self.connector.MAX_STREAMS_PER_CONNECTION - len(self.streams)
+
+    async def open(self):
+        """Connects to combined stream endpoint and starts receiving frames"""
+        # set before first frame is received so streams added meanwhile are subscribed on it
+        self.wss = await self._connect()
+        self.task = asyncio.ensure_future(self._run(self.wss))
+
+    async def close(self):
+        self._closing = True
+        if self.wss is not None and not self.wss.closed:
+            await self.wss.close()
+        if self.task is not None:
+            await self.task
+
+    async def subscribe(self, streams):
+        self.streams.update(streams)
+        await self._send("SUBSCRIBE", streams)
+
+    async def unsubscribe(self, streams):
+        self.streams.difference_update(streams)
+        await self._send("UNSUBSCRIBE", streams)
+
+    async def _send(self, method, streams):
+        if self.wss is None or self.wss.closed:
+            return
+
+        self._request_id += 1
+        message = self.connector._subscription_message(method, list(streams), self._request_id)
+        await self.wss.send_json(message)
+
+    async def _connect(self):
+        """Opens websocket for current streams, retrying with jittered exponential backoff
+
+        Returns:
+            aiohttp.ClientWebSocketResponse: websocket, None if connection is closing
+        """
+        attempt = 0
+        while not self._closing:
+            url = self.connector._combined_stream_url(sorted(self.streams))
+            self.logger.info(f"Connecting to websocket with {len(self.streams)} streams")
+            try:
+                return await self.connector.session.ws_connect(url, heartbeat=self.connector.WSS_HEARTBEAT)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                delay = min(self.connector.BACKOFF_MAX, self.connector.BACKOFF_BASE * 2 ** attempt)
+                delay *= random.uniform(0.5, 1.0)
+                attempt += 1
+                self.logger.warning(f"Failed to connect ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        return None
+
+    async def _run(self, wss):
+        while wss is not None:
+            if self._closing:
+                # opened while connection was being closed
+                await wss.close()
+                break
+
+            self.wss = wss
+            listener = asyncio.ensure_future(self._listen(wss))
+            done, _ = await asyncio.wait([listener], timeout=self.connector.MAX_CONNECTION_AGE)
+
+            if self._closing:
+                await listener
+                break
+
+            if listener in done:
+                self.logger.warning("Connection dropped, reconnecting")
+                self.reconnects += 1
+                RECONNECTS.inc()
+                wss = await self._connect()
+                if wss is not None:
+                    await self.connector._on_reconnect(sorted(self.streams))
+                continue
+
+            # rollover, old socket keeps receiving until new one is open
+            self.logger.info("Rolling over connection")
+            wss = await self._connect()
+            await asyncio.sleep(self.connector.ROLLOVER_OVERLAP)
+            await self.wss.close()
+            await listener
+
+    async def _listen(self, wss):
+        while True:
+            if wss.closed:
+                self.logger.info("Connection is closed")
+                break
+            msg = await wss.receive()
+            await self.connector._handle_wss(msg, wss)
+
+
 class Connector(Base):
+    # maximum number of streams a single websocket connection may carry
+    MAX_STREAMS_PER_CONNECTION = 1024
+    # connections are rolled over before exchange drops them (seconds)
+    MAX_CONNECTION_AGE = 23 * 60 * 60
+    ROLLOVER_OVERLAP = 1
+    # reconnect backoff (seconds)
+    BACKOFF_BASE = 1
+    BACKOFF_MAX = 60
+    WSS_HEARTBEAT = 30
+    # HTTP connection pool, connections are kept alive between requests
+    POOL_SIZE = 64
+    KEEPALIVE_TIMEOUT = 60
+    DNS_CACHE_TTL = 300
+    # cached REST responses, rows bound memory (1000 klines take ~0.8 MB)
+    RESPONSE_CACHE_SIZE = 1000
+    RESPONSE_CACHE_ROWS = 50_000
+
     def __init__(self):
         self.session = False
+        self.connections = []
+        self.handlers = {}      # stream name -> handler
+        self.pipeline = None    # processing pipeline fed by websocket frames
+        self.rate_limiter = None    # ratelimit.WeightLimiter shared by all requests
+        self.cache = ResponseCache(self.RESPONSE_CACHE_SIZE, self.RESPONSE_CACHE_ROWS)
+        self._flights = SingleFlight()     # GET requests in flight
+        self._shutdown_hooks = []
 
         self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+        self._frame_log = SampledLogger(self.logger)
 
 
     async def __aenter__(self):
         # create session on enter
         self.logger.info("Starting session")
-        self.session = aiohttp.ClientSession()
+        self.session = aiohttp.ClientSession(connector=self._tcp_connector())
+
+        if self.pipeline is not None:
+            self.pipeline.start()
         return self
         
     async def __aexit__(self, *args):
+        for connection in list(self.connections):
+            await connection.close()
+        self.connections = []
+
+        if self.pipeline is not None:
+            await self.pipeline.stop()
+
+        # drain buffers etc. in reverse order of registration
+        for hook in reversed(self._shutdown_hooks):
+            await hook()
+        self._shutdown_hooks = []
+
         self.logger.info("Closing session")
         await self.session.close()
+
+    def _tcp_connector(self):
+        """Connection pool shared by REST requests and websockets"""
+        return aiohttp.TCPConnector(
+            limit=self.POOL_SIZE,
+            keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=self.DNS_CACHE_TTL,
+        )
     
+    def add_shutdown_hook(self, hook):
+        """Registers coroutine function awaited on exit, after pipeline is drained
+
+        Args:
+            hook (function): coroutine function without arguments
+        """
+        self._shutdown_hooks.append(hook)
+
     @property
     @abstractmethod
     def api_endpoint():
@@ -51,21 +237,86 @@ class Connector(Base):
         raise BadResponseError(response["error"])
 
 
-    async def _request(self, endpoint, params={}):
+    async def _request(self, endpoint, params={}, weight=1, method="GET", signed=False, ttl=None):
         """Creates HTTP request
 
+        Unsigned GET requests are coalesced, concurrent identical requests
+        are sent once and share the response. With ttl successful response
+        is cached and identical requests are answered from cache until it
+        expires. Shared responses must not be modified.
+
         Args:
             endpoint (string): API endpoint
             params (dict, optional): request parameters. Defaults to {}.
+            weight (int, optional): request weight counted by rate limiter. Defaults to 1.
+            method (string, optional): HTTP method. Defaults to "GET".
+            signed (bool, optional): sign request with API secret, see _sign. Defaults to False.
+            ttl (float, optional): seconds response is cached for. Defaults to None, not cached.
 
         Returns:
             string: response
         """
+        if method != "GET" or signed:
+            return await self._send_request(endpoint, params, weight, method, signed)
+
+        key = request_key(endpoint, params)
+        if ttl:
+            response = self.cache.get(key)
+            if response is not None:
+                REST_CACHE_HITS.labels(endpoint).inc()
+                return response
+
+        if key in self._flights:
+            REST_COALESCED.labels(endpoint).inc()
+        response = await self._flights.do(key, lambda: self._send_request(endpoint, params, weight, method, signed))
+
+        if ttl and response["ok"]:
+            data = response["data"]
+            self.cache.put(key, response, ttl, rows=len(data) if isinstance(data, list) else 1)
+        return response
+
+    async def _send_request(self, endpoint, params, weight, method, signed):
         url = f"{self.api_endpoint}/{endpoint}"
-        
-        self.logger.info(f"GET request to: {url} | params: {params}")
-        async with self.session.get(url, params=params) as response:
-            return await self._validate_response(response)
+        headers = None
+
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(weight)
+
+        self.logger.debug("%s request to: %s | params: %s", method, url, params)
+        REST_WEIGHT.labels(endpoint).inc(weight)
+
+        if signed:
+            # signature covers exact query string, it must not be encoded again
+            query, headers = self._sign(params)
+            url, params = URL(f"{url}?{query}", encoded=True), None
+
+        started = perf_counter()
+        async with self.session.request(method, url, params=params, headers=headers) as response:
+            if self.rate_limiter is not None:
+                self._update_rate_limiter(response)
+            result = await self._validate_response(response)
+
+        REST_LATENCY.labels(endpoint).observe(perf_counter() - started)
+        REST_REQUESTS.labels(endpoint, str(response.status)).inc()
+        return result
+
+    @abstractmethod
+    def _sign(self, params):
+        """Signs request parameters
+
+        Args:
+            params (dict): request parameters
+
+        Returns:
+            tuple: signed query string and request headers
+        """
+        pass
+
+    def _update_rate_limiter(self, response):
+        self.rate_limiter.update(response.headers)
+
+        if response.status in (418, 429):
+            self.rate_limiter.pause(int(response.headers.get("Retry-After", 60)))
 
 
     async def _validate_response(self, response):
@@ -100,6 +351,87 @@ class Connector(Base):
             }
         }
     
+    async def subscribe(self, streams, handler):
+        """Subscribes to streams, sharding them across combined stream connections
+
+        Streams are added to connections which still have free slots first,
+        remaining streams are spread over newly opened connections so that no
+        connection exceeds MAX_STREAMS_PER_CONNECTION.
+
+        Args:
+            streams (list): stream names e.g. ["btcusdt@kline_1m"]
+            handler (function): called with payload of every frame from these streams
+        """
+        new_streams = [stream for stream in streams if stream not in self.handlers]
+        for stream in streams:
+            self.handlers[stream] = handler
+
+        # fill up open connections first
+        for connection in self.connections:
+            if not new_streams:
+                break
+            if connection.free_slots <= 0:
+                continue
+            chunk, new_streams = new_streams[:connection.free_slots], new_streams[connection.free_slots:]
+            await connection.subscribe(chunk)
+
+        # open new connections for the rest
+        size = self.MAX_STREAMS_PER_CONNECTION
+        for i in range(0, len(new_streams), size):
+            connection = StreamConnection(self, new_streams[i:i + size])
+            self.connections.append(connection)
+            await connection.open()
+
+    async def unsubscribe(self, streams):
+        """Unsubscribes from streams, closing connections which are left empty
+
+        Args:
+            streams (list): stream names
+        """
+        streams = set(streams)
+        for stream in streams:
+            self.handlers.pop(stream, None)
+
+        for connection in list(self.connections):
+            removed = connection.streams & streams
+            if not removed:
+                continue
+
+            if removed == connection.streams:
+                connection.streams.clear()
+                self.connections.remove(connection)
+                await connection.close()
+            else:
+                await connection.unsubscribe(removed)
+
+    async def listen(self):
+        """Waits until all stream connections are closed"""
+        while True:
+            tasks = [c.task for c in self.connections if c.task is not None and not c.task.done()]
+            if not tasks:
+                self.logger.info("No open stream connections, exiting")
+                break
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+
+            # drop connections closed by remote end
+            self.connections = [c for c in self.connections if not c.task.done()]
+
+    async def _on_reconnect(self, streams):
+        """Called after dropped connection is reopened, before its frames are processed
+
+        Args:
+            streams (list): streams carried by the connection
+        """
+        pass
+
+    @abstractmethod
+    def _combined_stream_url(self, streams):
+        pass
+
+    @abstractmethod
+    def _subscription_message(self, method, streams, request_id):
+        pass
+
     async def _wss_listen(self, url):
         """Connects to websocket stream at specified url
 
@@ -114,10 +446,10 @@ class Connector(Base):
                 self.logger.info("Connection is closed, exiting")
                 break
             msg = await self.wss.receive()
-            await self._handle_wss(msg)
+            await self._handle_wss(msg, self.wss)
 
 
-    async def _handle_wss(self, message):
+    async def _handle_wss(self, message, websocket):
         """Handler function for different incoming frames from websocket stream
 
         Args:
@@ -127,25 +459,27 @@ class Connector(Base):
         msg_type = message.type
 
         if msg_type is aiohttp.WSMsgType.TEXT:
-            self._handle_wss_data(message.data)
+            FRAMES_RECEIVED.inc()
+            self._frame_log.debug("Frame: %.200s", message.data)
+            await self._handle_wss_data(message.data)
         elif msg_type is aiohttp.WSMsgType.PING:
-            self._handle_wss_ping(message.data)
+            await self._handle_wss_ping(message.data, websocket)
         elif msg_type is aiohttp.WSMsgType.CLOSE:
             self._handle_wss_close(message.data)
         elif msg_type is aiohttp.WSMsgType.ERROR:
             self._handle_wss_error(message.data)
 
 
-    def _handle_wss_ping(self, data):
-        self.logger.info("Replying to ping frame")
-        self.wss.pong()
+    async def _handle_wss_ping(self, data, websocket):
+        self.logger.debug("Replying to ping frame")
+        await websocket.pong(data)
 
     def _handle_wss_close(self, data):
         self.logger.info("Received close frame from websocket")
 
     def _handle_wss_error(self, data):
-        self.logger.warning(message)
+        self.logger.warning(data)
 
     @abstractmethod
-    def _handle_wss_data(self, data):
+    async def _handle_wss_data(self, data):
         pass
@@ -0,0 +1,354 @@
+import numpy as np
+
+from abc import abstractmethod
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Type, Union
+
+
+from base import Base
+from ta import crossover_signals
+from utils import lazy_import
+
+talib = lazy_import("talib")
+
+# registered indicator classes by name
+REGISTRY: Dict[str, Type['Node']] = {}
+
+TKey = Tuple[str, Tuple[Tuple[str, Any], ...]]
+TOutput = Union[np.ndarray, Tuple[np.ndarray, ...]]
+
+
+class Signal(NamedTuple):
+    indicator: str          # label of indicator node e.g. "macd(fast=12, signal=9, slow=26)"
+    kind: str               # e.g. "golden_cross", "overbought"
+    direction: int          # 1 bullish, -1 bearish
+    value: float            # indicator value at signal
+
+
+class SignalSet(NamedTuple):
+    pair: str
+    interval: str
+    open_time: int                  # open time of evaluated candle in ms
+    values: Dict[str, Any]          # label -> newest value (tuple for multi-output indicators)
+    signals: List[Signal]           # signals fired by newest candle
+
+
+def register(cls: Type['Node']) -> Type['Node']:
+    """Class decorator adding indicator to registry under its name"""
+    assert cls.name not in REGISTRY, f"Indicator {cls.name} is already registered"
+    REGISTRY[cls.name] = cls
+    return cls
+
+
+def create(name: str, **params) -> 'Node':
+    """Creates registered indicator
+
+    Args:
+        name (str): indicator name e.g. "rsi"
+        params: indicator parameters e.g. timeperiod=14
+
+    Returns:
+        Node: indicator node
+    """
+    return REGISTRY[name](**params)
+
+
+class Node(Base):
+    """
+    Vertex of evaluation graph.
+
+    Node is identified by its name and parameters so equal nodes declared by
+    different indicators are computed once. `compute` gets outputs of nodes
+    returned by `dependencies` in the same order.
+    """
+    name: str = None
+
+    def __init__(self, **params):
+        self.params = params
+
+    @property
+    def key(self) -> TKey:
+        return self.name, tuple(sorted(self.params.items()))
+
+    @property
+    def label(self) -> str:
+        params = ", ".join(f"{name}={value}" for name, value in self.key[1])
+        return f"{self.name}({params})"
+
+    def dependencies(self) -> List['Node']:
+        return [Close()]
+
+    @abstractmethod
+    def compute(self, *inputs: np.ndarray) -> TOutput:
+        pass
+
+    def signals(self, output: TOutput, close: np.ndarray) -> List[Signal]:
+        """Returns signals fired by newest value"""
+        return []
+
+    def _signal(self, kind: str, direction: int, value: float) -> Signal:
+        return Signal(self.label, kind, direction, float(value))
+
+
+class Close(Node):
+    name = "close"
+
+    def dependencies(self) -> List[Node]:
+        return []
+
+    def compute(self, close: np.ndarray) -> np.ndarray:
+        return close
+
+
+@register
+class SMA(Node):
+    name = "sma"
+
+    def __init__(self, timeperiod: int):
+        super().__init__(timeperiod=timeperiod)
+
+    def compute(self, close: np.ndarray) -> np.ndarray:
+        return talib.SMA(close, timeperiod=self.params["timeperiod"])
+
+
+@register
+class EMA(Node):
+    name = "ema"
+
+    def __init__(self, timeperiod: int):
+        super().__init__(timeperiod=timeperiod)
+
+    def compute(self, close: np.ndarray) -> np.ndarray:
+        return talib.EMA(close, timeperiod=self.params["timeperiod"])
+
+
+@register
+class StdDev(Node):
+    name = "stddev"
+
+    def __init__(self, timeperiod: int):
+        super().__init__(timeperiod=timeperiod)
+
+    def compute(self, close: np.ndarray) -> np.ndarray:
+        return talib.STDDEV(close, timeperiod=self.params["timeperiod"], nbdev=1)
+
+
+@register
+class Crossover(Node):
+    """
+    Golden (short above long) and death crosses of moving averages
+    """
+    name = "crossover"
+
+    def __init__(self, short_window: int, long_window: int, ma: str = "sma"):
+        assert ma in ("sma", "ema"), f"Unknown moving average {ma}"
+        super().__init__(short_window=short_window, long_window=long_window, ma=ma)
+
+    def dependencies(self) -> List[Node]:
+        ma = REGISTRY[self.params["ma"]]
+        return [ma(self.params["short_window"]), ma(self.params["long_window"])]
+
+    def compute(self, ma_short: np.ndarray, ma_long: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return ma_short, ma_long
+
+    def signals(self, output, close):
+        ma_short, ma_long = output
+        relation, crosses = crossover_signals(ma_short[None], ma_long[None])
+        if not crosses[0, -1]:
+            return []
+
+        direction = int(relation[0, -1])
+        kind = "golden_cross" if direction == 1 else "death_cross"
+        return [self._signal(kind, direction, ma_short[-1])]
+
+
+@register
+class MACD(Node):
+    """
+    MACD line (fast EMA - slow EMA), its signal line EMA and histogram
+    """
+    name = "macd"
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        super().__init__(fast=fast, slow=slow, signal=signal)
+
+    def dependencies(self) -> List[Node]:
+        return [EMA(self.params["fast"]), EMA(self.params["slow"])]
+
+    def compute(self, ema_fast: np.ndarray, ema_slow: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        macd = ema_fast - ema_slow
+        if np.count_nonzero(~np.isnan(macd)) < self.params["signal"]:
+            signal = np.full(macd.shape, np.nan)
+        else:
+            # TA-Lib skips leading NaNs of slow EMA warm-up
+            signal = talib.EMA(macd, timeperiod=self.params["signal"])
+        return macd, signal, macd - signal
+
+    def signals(self, output, close):
+        macd, signal, histogram = output
+        previous, current = histogram[-2:] if len(histogram) > 1 else (np.nan, np.nan)
+        if np.isnan(previous) or np.isnan(current) or np.sign(previous) == np.sign(current) or current == 0:
+            return []
+
+        direction = 1 if current > 0 else -1
+        kind = "macd_cross_up" if direction == 1 else "macd_cross_down"
+        return [self._signal(kind, direction, macd[-1])]
+
+
+@register
+class RSI(Node):
+    name = "rsi"
+
+    def __init__(self, timeperiod: int = 14, overbought: float = 70, oversold: float = 30):
+        super().__init__(timeperiod=timeperiod, overbought=overbought, oversold=oversold)
+
+    def compute(self, close: np.ndarray) -> np.ndarray:
+        return talib.RSI(close, timeperiod=self.params["timeperiod"])
+
+    def signals(self, output, close):
+        previous, current = output[-2:] if len(output) > 1 else (np.nan, np.nan)
+        if np.isnan(previous) or np.isnan(current):
+            return []
+
+        # signals fire when RSI enters zone
+        if current > self.params["overbought"] >= previous:
+            return [self._signal("overbought", -1, current)]
+        if current < self.params["oversold"] <= previous:
+            return [self._signal("oversold", 1, current)]
+        return []
+
+
+@register
+class Bollinger(Node):
+    """
+    Bollinger Bands, SMA +- nbdev standard deviations
+    """
+    name = "bollinger"
+
+    def __init__(self, timeperiod: int = 20, nbdev: float = 2.0):
+        super().__init__(timeperiod=timeperiod, nbdev=nbdev)
+
+    def dependencies(self) -> List[Node]:
+        return [SMA(self.params["timeperiod"]), StdDev(self.params["timeperiod"]), Close()]
+
+    def compute(self, middle: np.ndarray, stddev: np.ndarray, close: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        band = self.params["nbdev"] * stddev
+        return middle + band, middle, middle - band
+
+    def signals(self, output, close):
+        upper, middle, lower = output
+        if len(close) < 2 or np.isnan(upper[-2]):
+            return []
+
+        # signals fire when close leaves band
+        if close[-1] > upper[-1] and close[-2] <= upper[-2]:
+            return [self._signal("above_upper_band", -1, close[-1])]
+        if close[-1] < lower[-1] and close[-2] >= lower[-2]:
+            return [self._signal("below_lower_band", 1, close[-1])]
+        return []
+
+
+class Evaluator:
+    """
+    Evaluates indicators declared by strategy as one graph.
+
+    Nodes shared by indicators (e.g. EMA feeding both MACD and crossover) are
+    computed once per evaluation, in dependency order, over whole close
+    array in vectorized TA-Lib/NumPy calls.
+    """
+
+    def __init__(self, indicators: Iterable[Union[Node, Tuple[str, Dict[str, Any]]]] = ()):
+        """
+        Args:
+            indicators (Iterable, optional): nodes or (name, params) tuples e.g. ("rsi", {"timeperiod": 14})
+        """
+        self.outputs: List[Node] = []     # declared indicators
+        self.order: List[Node] = []       # all nodes in dependency order
+        self._keys = set()
+
+        for indicator in indicators:
+            self.add(indicator)
+
+    def add(self, indicator: Union[Node, Tuple[str, Dict[str, Any]]]) -> Node:
+        """Declares indicator, its dependencies are added to the graph once
+
+        Args:
+            indicator (Node | tuple): node or (name, params) tuple
+
+        Returns:
+            Node: declared node
+        """
+        if not isinstance(indicator, Node):
+            name, params = indicator
+            indicator = create(name, **params)
+
+        self._add_node(indicator)
+        if all(node.key != indicator.key for node in self.outputs):
+            self.outputs.append(indicator)
+        return indicator
+
+    def _add_node(self, node: Node) -> None:
+        if node.key in self._keys:
+            return
+        for dependency in node.dependencies():
+            self._add_node(dependency)
+
+        self._keys.add(node.key)
+        self.order.append(node)
+
+    def compute(self, close: np.ndarray, cache=None) -> Dict[TKey, TOutput]:
+        """Computes every node of the graph
+
+        Args:
+            close (np.ndarray): closes in chronological order
+            cache (cache.SeriesCache, optional): indicator cache of the buffer close comes from,
+                indicators it has registered are taken from it instead of computed
+
+        Returns:
+            dict: node key -> output
+        """
+        close = np.asarray(close, dtype=np.float64)
+
+        results = {}
+        for node in self.order:
+            if isinstance(node, Close):
+                results[node.key] = close
+            elif cache is not None and node.name in cache:
+                results[node.key] = cache.get(node.name, **node.params)
+            else:
+                results[node.key] = node.compute(*[results[d.key] for d in node.dependencies()])
+        return results
+
+    def evaluate(
+        self, close: np.ndarray, pair: str = None, interval: str = None, open_time: int = None,
+        cache=None,
+    ) -> SignalSet:
+        """Evaluates declared indicators after candle close
+
+        Args:
+            close (np.ndarray): closes of closed candles in chronological order
+            pair (str, optional): pair of evaluated series
+            interval (str, optional): interval of evaluated series
+            open_time (int, optional): open time of newest candle in ms
+            cache (cache.SeriesCache, optional): indicator cache of the buffer close comes from
+
+        Returns:
+            SignalSet: newest values of declared indicators and signals fired by newest candle
+        """
+        close = np.asarray(close, dtype=np.float64)
+        results = self.compute(close, cache)
+
+        values = {}
+        signals = []
+        for node in self.outputs:
+            output = results[node.key]
+            values[node.label] = _newest(output)
+            if len(close):
+                signals.extend(node.signals(output, close))
+
+        return SignalSet(pair, interval, open_time, values, signals)
+
+
+def _newest(output: TOutput) -> Optional[Union[float, Tuple[float, ...]]]:
+    if isinstance(output, tuple):
+        return tuple(float(o[-1]) if len(o) else None for o in output)
+    return float(output[-1]) if len(output) else None
@@ -0,0 +1,320 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are plain Python objects updated in place,
+recording costs an attribute update (histogram a bisect), nothing is
+formatted or sent until the registry is scraped. Gauges of values that
+already exist elsewhere (e.g. queue sizes) read them with a function at
+scrape time so the hot path doesn't touch them at all.
+"""
+from abc import abstractmethod
+from bisect import bisect_left
+
+from base import Base
+from utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# seconds, suited for query and request latencies
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# seconds, suited for per item processing times
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.1)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metric(Base):
+    """
+    Base of metric types.
+
+    Metric declared with label names holds one child per combination of
+    label values, children are created on first use and recorded directly.
+    """
+    type = None
+
+    def __init__(self, name, help="", labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._children = {}
+
+    def labels(self, *values):
+        """Returns child for label values, keep it instead of looking it up on hot path"""
+        child = self._children.get(values, None)
+        if child is None:
+            assert len(values) == len(self.labelnames), f"{self.name} expects labels {self.labelnames}"
+            child = self._children[values] = self._child()
+        return child
+
+    def _child(self):
+        return self.__class__(self.name)
+
+    def samples(self):
+        """Yields (name suffix, labels, value) of metric or of its children"""
+        if not self.labelnames:
+            yield from self._samples({})
+            return
+
+        for values, child in self._children.items():
+            yield from child._samples(dict(zip(self.labelnames, values)))
+
+    @abstractmethod
+    def _samples(self, labels):
+        pass
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, help="", labels=()):
+        super().__init__(name, help, labels)
+        self.value = 0
+        self._function = None
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set_function(self, function):
+        """Reads value from function when scraped, for counts already kept elsewhere
+
+        Args:
+            function (Callable): function without arguments returning number
+        """
+        self._function = function
+
+    def _samples(self, labels):
+        yield "", labels, self.value if self._function is None else self._function()
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name, help="", labels=()):
+        super().__init__(name, help, labels)
+        self._value = 0
+        self._function = None
+
+    @property
+    def value(self):
+        return self._value if self._function is None else self._function()
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        self._value += amount
+
+    def dec(self, amount=1):
+        self._value -= amount
+
+    def set_function(self, function):
+        """Reads value from function when scraped
+
+        Args:
+            function (Callable): function without arguments returning number
+        """
+        self._function = function
+
+    def _samples(self, labels):
+        yield "", labels, self.value
+
+
+class Histogram(Metric):
+    """
+    Fixed bucket histogram of observed values.
+
+    Each bucket counts observations <= its upper bound (non-cumulative),
+    values above the last bound fall into +Inf bucket. Quantiles are
+    estimated by linear interpolation inside bucket.
+    """
+    type = "histogram"
+
+    def __init__(self, name, buckets=LATENCY_BUCKETS, help="", labels=()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def _child(self):
+        return Histogram(self.name, self.buckets)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimates q-quantile of observed values
+
+        Args:
+            q (float): quantile in [0, 1]
+
+        Returns:
+            float: estimate, None if nothing was observed
+        """
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):
+                    # +Inf bucket has no upper bound
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+
+        return self.buckets[-1]
+
+    def snapshot(self):
+        buckets = {str(bound): count for bound, count in zip(self.buckets, self.counts)}
+        buckets["+Inf"] = self.counts[-1]
+
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+    def _samples(self, labels):
+        # exposition format uses cumulative buckets
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            yield "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+        yield "_sum", labels, self.sum
+        yield "_count", labels, self.count
+
+
+class Registry:
+    """
+    Named metrics rendered together in Prometheus text format
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        assert metric.name not in self.metrics, f"Metric {metric.name} is already registered"
+        self.metrics[metric.name] = metric
+        return metric
+
+    def get(self, name):
+        return self.metrics[name]
+
+    def render(self):
+        """Renders all metrics
+
+        Returns:
+            string: Prometheus text exposition format
+        """
+        lines = []
+        for metric in self.metrics.values():
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# process wide registry scraped by MetricsServer
+REGISTRY = Registry()
+
+
+def counter(name, help="", labels=()):
+    """Creates counter registered in process registry"""
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def gauge(name, help="", labels=()):
+    """Creates gauge registered in process registry"""
+    return REGISTRY.register(Gauge(name, help, labels))
+
+
+def histogram(name, help="", labels=(), buckets=LATENCY_BUCKETS):
+    """Creates histogram registered in process registry"""
+    return REGISTRY.register(Histogram(name, buckets, help, labels))
+
+
+def _escape(value, quote=False):
+    value = str(value).replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quote else value
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value, quote=True)}"' for name, value in labels.items())
+    return f"{{{pairs}}}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsServer:
+    """
+    Serves registry on GET /metrics for Prometheus scraping.
+
+    Listens on loopback unless another host is given, metrics reveal
+    pairs, positions and order flow so exposing them must be deliberate.
+    """
+
+    def __init__(self, registry=REGISTRY):
+        self.registry = registry
+        self.url = None
+        self._runner = None
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *a):
+        await self.stop()
+
+    async def start(self, host="127.0.0.1", port=8000):
+        """Starts server, port 0 picks free port
+
+        Args:
+            host (string, optional): interface to listen on. Defaults to "127.0.0.1".
+            port (int, optional): port. Defaults to 8000.
+
+        Returns:
+            string: url of metrics endpoint
+        """
+        # web server is loaded only by processes serving metrics
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/metrics"
+        self.logger.info(f"Serving metrics on {self.url}")
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _metrics(self, request):
+        from aiohttp import web
+
+        return web.Response(body=self.registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
@@ -0,0 +1,167 @@
+"""
+Migrates legacy candlestick table (string columns, serial id) to numeric,
+month partitioned layout.
+
+Legacy table is renamed to candlestick_legacy, new table is created and rows
+are copied month by month with casts. Legacy table is kept unless
+--drop-legacy is passed.
+
+Legacy times are naive local times of the bot, they are converted to UTC
+which new table is keyed by. On PostgreSQL they are read in --timezone
+(defaults to session time zone), on SQLite in local time of this process.
+Candlestick table of the numeric layout with naive times is converted in
+place on PostgreSQL.
+
+Usage:
+    python migrate.py [--drop-legacy] [--timezone=Europe/Berlin]
+"""
+import sys
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import TIMESTAMP, BigInteger, Double, cast, column, func, inspect, select, table, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+import database
+from models import Base as DbBase, Candlestick
+from utils import setup_logging
+
+logger = setup_logging(__name__)
+
+LEGACY_TABLE = "candlestick_legacy"
+
+VALUE_COLUMNS = ("open", "high", "low", "close", "volume", "quote_asset_volume")
+
+
+def _legacy_table():
+    columns = ("trades_amount", "pair", "interval") + VALUE_COLUMNS
+    return table(
+        LEGACY_TABLE,
+        column("open_time", TIMESTAMP(False)),
+        column("close_time", TIMESTAMP(False)),
+        *(column(name) for name in columns)
+    )
+
+
+def _is_legacy(engine):
+    inspector = inspect(engine)
+    if not inspector.has_table(Candlestick.__tablename__):
+        return False
+
+    columns = {c["name"] for c in inspector.get_columns(Candlestick.__tablename__)}
+    return "id" in columns
+
+
+def _rename_legacy(connection):
+    logger.info(f"Renaming candlestick table to {LEGACY_TABLE}")
+    connection.execute(text(f"ALTER TABLE candlestick RENAME TO {LEGACY_TABLE}"))
+
+    if connection.dialect.name == "postgresql":
+        # constraint indexes share namespace with the new table ones
+        connection.execute(text(
+            f"ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT candlestick_pkey TO {LEGACY_TABLE}_pkey"
+        ))
+
+
+def _to_utc(connection, value, zone):
+    """SQL expression converting naive local time to UTC"""
+    if connection.dialect.name == "postgresql":
+        if zone is not None:
+            return func.timezone(zone, value)
+        return cast(value, TIMESTAMP(timezone=True))
+
+    # SQLite 'utc' modifier reads time as local, text format matches stored datetimes
+    return func.strftime("%Y-%m-%d %H:%M:%S.000000", value, "utc")
+
+
+def _copy_month(connection, legacy, start, end, zone=None):
+    new = Candlestick.__table__
+    insert = postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+
+    query = select(
+        _to_utc(connection, legacy.c.open_time, zone),
+        _to_utc(connection, legacy.c.close_time, zone),
+        cast(legacy.c.trades_amount, BigInteger),
+        func.upper(legacy.c.pair),
+        legacy.c.interval,
+        *(cast(legacy.c[name], Double) for name in VALUE_COLUMNS),
+    ).where(legacy.c.open_time >= start, legacy.c.open_time < end)
+
+    names = ["open_time", "close_time", "trades_amount", "pair", "interval", *VALUE_COLUMNS]
+    stmt = insert(new).from_select(names, query).on_conflict_do_nothing(index_elements=database.CANDLESTICK_KEY)
+    return connection.execute(stmt).rowcount
+
+
+def _months(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        yield datetime(year, month, 1), datetime(next_year, next_month, 1)
+        year, month = next_year, next_month
+
+
+def _has_local_times(engine):
+    """Whether candlestick table of numeric layout still has naive local times"""
+    if engine.dialect.name != "postgresql" or not inspect(engine).has_table(Candlestick.__tablename__):
+        return False
+
+    columns = {c["name"]: c["type"] for c in inspect(engine).get_columns(Candlestick.__tablename__)}
+    return not getattr(columns["open_time"], "timezone", False)
+
+
+def _convert_local_times(connection, zone):
+    logger.info("Converting candlestick times to UTC")
+    # DDL takes no bind parameters
+    using = "{0}::timestamptz" if zone is None else "{0} AT TIME ZONE '" + zone.replace("'", "''") + "'"
+    for name in ("open_time", "close_time"):
+        connection.execute(text(f"ALTER TABLE candlestick ALTER COLUMN {name} TYPE timestamptz USING {using.format(name)}"))
+
+
+def migrate(drop_legacy=False, zone=None):
+    """Migrates candlestick table to current layout
+
+    Args:
+        drop_legacy (bool, optional): drop legacy table once copied. Defaults to False.
+        zone (string, optional): time zone legacy times were stored in, PostgreSQL only.
+            Defaults to session time zone.
+    """
+    engine = database.get_engine()
+    legacy = _legacy_table()
+
+    if _is_legacy(engine):
+        with engine.begin() as connection:
+            _rename_legacy(connection)
+    elif _has_local_times(engine):
+        with engine.begin() as connection:
+            _convert_local_times(connection, zone)
+
+    DbBase.metadata.create_all(engine)
+
+    if not inspect(engine).has_table(LEGACY_TABLE):
+        logger.info("Nothing to migrate")
+        return
+
+    with engine.connect() as connection:
+        start, end = connection.execute(select(func.min(legacy.c.open_time), func.max(legacy.c.open_time))).one()
+
+    if start is not None:
+        db = database.DbManager()
+        # local times are within a day of UTC ones
+        db.ensure_partitions(start - timedelta(days=1), end + timedelta(days=1))
+
+        # one transaction per month keeps transactions short
+        for month_start, month_end in _months(start, end):
+            with engine.begin() as connection:
+                copied = _copy_month(connection, legacy, month_start, month_end, zone)
+            logger.info(f"Copied {copied} candlesticks of {month_start:%Y-%m}")
+
+    if drop_legacy:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+        logger.info(f"Dropped {LEGACY_TABLE}")
+
+
+if __name__ == "__main__":
+    setup_logging(initial=True)
+    zones = [arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--timezone=")]
+    migrate(drop_legacy="--drop-legacy" in sys.argv, zone=zones[0] if zones else None)
@@ -0,0 +1,204 @@
+"""
+In-process mock of exchange order REST API for tests and benchmarks.
+
+Serves signed POST / DELETE / GET /api/v3/order, GET /api/v3/time,
+GET /api/v3/exchangeInfo and GET /api/v3/klines on local aiohttp server. Signatures, API key and recvWindow are verified like
+on exchange, market orders are filled immediately, limit orders stay NEW.
+"""
+import asyncio
+import hashlib
+import hmac
+import itertools
+
+from time import time
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+from utils import setup_logging
+
+logger = setup_logging(__name__)
+
+
+class MockExchange:
+    def __init__(self, api_key="test-key", api_secret="test-secret", prices=None, latency=0.0):
+        """
+        Args:
+            api_key (string, optional): accepted API key. Defaults to "test-key".
+            api_secret (string, optional): secret signatures are verified with. Defaults to "test-secret".
+            prices (dict, optional): symbol -> price market orders are filled at. Defaults to {}.
+            latency (float, optional): seconds added to every response. Defaults to 0.
+        """
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.prices = prices or {}
+        self.latency = latency
+
+        self.orders = {}            # client order id -> order
+        self.klines = {}            # (symbol, interval) -> kline rows sorted by open time
+        self.requests = 0
+        self.fail_next = 0          # next orders are accepted but answered with 503
+        self.reject_next = 0        # next orders are refused for insufficient balance
+
+        self.url = None
+        self._ids = itertools.count(1)
+        self._runner = None
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *a):
+        await self.stop()
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Starts server, port 0 picks free port
+
+        Returns:
+            string: base url to be used as connector API_URL
+        """
+        app = web.Application()
+        app.router.add_post("/api/v3/order", self._new_order)
+        app.router.add_delete("/api/v3/order", self._cancel_order)
+        app.router.add_get("/api/v3/order", self._query_order)
+        app.router.add_get("/api/v3/time", self._time)
+        app.router.add_get("/api/v3/exchangeInfo", self._exchange_info)
+        app.router.add_get("/api/v3/klines", self._klines)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        self.logger.info(f"Mock exchange listening on {self.url}")
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @staticmethod
+    def _error(status, code, msg):
+        return web.json_response({"code": code, "msg": msg}, status=status)
+
+    async def _authenticate(self, request):
+        """Verifies API key, signature and timestamp
+
+        Returns:
+            tuple: (params, None) or (None, error response)
+        """
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if request.headers.get("X-MBX-APIKEY") != self.api_key:
+            return None, self._error(401, -2014, "API-key format invalid.")
+
+        query, _, signature = request.query_string.rpartition("&signature=")
+        expected = hmac.new(self.api_secret.encode(), query.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(signature, expected):
+            return None, self._error(400, -1022, "Signature for this request is not valid.")
+
+        params = dict(parse_qsl(query))
+        if abs(time() * 1000 - int(params.get("timestamp", 0))) > int(params.get("recvWindow", 5000)):
+            return None, self._error(400, -1021, "Timestamp for this request is outside of the recvWindow.")
+
+        return params, None
+
+    async def _new_order(self, request):
+        params, error = await self._authenticate(request)
+        if error is not None:
+            return error
+
+        client_order_id = params.get("newClientOrderId") or f"mock-{next(self._ids)}"
+        if client_order_id in self.orders:
+            return self._error(400, -2010, "Duplicate order sent.")
+
+        if self.reject_next > 0:
+            self.reject_next -= 1
+            return self._error(400, -2010, "Account has insufficient balance for requested action.")
+
+        symbol, order_type = params["symbol"], params["type"]
+        quantity = float(params["quantity"])
+        if order_type == "LIMIT" and ("price" not in params or "timeInForce" not in params):
+            return self._error(400, -1102, "Mandatory parameter was not sent.")
+
+        market = order_type == "MARKET"
+        order = self.orders[client_order_id] = {
+            "symbol": symbol,
+            "orderId": next(self._ids),
+            "clientOrderId": client_order_id,
+            "transactTime": int(time() * 1000),
+            "price": params.get("price", "0.00000000"),
+            "origQty": params["quantity"],
+            "executedQty": params["quantity"] if market else "0.00000000",
+            "cummulativeQuoteQty": f"{quantity * self.prices.get(symbol, 0.0):f}" if market else "0.00000000",
+            "status": "FILLED" if market else "NEW",
+            "timeInForce": params.get("timeInForce", "GTC"),
+            "type": order_type,
+            "side": params["side"],
+        }
+
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            return self._error(503, -1007, "Timeout waiting for response from backend server.")
+
+        return web.json_response(order)
+
+    async def _cancel_order(self, request):
+        params, error = await self._authenticate(request)
+        if error is not None:
+            return error
+
+        order = self.orders.get(params.get("origClientOrderId"), None)
+        if order is None or order["status"] != "NEW":
+            return self._error(400, -2011, "Unknown order sent.")
+
+        order["status"] = "CANCELED"
+        return web.json_response(order)
+
+    async def _query_order(self, request):
+        params, error = await self._authenticate(request)
+        if error is not None:
+            return error
+
+        order = self.orders.get(params.get("origClientOrderId"), None)
+        if order is None:
+            return self._error(400, -2013, "Order does not exist.")
+
+        return web.json_response(order)
+
+    async def _time(self, request):
+        return web.json_response({"serverTime": int(time() * 1000)})
+
+    async def _exchange_info(self, request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        symbols = request.query.get("symbols", None)
+        symbols = symbols.strip("[]").replace('"', "").split(",") if symbols else list(self.prices)
+        return web.json_response({
+            "timezone": "UTC",
+            "serverTime": int(time() * 1000),
+            "symbols": [{"symbol": symbol, "status": "TRADING"} for symbol in symbols],
+        })
+
+    async def _klines(self, request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        query = request.query
+        start_time = int(query.get("startTime", 0))
+        end_time = int(query.get("endTime", 2 ** 63))
+        rows = [
+            row for row in self.klines.get((query.get("symbol"), query.get("interval")), [])
+            if start_time <= row[0] <= end_time
+        ]
+        return web.json_response(rows[:int(query.get("limit", 500))])
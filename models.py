@@ -1,15 +1,39 @@
-import json
+from dataclasses import dataclass, fields
+from datetime import datetime, timezone
 
-from dataclasses import dataclass, asdict
-from datetime import datetime
-
-from sqlalchemy import Column, String, TIMESTAMP, BigInteger, Integer, Date
+from sqlalchemy import Column, String, TIMESTAMP, BigInteger, Integer, Date, Double, PrimaryKeyConstraint
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.ext.declarative import declarative_base
 
-from utils import convert_timestamp, from_sc_to_human
+from records import Kline   # re-exported, hot path imports it from records
+from utils import from_sc_to_human, ms_to_datetime
 
 Base = declarative_base()
 
+
+class UTCDateTime(TypeDecorator):
+    """
+    TIMESTAMP WITH TIME ZONE holding UTC, values are returned as aware UTC
+    datetimes on every backend. SQLite keeps no offset, its values are UTC
+    already, naive datetimes bound to queries are taken as UTC too.
+    """
+    impl = TIMESTAMP(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
 class ModelBase:
     def _to_json(self):
         """converts object to JSON representation
@@ -17,47 +41,53 @@ class ModelBase:
         Returns:
             [JSON]: JSON representation of object
         """
-        d = asdict(self)
-        
-        # delete id for now
-        del d["id"]
-        
-        # convert datetimes to timestamp
-        for key, value in d.items():
+        d = {}
+        for f in fields(self):
+            # skip id for now
+            if f.name == "id":
+                continue
+
+            value = getattr(self, f.name)
+            # convert datetimes to timestamp
             if isinstance(value, datetime):
-                d[key] = int(datetime.timestamp(value))
+                value = int(datetime.timestamp(value))
+            d[f.name] = value
 
-        return json.loads(json.dumps(d))
+        return d
 
 @dataclass
 class Candlestick(Base, ModelBase):
     __tablename__ = 'candlestick'
+    # on PostgreSQL table is partitioned by month, see DbManager.ensure_partitions
+    __table_args__ = (
+        # doubles as index for range queries of single pair and interval
+        PrimaryKeyConstraint("pair", "interval", "open_time", name="candlestick_pkey"),
+        {"postgresql_partition_by": "RANGE (open_time)"},
+    )
 
     # SQL table columns
-    id = Column(BigInteger, primary_key=True)
-    open_time = Column(TIMESTAMP(False))
-    open = Column(String)
-    high = Column(String)
-    low = Column(String)
-    close = Column(String)
-    volume = Column(String)
-    close_time = Column(TIMESTAMP(False))
-    quote_asset_volume = Column(String)
-    trades_amount = Column(String)
-    pair = Column(String)
-    interval = Column(String)
+    pair = Column(String(20))
+    interval = Column(String(4))
+    open_time = Column(UTCDateTime)
+    open = Column(Double)
+    high = Column(Double)
+    low = Column(Double)
+    close = Column(Double)
+    volume = Column(Double)
+    close_time = Column(UTCDateTime)
+    quote_asset_volume = Column(Double)
+    trades_amount = Column(BigInteger)
 
     # types for dataclass
-    id: int
     open_time: int
-    open: str
-    high: str
-    low: str
-    close: str
-    volume: str
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
     close_time: int
-    quote_asset_volume: str
-    trades_amount: str
+    quote_asset_volume: float
+    trades_amount: int
     pair: str
     interval: str
 
@@ -88,7 +118,9 @@ class Candlestick(Base, ModelBase):
         self.pair = pair
         self.interval = interval
 
-        self.json = self._to_json()
+    @property
+    def json(self):
+        return self._to_json()
 
     def __repr__(self):
         repr_arr = [f"{from_sc_to_human(key)}: {value}" for key, value in self._to_json().items()]
@@ -110,18 +142,18 @@ class Candlestick(Base, ModelBase):
          ) = response
 
         # convert timestamps to datetime
-        open_time, close_time = convert_timestamp([open_time, close_time])
+        open_time, close_time = ms_to_datetime(open_time), ms_to_datetime(close_time)
 
         return Candlestick(
             open_time,
-            open,
-            high,
-            low,
-            close,
-            volume,
+            float(open),
+            float(high),
+            float(low),
+            float(close),
+            float(volume),
             close_time,
-            quote_asset_volume,
-            trades_amount,
+            float(quote_asset_volume),
+            int(trades_amount),
             pair,
             interval
         )
@@ -129,19 +161,20 @@ class Candlestick(Base, ModelBase):
     @staticmethod
     def extract_candlestick_from_wss(data: dict) -> 'self':
         return Candlestick(
-            open_time = convert_timestamp(data.get("t", None)),
-            open = data.get("o", None),
-            high = data.get("h", None),
-            low = data.get("l", None),
-            close = data.get("c", None),
-            volume = data.get("v", None),
-            close_time = convert_timestamp(data.get("T", None)),
-            quote_asset_volume = data.get("q", None),
-            trades_amount = data.get("n", None),
+            open_time = ms_to_datetime(data["t"]),
+            open = float(data["o"]),
+            high = float(data["h"]),
+            low = float(data["l"]),
+            close = float(data["c"]),
+            volume = float(data["v"]),
+            close_time = ms_to_datetime(data["T"]),
+            quote_asset_volume = float(data["q"]),
+            trades_amount = int(data["n"]),
             pair = data.get("s", None),
             interval = data.get("i", None),
         )
 
+
 # debug 
 if __name__ == "__main__":
     mock_c_wss = {
@@ -149,8 +182,8 @@ if __name__ == "__main__":
     "E": 123456789,   
     "s": "BNBBTC",    
     "k": {
-        "t": datetime.timestamp(datetime.now()), 
-        "T": datetime.timestamp(datetime.now()), 
+        "t": int(datetime.timestamp(datetime.now()) * 1000), 
+        "T": int(datetime.timestamp(datetime.now()) * 1000), 
         "s": "BNBBTC",  
         "i": "1m",      
         "f": 100,       
@@ -0,0 +1,345 @@
+import asyncio
+
+import numpy as np
+
+from exceptions import BadResponseError
+from utils import setup_logging
+
+logger = setup_logging(__name__)
+
+BID = 1
+ASK = -1
+
+
+class BookSide:
+    """
+    Price levels of one side of order book in fixed capacity arrays.
+
+    Levels are kept sorted best first, so best price is at index 0 and top n
+    levels are zero-copy slices. Level is found by binary search over sort
+    keys (price, negated for bids) and inserted or removed by shifting the
+    arrays, only the best `capacity` levels are kept which bounds memory
+    per book. Diffs touch few levels near the top, so shifts are short.
+    """
+
+    def __init__(self, side, capacity=1000):
+        self.side = side            # BID sorts descending, ASK ascending
+        self.capacity = capacity
+        self.size = 0
+
+        self._levels = np.zeros((3, capacity), dtype=np.float64)    # sort key, price, quantity rows
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def prices(self):
+        return self._levels[1, :self.size]
+
+    @property
+    def quantities(self):
+        return self._levels[2, :self.size]
+
+    @property
+    def best(self):
+        return self._levels[1, 0] if self.size else None
+
+    def top(self, n):
+        """Returns (prices, quantities) views of n best levels"""
+        n = min(n, self.size)
+        return self._levels[1, :n], self._levels[2, :n]
+
+    def clear(self):
+        self.size = 0
+
+    def load(self, levels):
+        """Replaces levels with snapshot levels
+
+        Args:
+            levels (list): [["price", "quantity"], ...]
+        """
+        levels = np.array(levels, dtype=np.float64).reshape(-1, 2)
+        levels = levels[levels[:, 1] > 0]
+        keys = -self.side * levels[:, 0]
+        order = np.argsort(keys, kind="stable")[:self.capacity]
+
+        self.size = len(order)
+        self._levels[0, :self.size] = keys[order]
+        self._levels[1:, :self.size] = levels[order].T
+
+    def apply(self, levels):
+        """Sets quantities of price levels, zero quantity removes level
+
+        Args:
+            levels (list): [["price", "quantity"], ...]
+        """
+        data = self._levels
+        keys = data[0]
+        for price, quantity in levels:
+            price = float(price)
+            quantity = float(quantity)
+            key = -self.side * price
+
+            n = self.size
+            i = int(keys[:n].searchsorted(key))
+            if i < n and keys[i] == key:
+                if quantity:
+                    data[2, i] = quantity
+                else:
+                    data[:, i:n - 1] = data[:, i + 1:n]
+                    self.size = n - 1
+            elif quantity and i < self.capacity:
+                # full side drops its worst level
+                n = min(n, self.capacity - 1)
+                data[:, i + 1:n + 1] = data[:, i:n]
+                data[0, i] = key
+                data[1, i] = price
+                data[2, i] = quantity
+                self.size = n + 1
+
+
+class OrderBook:
+    """
+    Local order book of single pair kept in sync by depth diff events.
+
+    Diff events carry first (U) and last (u) update id, book built from
+    snapshot with lastUpdateId accepts the first event covering
+    lastUpdateId + 1 and then only events continuing the sequence
+    (U == previous u + 1), anything else means updates were lost.
+    Levels deeper than snapshot depth may be incomplete.
+    """
+
+    def __init__(self, pair, capacity=1000):
+        self.pair = pair
+        self.bids = BookSide(BID, capacity)
+        self.asks = BookSide(ASK, capacity)
+        self.last_update_id = None  # None until snapshot is applied
+        self.event_time = None      # ms of last applied event
+
+    @property
+    def synced(self):
+        return self.last_update_id is not None
+
+    @property
+    def best_bid(self):
+        return self.bids.best
+
+    @property
+    def best_ask(self):
+        return self.asks.best
+
+    @property
+    def spread(self):
+        if not (self.bids.size and self.asks.size):
+            return None
+        return self.asks.best - self.bids.best
+
+    @property
+    def mid(self):
+        if not (self.bids.size and self.asks.size):
+            return None
+        return (self.asks.best + self.bids.best) / 2
+
+    def top(self, n):
+        """Returns n best levels of both sides
+
+        Returns:
+            tuple: (bid prices, bid quantities, ask prices, ask quantities) array views
+        """
+        return (*self.bids.top(n), *self.asks.top(n))
+
+    def reset(self):
+        self.bids.clear()
+        self.asks.clear()
+        self.last_update_id = None
+
+    def apply_snapshot(self, snapshot):
+        """Replaces book with REST depth snapshot
+
+        Args:
+            snapshot (dict): depth response with lastUpdateId, bids and asks
+        """
+        self.bids.load(snapshot["bids"])
+        self.asks.load(snapshot["asks"])
+        self.last_update_id = snapshot["lastUpdateId"]
+
+    def apply_diff(self, event):
+        """Applies depth diff event
+
+        Args:
+            event (dict): depthUpdate event payload
+
+        Returns:
+            bool: False if event doesn't continue update sequence and book must be resynced
+        """
+        first, last = event["U"], event["u"]
+        if last <= self.last_update_id:
+            # already contained in snapshot
+            return True
+        if first > self.last_update_id + 1:
+            return False
+
+        self.bids.apply(event["b"])
+        self.asks.apply(event["a"])
+        self.last_update_id = last
+        self.event_time = event["E"]
+        return True
+
+
+class OrderBooks:
+    """
+    Order books of many pairs maintained from @depth@100ms diff streams.
+
+    Events of book which is not synced yet are buffered while REST snapshot
+    is fetched, snapshot is then applied together with buffered events. Gap
+    in update ids (e.g. after reconnect) resets the book and starts new sync.
+    """
+
+    # weight of depth request by limit
+    DEPTH_WEIGHTS = ((100, 5), (500, 25), (1000, 50), (5000, 250))
+    # seconds between snapshot attempts
+    RETRY_DELAY = 1.0
+
+    def __init__(self, client, depth=1000, max_buffered=1000):
+        """
+        Args:
+            client (engine.Connector): connector requests and subscriptions go through
+            depth (int, optional): snapshot limit and levels kept per side. Defaults to 1000.
+            max_buffered (int, optional): events buffered per book while syncing. Defaults to 1000.
+        """
+        self.client = client
+        self.depth = depth
+        self.max_buffered = max_buffered
+
+        self.books = {}             # pair -> OrderBook
+        self.resyncs = 0
+        self._buffers = {}          # pair -> events waiting for snapshot
+        self._syncing = {}          # pair -> snapshot task
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    def __getitem__(self, pair):
+        return self.books[pair.upper()]
+
+    def get(self, pair):
+        return self.books.get(pair.upper(), None)
+
+    @staticmethod
+    def stream(pair):
+        return f"{pair.lower()}@depth@100ms"
+
+    async def subscribe(self, pairs):
+        """Subscribes to diff streams of pairs, books sync on first event
+
+        Args:
+            pairs (list): pairs e.g. ["btcusdt", "ethusdt"]
+        """
+        for pair in pairs:
+            self.books.setdefault(pair.upper(), OrderBook(pair.upper(), self.depth))
+        await self.client.subscribe([self.stream(pair) for pair in pairs], self.handle)
+
+    async def unsubscribe(self, pairs):
+        await self.client.unsubscribe([self.stream(pair) for pair in pairs])
+        for pair in pairs:
+            pair = pair.upper()
+            self.books.pop(pair, None)
+            self._buffers.pop(pair, None)
+            task = self._syncing.pop(pair, None)
+            if task is not None:
+                task.cancel()
+
+    async def close(self):
+        """Cancels pending snapshot fetches"""
+        tasks = list(self._syncing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def handle(self, event):
+        """Handles depthUpdate event, called by connector for every frame
+
+        Args:
+            event (dict): event payload
+
+        Returns:
+            None: book updates are not passed to following pipeline stages
+        """
+        pair = event["s"]
+        book = self.books.get(pair, None)
+        if book is None:
+            return None
+
+        if not book.synced:
+            self._buffer(book, event)
+            return None
+
+        if not book.apply_diff(event):
+            self.logger.warning(f"Gap in {pair} depth updates, resyncing")
+            self.resyncs += 1
+            book.reset()
+            self._buffer(book, event)
+        return None
+
+    def _buffer(self, book, event):
+        buffer = self._buffers.setdefault(book.pair, [])
+        buffer.append(event)
+        if len(buffer) > self.max_buffered:
+            del buffer[0]
+
+        if book.pair not in self._syncing:
+            self._syncing[book.pair] = asyncio.ensure_future(self._sync(book))
+
+    async def _sync(self, book):
+        try:
+            while not book.synced:
+                try:
+                    snapshot = await self.fetch_snapshot(book.pair)
+                except BadResponseError as e:
+                    self.logger.warning(f"Failed to fetch {book.pair} depth snapshot: {e}")
+                    await asyncio.sleep(self.RETRY_DELAY)
+                    continue
+
+                if self.books.get(book.pair, None) is not book:
+                    return
+                self._apply_buffered(book, snapshot)
+                if not book.synced:
+                    await asyncio.sleep(self.RETRY_DELAY)
+        finally:
+            self._syncing.pop(book.pair, None)
+
+    def _apply_buffered(self, book, snapshot):
+        """Applies snapshot and buffered events, book stays unsynced if snapshot is too old"""
+        buffer = self._buffers.get(book.pair, [])
+        last_update_id = snapshot["lastUpdateId"]
+
+        # events older than snapshot are dropped
+        while buffer and buffer[0]["u"] <= last_update_id:
+            del buffer[0]
+        if buffer and buffer[0]["U"] > last_update_id + 1:
+            # snapshot predates buffered events, fetch newer one
+            return
+
+        book.apply_snapshot(snapshot)
+        for event in buffer:
+            if not book.apply_diff(event):
+                book.reset()
+                return
+        buffer.clear()
+
+    async def fetch_snapshot(self, pair):
+        """Fetches depth snapshot
+
+        Raises:
+            BadResponseError: exchange responded with error
+
+        Returns:
+            dict: lastUpdateId, bids and asks
+        """
+        params = {"symbol": pair.upper(), "limit": self.depth}
+        return await self.client.request("depth", params=params, weight=self._depth_weight(self.depth))
+
+    def _depth_weight(self, limit):
+        for max_limit, weight in self.DEPTH_WEIGHTS:
+            if limit <= max_limit:
+                return weight
+        return self.DEPTH_WEIGHTS[-1][1]
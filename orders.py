@@ -0,0 +1,243 @@
+import asyncio
+import json
+import uuid
+
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Dict, Optional
+
+from exceptions import BadResponseError
+from metrics import Histogram
+from utils import setup_logging, lazy_import
+
+logger = setup_logging(__name__)
+
+# HTTP client is loaded on first request
+aiohttp = lazy_import("aiohttp")
+
+# order states, exchange reported ones are passed through (NEW, FILLED, CANCELED, ...)
+PENDING = "PENDING"         # not acknowledged by exchange yet
+REJECTED = "REJECTED"       # refused by exchange
+FAILED = "FAILED"           # exchange did not respond, order state is unknown
+
+# exchange error codes
+NEW_ORDER_REJECTED = -2010  # any refused new order, message tells why
+DUPLICATE_ORDER_MESSAGE = "Duplicate order sent."   # order with same client order id was already placed
+
+
+@dataclass
+class Order:
+    client_order_id: str
+    pair: str
+    side: str                           # BUY or SELL
+    quantity: float
+    order_type: str = "MARKET"
+    price: Optional[float] = None
+    time_in_force: Optional[str] = None
+    status: str = PENDING
+    exchange_order_id: Optional[int] = None
+    executed_quantity: float = 0.0
+    error: Optional[dict] = None
+    attempts: int = 0
+    signal_time: float = 0.0            # perf_counter time of signal which created order
+    ack_time: Optional[float] = None    # perf_counter time of exchange acknowledgement
+    response: dict = field(default_factory=dict, repr=False)
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Seconds from signal to exchange acknowledgement"""
+        return None if self.ack_time is None else self.ack_time - self.signal_time
+
+    def to_params(self) -> dict:
+        params = {
+            "symbol": self.pair.upper(),
+            "side": self.side,
+            "type": self.order_type,
+            "quantity": f"{self.quantity:f}",
+            "newClientOrderId": self.client_order_id,
+            "newOrderRespType": "RESULT",
+        }
+        if self.price is not None:
+            params["price"] = f"{self.price:f}"
+        if self.time_in_force is not None:
+            params["timeInForce"] = self.time_in_force
+        return params
+
+
+class OrderManager:
+    """
+    Places and cancels orders through connector signed REST requests.
+
+    Orders are tracked by client order id which makes placing idempotent:
+    placing known id returns existing (or in-flight) order, requests with
+    unknown outcome (timeouts, 5xx) are retried with the same id and an
+    order already accepted by exchange is recovered by querying it.
+    Up to max_in_flight orders are sent concurrently.
+    """
+
+    RETRY_DELAY = 0.1
+
+    def __init__(self, client, max_in_flight=10, retries=2, timeout=10.0):
+        """
+        Args:
+            client (binance.Binance): connector inside its async context
+            max_in_flight (int, optional): orders sent concurrently. Defaults to 10.
+            retries (int, optional): resends of order with unknown outcome. Defaults to 2.
+            timeout (float, optional): seconds to wait for single response. Defaults to 10.
+        """
+        self.client = client
+        self.retries = retries
+        self.timeout = timeout
+
+        self.orders: Dict[str, Order] = {}
+        self.latency = Histogram("order_ack_latency_seconds")
+
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    @staticmethod
+    def new_client_order_id() -> str:
+        return f"kb-{uuid.uuid4().hex}"
+
+    async def place(self, pair, side, quantity, order_type="MARKET", price=None, time_in_force=None,
+                    client_order_id=None, signal_time=None) -> Order:
+        """Places order, placing the same client order id again doesn't send new order
+
+        Args:
+            pair (string): pair e.g. "BTCUSDT"
+            side (string): BUY or SELL
+            quantity (float): base asset quantity
+            order_type (string, optional): exchange order type. Defaults to "MARKET".
+            price (float, optional): limit price
+            time_in_force (string, optional): e.g. "GTC", required by limit orders
+            client_order_id (string, optional): idempotency key. Defaults to new random id.
+            signal_time (float, optional): perf_counter time of signal. Defaults to now.
+
+        Returns:
+            Order: order with exchange acknowledged, REJECTED or FAILED status
+        """
+        signal_time = perf_counter() if signal_time is None else signal_time
+        client_order_id = client_order_id or self.new_client_order_id()
+
+        if client_order_id in self.orders:
+            task = self._in_flight.get(client_order_id, None)
+            if task is not None:
+                await asyncio.shield(task)
+            return self.orders[client_order_id]
+
+        order = self.orders[client_order_id] = Order(
+            client_order_id, pair.upper(), side, quantity, order_type, price, time_in_force,
+            signal_time=signal_time,
+        )
+
+        task = self._in_flight[client_order_id] = asyncio.ensure_future(self._submit(order))
+        task.add_done_callback(lambda _: self._in_flight.pop(client_order_id, None))
+
+        # callers cancelled while waiting don't cancel order submission
+        await asyncio.shield(task)
+        return order
+
+    async def cancel(self, order: Order) -> Order:
+        """Cancels order
+
+        Raises:
+            BadResponseError: exchange responded with error e.g. order is already filled
+
+        Returns:
+            Order: order with exchange reported status
+        """
+        response = await asyncio.wait_for(self.client.cancel_order(order.pair, order.client_order_id), self.timeout)
+        self._apply(order, response)
+        return order
+
+    async def _submit(self, order: Order) -> None:
+        async with self._semaphore:
+            response = await self._send(order)
+
+        if response is None:
+            return
+
+        order.ack_time = perf_counter()
+        self.latency.observe(order.latency)
+        self._apply(order, response)
+
+    async def _send(self, order: Order) -> Optional[dict]:
+        params = order.to_params()
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.RETRY_DELAY * 2 ** (attempt - 1))
+            order.attempts += 1
+
+            try:
+                return await asyncio.wait_for(self.client.create_order(params), self.timeout)
+            except BadResponseError as e:
+                error = e.args[0]
+                status = error.get("status", 0)
+
+                if _is_duplicate(error):
+                    # earlier attempt (or earlier run) was accepted, its response got lost
+                    return await self._recover(order, error)
+                if status < 500:
+                    self._reject(order, error)
+                    return None
+
+                order.error = error
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                order.error = {"text": str(e)}
+
+            self.logger.warning(f"Order {order.client_order_id} outcome unknown, attempt {attempt + 1}")
+
+        order.status = FAILED
+        self.logger.error(f"Order {order.client_order_id} failed after {order.attempts} attempts")
+        return None
+
+    async def _recover(self, order: Order, error: dict) -> Optional[dict]:
+        """Looks up order refused as duplicate, order is rejected if it can't be found"""
+        try:
+            return await asyncio.wait_for(self.client.get_order(order.pair, order.client_order_id), self.timeout)
+        except BadResponseError as e:
+            self._reject(order, e.args[0])
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._reject(order, {**error, "lookup_error": str(e)})
+        return None
+
+    def _reject(self, order: Order, error: dict) -> None:
+        order.status = REJECTED
+        order.error = error
+        self.logger.warning(f"Order {order.client_order_id} rejected: {error.get('text')}")
+
+    @staticmethod
+    def _apply(order: Order, response: dict) -> None:
+        order.response = response
+        order.status = response.get("status", order.status)
+        order.exchange_order_id = response.get("orderId", order.exchange_order_id)
+        order.executed_quantity = float(response.get("executedQty", order.executed_quantity))
+        order.error = None
+
+    def stats(self) -> dict:
+        statuses = {}
+        for order in self.orders.values():
+            statuses[order.status] = statuses.get(order.status, 0) + 1
+
+        return {
+            "orders": len(self.orders),
+            "in_flight": len(self._in_flight),
+            "statuses": statuses,
+            "latency": self.latency.snapshot(),
+        }
+
+
+def _is_duplicate(error):
+    body = _error_body(error)
+    return body.get("code", None) == NEW_ORDER_REJECTED and body.get("msg", None) == DUPLICATE_ORDER_MESSAGE
+
+
+def _error_body(error):
+    try:
+        body = json.loads(error.get("text", ""))
+    except (ValueError, AttributeError):
+        return {}
+    return body if isinstance(body, dict) else {}
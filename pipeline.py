@@ -0,0 +1,246 @@
+import asyncio
+
+from abc import abstractmethod
+from time import monotonic, perf_counter
+
+from base import Base
+from metrics import counter, gauge, histogram, FAST_BUCKETS
+from utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# handler time is measured on one of every TIMING_SAMPLE items
+TIMING_SAMPLE = 8
+
+STAGE_SECONDS = histogram(
+    "pipeline_stage_seconds", "Handler time per item, sampled", labels=("stage",), buckets=FAST_BUCKETS
+)
+STAGE_PROCESSED = counter("pipeline_processed_total", "Items processed by stage", labels=("stage",))
+STAGE_ERRORS = counter("pipeline_errors_total", "Items stage handler failed on", labels=("stage",))
+STAGE_DROPPED = counter("pipeline_dropped_total", "Items evicted from full stage queue", labels=("stage",))
+QUEUE_DEPTH = gauge("pipeline_queue_depth", "Items waiting in stage queue", labels=("stage",))
+STAGE_LAG = gauge("pipeline_lag_seconds", "Moving average of time items wait in stage queue", labels=("stage",))
+
+# overflow policies
+BLOCK = "block"                 # producer waits for free slot
+DROP_OLDEST = "drop_oldest"     # oldest droppable item is evicted to make room
+
+
+class StageQueue(asyncio.Queue):
+    """
+    Bounded queue applying overflow policy when full.
+
+    Items are stored as (enqueued_at, item) tuples so consumers can measure lag.
+    With DROP_OLDEST policy the oldest item matching `droppable` is evicted,
+    if no queued item is droppable the producer waits like with BLOCK policy.
+    """
+
+    def __init__(self, maxsize=0, policy=BLOCK, droppable=None):
+        assert policy in (BLOCK, DROP_OLDEST), f"Unknown overflow policy {policy}"
+        super().__init__(maxsize)
+
+        self.policy = policy
+        self.droppable = droppable
+        self.dropped = 0
+
+    async def put(self, item):
+        if self.policy == DROP_OLDEST and self.full():
+            self._evict()
+        await super().put(item)
+
+    def _evict(self):
+        for entry in self._queue:
+            if self.droppable is None or self.droppable(entry[1]):
+                self._queue.remove(entry)
+                self.task_done()
+                self.dropped += 1
+                return True
+        return False
+
+
+class Stage:
+    """
+    Pipeline stage consuming items from bounded queue by pool of workers.
+
+    Handler can be plain function or coroutine function. Its return value is
+    passed to next stage, returning None stops the item in this stage.
+    """
+
+    def __init__(self, name, handler, workers=1, maxsize=1000, policy=BLOCK, droppable=None):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = StageQueue(maxsize, policy, droppable)
+        self.next = None
+
+        self._tasks = []
+        self._is_coroutine = asyncio.iscoroutinefunction(handler)
+
+        # metrics
+        self.processed = 0
+        self.errors = 0
+        self.lag_last = 0.0
+        self.lag_max = 0.0
+        self.lag_avg = 0.0
+
+        # exported metrics read counts above when scraped, stage of the same name created later takes over
+        self._seconds = STAGE_SECONDS.labels(name)
+        STAGE_PROCESSED.labels(name).set_function(lambda: self.processed)
+        STAGE_ERRORS.labels(name).set_function(lambda: self.errors)
+        STAGE_DROPPED.labels(name).set_function(lambda: self.queue.dropped)
+        QUEUE_DEPTH.labels(name).set_function(self.queue.qsize)
+        STAGE_LAG.labels(name).set_function(lambda: self.lag_avg)
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    async def put(self, item):
+        await self.queue.put((monotonic(), item))
+
+    def start(self):
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    async def stop(self, drain=True):
+        """Stops stage workers
+
+        Args:
+            drain (bool, optional): process queued items before stopping. Defaults to True.
+        """
+        if drain and self._tasks:
+            await self.queue.join()
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self):
+        while True:
+            enqueued_at, item = await self.queue.get()
+            self._record_lag(monotonic() - enqueued_at)
+
+            timed = self.processed % TIMING_SAMPLE == 0
+            if timed:
+                started = perf_counter()
+            try:
+                result = self.handler(item)
+                if self._is_coroutine:
+                    result = await result
+            except Exception:
+                self.errors += 1
+                self.logger.exception(f"Stage {self.name} failed to process item")
+            else:
+                if timed:
+                    self._seconds.observe(perf_counter() - started)
+                self.processed += 1
+                if result is not None and self.next is not None:
+                    await self.next.put(result)
+            finally:
+                self.queue.task_done()
+
+    def _record_lag(self, lag):
+        self.lag_last = lag
+        self.lag_max = max(self.lag_max, lag)
+        # exponentially weighted moving average
+        self.lag_avg += 0.05 * (lag - self.lag_avg)
+
+    def metrics(self):
+        return {
+            "depth": self.queue.qsize(),
+            "maxsize": self.queue.maxsize,
+            "workers": self.workers,
+            "processed": self.processed,
+            "dropped": self.queue.dropped,
+            "errors": self.errors,
+            "lag_last": self.lag_last,
+            "lag_avg": self.lag_avg,
+            "lag_max": self.lag_max,
+        }
+
+
+class Pipeline:
+    """
+    Chain of stages connected with bounded queues
+    """
+
+    def __init__(self, stages):
+        assert stages, "Pipeline needs at least one stage"
+        self.stages = stages
+
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next = next_stage
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    async def put(self, item):
+        await self.stages[0].put(item)
+
+    def stage(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(name)
+
+    def start(self):
+        self.logger.info(f"Starting pipeline: {' -> '.join(stage.name for stage in self.stages)}")
+        for stage in self.stages:
+            stage.start()
+
+    async def stop(self, drain=True):
+        # stages are stopped in order so drained items reach following stages
+        for stage in self.stages:
+            await stage.stop(drain)
+        self.logger.info("Pipeline stopped")
+
+    def metrics(self):
+        return {stage.name: stage.metrics() for stage in self.stages}
+
+
+class Batcher(Base):
+    """
+    Background loop flushing batched work.
+
+    Subclasses collect work and implement `flush`, it runs every
+    flush_interval seconds or as soon as `request_flush` is called e.g.
+    once batch is full. Stopping flushes once more so nothing is left.
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+
+        self._flush_requested = asyncio.Event()
+        self._closing = False
+        self._task = None
+
+    def start(self):
+        self._closing = False
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Flushes waiting work and stops flush loop"""
+        self._closing = True
+        if self._task is None:
+            await self.flush()
+            return
+
+        self._flush_requested.set()
+        await self._task
+        self._task = None
+
+    def request_flush(self):
+        self._flush_requested.set()
+
+    @abstractmethod
+    async def flush(self):
+        pass
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+        # drain on shutdown
+        await self.flush()
@@ -0,0 +1,84 @@
+import asyncio
+
+from time import monotonic
+
+from metrics import gauge
+from utils import setup_logging
+
+logger = setup_logging(__name__)
+
+WEIGHT_USED = gauge("rest_weight_used", "Request weight used in current minute as reported by exchange")
+
+
+class WeightLimiter:
+    """
+    Token bucket limiting request weight spent per minute.
+
+    Bucket refills continuously at `weight_per_minute` / 60 per second.
+    Weight reported by exchange in response headers is authoritative and
+    shrinks the bucket when other clients share the same IP.
+    """
+
+    def __init__(self, weight_per_minute, header="X-MBX-USED-WEIGHT-1M"):
+        self.capacity = weight_per_minute
+        self.rate = weight_per_minute / 60
+        self.header = header
+
+        self.tokens = float(weight_per_minute)
+        self.used = 0                   # last weight reported by exchange
+        self._updated_at = monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, weight=1):
+        """Waits until request of given weight can be sent
+
+        Args:
+            weight (int, optional): request weight. Defaults to 1.
+        """
+        # lock keeps waiting requests in order
+        async with self._lock:
+            while True:
+                pause = self._paused_until - monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+
+                self._refill()
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+
+    def update(self, headers):
+        """Syncs bucket with weight used reported by exchange
+
+        Args:
+            headers (dict): response headers
+        """
+        used = headers.get(self.header, None)
+        if used is None:
+            return
+
+        self.used = int(used)
+        WEIGHT_USED.set(self.used)
+        self._refill()
+        self.tokens = min(self.tokens, self.capacity - self.used)
+
+    def pause(self, seconds):
+        """Blocks all requests, used when exchange responds with 429 / 418
+
+        Args:
+            seconds (float): pause duration
+        """
+        self.logger.warning(f"Request weight limit hit, pausing requests for {seconds}s")
+        self._paused_until = max(self._paused_until, monotonic() + seconds)
+        self.tokens = 0.0
@@ -0,0 +1,83 @@
+"""
+Lightweight records of the hot path.
+
+Kept apart from ORM models in models.py so that parsing, aggregation and TA
+don't import SQLAlchemy, models re-exports them.
+"""
+from typing import NamedTuple
+
+from utils import ms_to_datetime
+
+
+class Kline(NamedTuple):
+    """
+    Lightweight kline record with numeric fields, used on hot path instead of
+    ORM Candlestick which is built only for closed klines
+    """
+    open_time: int          # ms
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    close_time: int         # ms
+    quote_asset_volume: float
+    trades_amount: int
+    pair: str
+    interval: str
+    closed: bool
+
+    @classmethod
+    def from_wss(cls, data: dict) -> 'Kline':
+        return cls(
+            data["t"],
+            float(data["o"]),
+            float(data["h"]),
+            float(data["l"]),
+            float(data["c"]),
+            float(data["v"]),
+            data["T"],
+            float(data["q"]),
+            data["n"],
+            data["s"],
+            data["i"],
+            data["x"],
+        )
+
+    @classmethod
+    def from_api(cls, response: list, pair: str, interval: str, closed: bool = True) -> 'Kline':
+        return cls(
+            int(response[0]),
+            float(response[1]),
+            float(response[2]),
+            float(response[3]),
+            float(response[4]),
+            float(response[5]),
+            int(response[6]),
+            float(response[7]),
+            int(response[8]),
+            pair,
+            interval,
+            closed,
+        )
+
+    def to_candlestick(self) -> "Candlestick":
+        # ORM model pulls in SQLAlchemy, imported only once persisted
+        from models import Candlestick
+
+        # milliseconds are kept, bars built from trades can open within the same second
+        open_time, close_time = ms_to_datetime(self.open_time), ms_to_datetime(self.close_time)
+
+        return Candlestick(
+            open_time,
+            self.open,
+            self.high,
+            self.low,
+            self.close,
+            self.volume,
+            close_time,
+            self.quote_asset_volume,
+            self.trades_amount,
+            self.pair,
+            self.interval
+        )
@@ -0,0 +1,125 @@
+"""
+REST response caching and request coalescing used by engine.Connector.
+
+Identical GET requests in flight at the same time are sent once and all
+callers get the same response. Responses of slow-changing endpoints are
+kept for a TTL so repeated calls don't spend request weight at all.
+"""
+import asyncio
+
+from collections import OrderedDict
+from time import monotonic
+
+from utils import setup_logging
+
+logger = setup_logging(__name__)
+
+
+def request_key(endpoint, params):
+    """Returns hashable key of request, independent of parameter order"""
+    return endpoint, tuple(sorted((params or {}).items()))
+
+
+class ResponseCache:
+    """
+    TTL cache of responses, least recently used entries are evicted once
+    max_entries or max_rows is reached. Expired entries are dropped when
+    looked up. Rows (e.g. klines of a page) approximate size of response,
+    so few large responses can't hold much memory for whole TTL.
+    """
+
+    def __init__(self, max_entries=1000, max_rows=50_000, clock=monotonic):
+        """
+        Args:
+            max_entries (int, optional): entries kept. Defaults to 1000.
+            max_rows (int, optional): rows of all entries kept. Defaults to 50000.
+            clock (function, optional): returns current time in seconds. Defaults to time.monotonic.
+        """
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.clock = clock
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()       # key -> (expires at, value, rows)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns cached value, None if there is none or it expired"""
+        entry = self._entries.get(key, None)
+        if entry is None or entry[0] <= self.clock():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value, ttl, rows=1):
+        """Caches value for ttl seconds
+
+        Args:
+            key (hashable): key
+            value (any): cached value
+            ttl (float): seconds value is kept for
+            rows (int, optional): size of value in rows, larger than max_rows isn't cached. Defaults to 1.
+        """
+        if key in self._entries:
+            self._remove(key)
+        if rows > self.max_rows:
+            return
+
+        self._entries[key] = (self.clock() + ttl, value, rows)
+        self.rows += rows
+        while len(self._entries) > self.max_entries or self.rows > self.max_rows:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        self._entries.clear()
+        self.rows = 0
+
+    def _remove(self, key):
+        self.rows -= self._entries.pop(key)[2]
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key, only the first one runs
+    and the rest await its result (or exception).
+
+    Call runs in its own task so caller being cancelled doesn't cancel it
+    for others waiting on it.
+    """
+
+    def __init__(self):
+        self._calls = {}        # key -> task
+
+    def __contains__(self, key):
+        return key in self._calls
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key, function):
+        """Runs coroutine function unless call with the same key is in flight
+
+        Args:
+            key (hashable): call key
+            function (function): coroutine function without arguments
+
+        Returns:
+            any: result of function
+        """
+        task = self._calls.get(key, None)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(function())
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key, None) is task:
+            del self._calls[key]
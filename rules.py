@@ -0,0 +1,257 @@
+import heapq
+import itertools
+
+from typing import Any, Callable, Dict, List, Optional
+
+from utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# rule kinds
+STOP_LOSS = "stop_loss"             # fires when price <= level
+TAKE_PROFIT = "take_profit"         # fires when price >= level
+TRAILING_STOP = "trailing_stop"     # fires when price <= peak * (1 - trail), peak ratchets up with price
+
+
+class Rule:
+    __slots__ = ("id", "pair", "kind", "level", "trail", "group", "active", "data")
+
+    def __init__(self, id, pair, kind, level=None, trail=None, data=None):
+        self.id = id
+        self.pair = pair
+        self.kind = kind
+        self.level = level          # trigger price, current stop of trailing stop once fired
+        self.trail = trail          # fraction below peak of trailing stop
+        self.group = None           # TrailingGroup of trailing stop
+        self.active = True
+        self.data = data            # caller payload e.g. position
+
+    def __repr__(self):
+        return f"Rule({self.id}, {self.pair}, {self.kind}, level={self.level}, trail={self.trail})"
+
+
+class TrailingGroup:
+    """
+    Trailing stops sharing the same peak, ordered by trail fraction.
+
+    Stop with smallest trail is the highest one and fires first.
+    """
+    __slots__ = ("id", "peak", "rules", "version")
+
+    def __init__(self, id, peak):
+        self.id = id
+        self.peak = peak
+        self.rules = []             # heap of (trail, rule id, rule)
+        self.version = 0            # bumped when peak or top rule changes, stale trigger entries are skipped
+
+    def top(self):
+        # canceled rules are removed lazily
+        while self.rules and not self.rules[0][2].active:
+            heapq.heappop(self.rules)
+        return self.rules[0][2] if self.rules else None
+
+
+class PairRules:
+    """
+    Rules of single pair indexed by trigger price.
+
+    Stop losses are kept in max-heap and take profits in min-heap of levels,
+    so a price update pops only rules it crosses. Trailing stops are grouped
+    by peak: when price makes new high every group with lower peak is merged
+    into one with peak at price (smaller groups into largest one), each rule
+    is moved O(log n) times amortized. Highest stop of every group is kept
+    in max-heap of trigger levels.
+    """
+
+    def __init__(self):
+        self.stops = []             # heap of (-level, rule id, rule)
+        self.targets = []           # heap of (level, rule id, rule)
+        self.peaks = []             # heap of (peak, group id, group)
+        self.triggers = []          # heap of (-stop level, group id, version, group)
+        self.frontier = None        # group of last added trailing stop or last ratchet
+        self.active = 0
+
+    def __len__(self):
+        return self.active
+
+    def add(self, rule: Rule, peak: float, group_id: int) -> None:
+        if rule.kind == STOP_LOSS:
+            heapq.heappush(self.stops, (-rule.level, rule.id, rule))
+        elif rule.kind == TAKE_PROFIT:
+            heapq.heappush(self.targets, (rule.level, rule.id, rule))
+        elif self.frontier is not None and self.frontier.peak == peak and self.frontier.rules:
+            # rules added at the same price share group
+            group = self.frontier
+            top = group.top()
+            self._add_to_group(group, rule)
+            if top is None or rule.trail < top.trail:
+                group.version += 1
+                self._push_trigger(group)
+        else:
+            group = self.frontier = TrailingGroup(group_id, peak)
+            self._add_to_group(group, rule)
+            heapq.heappush(self.peaks, (peak, group.id, group))
+            self._push_trigger(group)
+        self.active += 1
+
+    def update(self, price: float) -> List[Rule]:
+        """Returns rules crossed by price, trailing stops are ratcheted"""
+        fired = []
+
+        targets = self.targets
+        while targets and targets[0][0] <= price:
+            rule = heapq.heappop(targets)[2]
+            if rule.active:
+                fired.append(rule)
+
+        stops = self.stops
+        while stops and -stops[0][0] >= price:
+            rule = heapq.heappop(stops)[2]
+            if rule.active:
+                fired.append(rule)
+
+        if self.peaks and self.peaks[0][0] < price:
+            self._ratchet(price)
+
+        triggers = self.triggers
+        while triggers and -triggers[0][0] >= price:
+            _, _, version, group = heapq.heappop(triggers)
+            if version != group.version:
+                continue
+
+            # same expression as trigger level, so popped entry can't be pushed back crossed
+            rule = group.top()
+            while rule is not None and group.peak * (1 - rule.trail) >= price:
+                heapq.heappop(group.rules)
+                rule.level = group.peak * (1 - rule.trail)
+                fired.append(rule)
+                rule = group.top()
+
+            group.version += 1
+            self._push_trigger(group)
+
+        for rule in fired:
+            rule.active = False
+        self.active -= len(fired)
+        return fired
+
+    def _ratchet(self, price: float) -> None:
+        groups = []
+        while self.peaks and self.peaks[0][0] < price:
+            group = heapq.heappop(self.peaks)[2]
+            if group.top() is not None:
+                groups.append(group)
+        if not groups:
+            return
+
+        # merge smaller groups into largest one
+        groups.sort(key=lambda group: len(group.rules))
+        merged = groups.pop()
+        for group in groups:
+            for _, _, rule in group.rules:
+                if rule.active:
+                    self._add_to_group(merged, rule)
+            group.rules = []
+            group.version += 1
+
+        merged.peak = price
+        merged.version += 1
+        self.frontier = merged
+        heapq.heappush(self.peaks, (price, merged.id, merged))
+        self._push_trigger(merged)
+
+    @staticmethod
+    def _add_to_group(group: TrailingGroup, rule: Rule) -> None:
+        rule.group = group
+        heapq.heappush(group.rules, (rule.trail, rule.id, rule))
+
+    def _push_trigger(self, group: TrailingGroup) -> None:
+        rule = group.top()
+        if rule is not None:
+            heapq.heappush(self.triggers, (-group.peak * (1 - rule.trail), group.id, group.version, group))
+
+
+class RuleEngine:
+    """
+    Evaluates stop loss, take profit and trailing stop rules of long
+    positions on price updates.
+
+    Fired rules are deactivated and passed to on_trigger. Rules protecting
+    the same position (e.g. stop loss and take profit) are independent,
+    callback cancels the rest when one fires.
+    """
+
+    def __init__(self, on_trigger: Optional[Callable[[Rule, float], Any]] = None):
+        """
+        Args:
+            on_trigger (Callable, optional): called with fired rule and price
+        """
+        self.on_trigger = on_trigger
+        self.pairs: Dict[str, PairRules] = {}
+
+        self._ids = itertools.count(1)
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    def __len__(self):
+        return sum(len(rules) for rules in self.pairs.values())
+
+    def add_stop_loss(self, pair: str, level: float, data: Any = None) -> Rule:
+        return self._add(Rule(next(self._ids), pair.upper(), STOP_LOSS, level=level, data=data))
+
+    def add_take_profit(self, pair: str, level: float, data: Any = None) -> Rule:
+        return self._add(Rule(next(self._ids), pair.upper(), TAKE_PROFIT, level=level, data=data))
+
+    def add_trailing_stop(self, pair: str, trail: float, peak: float, data: Any = None) -> Rule:
+        """Adds trailing stop
+
+        Args:
+            pair (str): pair e.g. "BTCUSDT"
+            trail (float): fraction below peak e.g. 0.02
+            peak (float): initial peak, usually entry or current price
+            data (Any, optional): caller payload
+
+        Returns:
+            Rule: added rule
+        """
+        assert 0 < trail < 1, "trail must be fraction between 0 and 1"
+        return self._add(Rule(next(self._ids), pair.upper(), TRAILING_STOP, trail=trail, data=data), peak)
+
+    def _add(self, rule: Rule, peak: float = None) -> Rule:
+        rules = self.pairs.get(rule.pair, None)
+        if rules is None:
+            rules = self.pairs[rule.pair] = PairRules()
+
+        rules.add(rule, peak, next(self._ids))
+        return rule
+
+    def cancel(self, rule: Rule) -> None:
+        """Deactivates rule, it is removed from index lazily"""
+        if rule.active:
+            rule.active = False
+            self.pairs[rule.pair].active -= 1
+
+    def stop_level(self, rule: Rule) -> float:
+        """Returns current trigger level of rule"""
+        if rule.kind != TRAILING_STOP or not rule.active:
+            return rule.level
+        return rule.group.peak * (1 - rule.trail)
+
+    def on_price(self, pair: str, price: float) -> List[Rule]:
+        """Evaluates rules of pair against new price
+
+        Args:
+            pair (str): pair e.g. "BTCUSDT", upper case
+            price (float): last price
+
+        Returns:
+            List[Rule]: fired rules
+        """
+        rules = self.pairs.get(pair, None)
+        if rules is None:
+            return []
+
+        fired = rules.update(price)
+        if self.on_trigger is not None:
+            for rule in fired:
+                self.on_trigger(rule, price)
+        return fired
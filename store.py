@@ -0,0 +1,133 @@
+import numpy as np
+
+from utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# column layout of candle buffers
+COLUMNS = ("open_time", "open", "high", "low", "close", "volume")
+COLUMN_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+
+
+class CandleBuffer:
+    """
+    Fixed capacity ring buffer of OHLCV columns for single pair and interval.
+
+    Every value is written twice, at slot and slot + capacity, so the latest
+    n <= capacity candles always form one contiguous slice of the backing
+    array and can be handed to indicators as zero-copy views.
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.size = 0
+        self.last_closed = True     # whether newest slot holds closed candle
+
+        self._data = np.full((len(COLUMNS), 2 * capacity), np.nan, dtype=np.float64)
+        self._head = -1             # slot of newest candle
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    @property
+    def last_open_time(self):
+        return self._data[0, self._head] if self.size else None
+
+    def update(self, open_time, open, high, low, close, volume, closed):
+        """Appends new candle or overwrites in-progress newest candle in place
+
+        Args:
+            open_time (float): candle open time in ms
+            open, high, low, close, volume (float): candle values
+            closed (bool): whether candle is closed
+
+        Returns:
+            bool: False if candle is older than newest candle and was ignored
+        """
+        if self.size and open_time <= self._data[0, self._head]:
+            if open_time < self._data[0, self._head]:
+                return False
+            slot = self._head
+        else:
+            slot = (self._head + 1) % self.capacity
+            self._head = slot
+            self.size = min(self.size + 1, self.capacity)
+
+        for data_slot in (slot, slot + self.capacity):
+            column = self._data[:, data_slot]
+            column[0] = open_time
+            column[1] = open
+            column[2] = high
+            column[3] = low
+            column[4] = close
+            column[5] = volume
+
+        self.last_closed = closed
+        return True
+
+    def column(self, name, n=None, closed_only=False):
+        """Returns read-only view of newest values of column
+
+        Args:
+            name (str): column name, one of COLUMNS
+            n (int, optional): number of newest candles. Defaults to all.
+            closed_only (bool, optional): leave out in-progress newest candle. Defaults to False.
+
+        Returns:
+            np.ndarray: contiguous view in chronological order
+        """
+        end = self._head + self.capacity + 1
+        size = self.size
+
+        if closed_only and not self.last_closed:
+            end -= 1
+            size -= 1
+
+        n = size if n is None else min(n, size)
+
+        view = self._data[COLUMN_INDEX[name], end - n:end]
+        view.flags.writeable = False
+        return view
+
+
+class CandleStore:
+    """
+    Candle buffers keyed by (pair, interval), created on first update
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.buffers = {}
+
+    def get(self, pair, interval):
+        key = (pair.upper(), interval)
+        buffer = self.buffers.get(key, None)
+
+        if buffer is None:
+            buffer = self.buffers[key] = CandleBuffer(self.capacity)
+
+        return buffer
+
+    def update(self, kline):
+        """Updates buffer of kline pair and interval
+
+        Args:
+            kline (models.Kline): parsed kline
+
+        Returns:
+            CandleBuffer: updated buffer
+        """
+        buffer = self.get(kline.pair, kline.interval)
+        buffer.update(
+            kline.open_time,
+            kline.open,
+            kline.high,
+            kline.low,
+            kline.close,
+            kline.volume,
+            kline.closed,
+        )
+        return buffer
@@ -0,0 +1,340 @@
+"""
+Runs bot sharded across worker processes.
+
+Pairs are partitioned over workers, every worker runs its own Binance
+connector and pipeline for its shard. Workers report health and throughput
+over pipes, supervisor restarts crashed or stuck workers and rebalances
+shards when pairs change.
+
+Usage:
+    python supervisor.py [workers]
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+
+from multiprocessing.connection import wait
+from time import monotonic, time
+
+from utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# messages sent over worker pipes as (kind, payload)
+SUBSCRIBE = "subscribe"         # supervisor -> worker, pairs to add
+UNSUBSCRIBE = "unsubscribe"     # supervisor -> worker, pairs to remove
+STOP = "stop"                   # supervisor -> worker
+HEALTH = "health"               # worker -> supervisor, health report
+
+CONTROL_TICK = 0.2              # seconds between worker pipe polls
+
+
+def assign(pairs, workers, current=None):
+    """Distributes pairs over workers, keeping current assignment where possible
+
+    Args:
+        pairs (Iterable[str]): pairs to distribute
+        workers (int): number of workers
+        current (dict, optional): worker id -> set of pairs of current assignment
+
+    Returns:
+        dict: worker id -> set of pairs, shard sizes differ by at most one
+    """
+    pairs = set(pairs)
+    current = current or {}
+    shards = {worker: set(current.get(worker, ())) & pairs for worker in range(workers)}
+
+    assigned = set().union(*shards.values())
+    for pair in sorted(pairs - assigned):
+        min(shards.values(), key=len).add(pair)
+
+    # move pairs from largest to smallest shard until balanced
+    while True:
+        largest = max(shards.values(), key=len)
+        smallest = min(shards.values(), key=len)
+        if len(largest) - len(smallest) <= 1:
+            break
+        pair = max(largest)
+        largest.remove(pair)
+        smallest.add(pair)
+
+    return shards
+
+
+def run_worker(worker, pairs, intervals, connection, report_interval):
+    """Entry point of worker process"""
+    setup_logging(initial=True)
+    try:
+        asyncio.run(_worker(worker, pairs, intervals, connection, report_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker(worker, pairs, intervals, connection, report_interval):
+    # imported in worker process only, supervisor doesn't need connector and database
+    import binance
+    from backfill import Backfill
+
+    subscribed = set()
+    commands = asyncio.Queue()
+    await commands.put((SUBSCRIBE, pairs))
+
+    async with binance.Binance() as client:
+
+        async def apply_commands():
+            # commands are applied in order, backfill runs before subscribing
+            while True:
+                kind, payload = await commands.get()
+                if kind == SUBSCRIBE:
+                    added = sorted(set(payload) - subscribed)
+                    subscribed.update(added)
+                    await Backfill(client).run(added, intervals)
+                    await client.subscribe_klines(added, intervals)
+                elif kind == UNSUBSCRIBE:
+                    removed = sorted(subscribed & set(payload))
+                    subscribed.difference_update(removed)
+                    await client.unsubscribe_klines(removed, intervals)
+
+        task = asyncio.ensure_future(apply_commands())
+
+        last_report = monotonic()
+        last_processed = 0
+        running = True
+        while running:
+            while connection.poll():
+                kind, payload = connection.recv()
+                if kind == STOP:
+                    running = False
+                    break
+                await commands.put((kind, payload))
+
+            now = monotonic()
+            if running and now - last_report >= report_interval:
+                metrics = client.pipeline.metrics()
+                processed = metrics["ta"]["processed"]
+
+                connection.send((HEALTH, {
+                    "worker": worker,
+                    "pid": os.getpid(),
+                    "time": time(),
+                    "pairs": sorted(subscribed),
+                    "streams": len(client.handlers),
+                    "connections": len(client.connections),
+                    "reconnects": sum(c.reconnects for c in client.connections),
+                    "throughput": (processed - last_processed) / (now - last_report),
+                    "pipeline": metrics,
+                }))
+                last_report, last_processed = now, processed
+
+            if task.done():
+                # failed command loop leaves shard unsubscribed, let supervisor restart worker
+                raise task.exception()
+
+            await asyncio.sleep(CONTROL_TICK)
+
+        task.cancel()
+
+
+class Supervisor:
+    """
+    Runs shards of pairs in worker processes and keeps them running.
+
+    Dead workers are restarted with backoff, workers which stop reporting for
+    stale_after seconds are terminated and restarted. Backoff grows with
+    consecutive failures and is reset once worker stays up for stale_after
+    seconds, so worker crashing soon after reporting keeps backing off.
+    """
+
+    RESTART_BACKOFF_BASE = 1
+    RESTART_BACKOFF_MAX = 60
+
+    def __init__(self, pairs, intervals, workers=None, report_interval=5.0, stale_after=60.0, target=run_worker):
+        """
+        Args:
+            pairs (list): pairs e.g. ["btcusdt"]
+            intervals (list): kline intervals e.g. ["1m"]
+            workers (int, optional): worker processes. Defaults to CPU count, at most one per pair.
+            report_interval (float, optional): seconds between worker health reports. Defaults to 5.
+            stale_after (float, optional): seconds without report after which worker is restarted. Defaults to 60.
+            target (function, optional): worker entry point. Defaults to run_worker.
+        """
+        self.intervals = list(intervals)
+        self.workers = workers or max(1, min(os.cpu_count() or 1, len(pairs)))
+        self.report_interval = report_interval
+        self.stale_after = stale_after
+        self.target = target
+
+        self.shards = assign(pairs, self.workers)
+        self.processes = {}         # worker id -> running Process
+        self.connections = {}       # worker id -> supervisor end of pipe
+        self.health = {}            # worker id -> last health report
+        self.last_seen = {}         # worker id -> monotonic time of last report or start
+        self.started_at = {}        # worker id -> monotonic time of start
+        self.restarts = {worker: 0 for worker in range(self.workers)}
+        self.failures = {worker: 0 for worker in range(self.workers)}
+        self.restart_at = {}        # worker id -> monotonic time of scheduled restart
+
+        self._context = multiprocessing.get_context("spawn")
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    def start(self):
+        for worker in range(self.workers):
+            self._spawn(worker)
+
+    def stop(self, timeout=30):
+        """Asks workers to drain and exit, terminates those which don't exit in time"""
+        for worker in list(self.connections):
+            self._send(worker, (STOP, None))
+
+        deadline = monotonic() + timeout
+        for process in self.processes.values():
+            process.join(max(0, deadline - monotonic()))
+            if process.is_alive():
+                self.logger.warning(f"Terminating {process.name}")
+                process.terminate()
+                process.join()
+
+        for connection in self.connections.values():
+            connection.close()
+        self.processes = {}
+        self.connections = {}
+
+    def run(self):
+        """Runs workers until interrupted"""
+        self.start()
+        last_summary = monotonic()
+        try:
+            while True:
+                self.poll(self.report_interval)
+                if monotonic() - last_summary >= self.report_interval:
+                    self.logger.info(f"Workers: {self.summary()}")
+                    last_summary = monotonic()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def set_pairs(self, pairs):
+        """Rebalances shards for new pair universe, moving as few pairs as possible
+
+        Args:
+            pairs (list): pairs e.g. ["btcusdt"]
+        """
+        shards = assign(pairs, self.workers, self.shards)
+
+        # unsubscribe first so a moved pair is not streamed twice for long
+        for worker in range(self.workers):
+            removed = self.shards[worker] - shards[worker]
+            if removed:
+                self._send(worker, (UNSUBSCRIBE, sorted(removed)))
+        for worker in range(self.workers):
+            added = shards[worker] - self.shards[worker]
+            if added:
+                self._send(worker, (SUBSCRIBE, sorted(added)))
+
+        self.shards = shards
+        self.logger.info(f"Rebalanced {len(set(pairs))} pairs over {self.workers} workers")
+
+    def poll(self, timeout=1.0):
+        """Collects worker reports and restarts dead or stale workers
+
+        Args:
+            timeout (float, optional): seconds to wait for reports. Defaults to 1.
+        """
+        if self.connections:
+            ready = wait(list(self.connections.values()), timeout)
+        else:
+            ready = []
+
+        for worker, connection in list(self.connections.items()):
+            if connection not in ready:
+                continue
+            try:
+                while connection.poll():
+                    kind, payload = connection.recv()
+                    if kind == HEALTH:
+                        self.health[worker] = payload
+                        self.last_seen[worker] = monotonic()
+            except (EOFError, OSError):
+                # worker exited, handled below
+                pass
+
+        self._check_workers()
+
+    def summary(self):
+        reports = self.health.values()
+        return {
+            "alive": sum(process.is_alive() for process in self.processes.values()),
+            "workers": self.workers,
+            "pairs": sum(len(shard) for shard in self.shards.values()),
+            "throughput": sum(report["throughput"] for report in reports),
+            "reconnects": sum(report["reconnects"] for report in reports),
+            "restarts": sum(self.restarts.values()),
+        }
+
+    def _spawn(self, worker):
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=self.target,
+            args=(worker, sorted(self.shards[worker]), self.intervals, child, self.report_interval),
+            name=f"worker-{worker}",
+            daemon=True,
+        )
+        process.start()
+        child.close()
+
+        self.processes[worker] = process
+        self.connections[worker] = parent
+        self.last_seen[worker] = self.started_at[worker] = monotonic()
+        self.restart_at.pop(worker, None)
+        self.logger.info(f"Started {process.name} (pid {process.pid}) with {len(self.shards[worker])} pairs")
+
+    def _send(self, worker, message):
+        connection = self.connections.get(worker, None)
+        if connection is None:
+            # worker is restarting, it starts with current shard
+            return
+        try:
+            connection.send(message)
+        except (BrokenPipeError, OSError):
+            pass
+
+    def _check_workers(self):
+        now = monotonic()
+        for worker in range(self.workers):
+            process = self.processes.get(worker, None)
+
+            if process is None:
+                if now >= self.restart_at.get(worker, 0):
+                    self.restarts[worker] += 1
+                    self._spawn(worker)
+                continue
+
+            if process.is_alive() and now - self.last_seen[worker] > self.stale_after:
+                self.logger.warning(f"{process.name} sent no report for {self.stale_after}s, terminating")
+                process.terminate()
+                process.join()
+
+            if process.is_alive():
+                if self.failures[worker] and now - self.started_at[worker] >= self.stale_after:
+                    self.failures[worker] = 0
+                continue
+
+            self.failures[worker] += 1
+            delay = min(self.RESTART_BACKOFF_MAX, self.RESTART_BACKOFF_BASE * 2 ** (self.failures[worker] - 1))
+            self.logger.error(f"{process.name} exited with code {process.exitcode}, restarting in {delay}s")
+
+            self.connections.pop(worker).close()
+            del self.processes[worker]
+            self.health.pop(worker, None)
+            self.restart_at[worker] = now + delay
+
+
+if __name__ == "__main__":
+    setup_logging(initial=True)
+
+    from bot import PAIRS, INTERVALS
+
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    Supervisor(PAIRS, INTERVALS, workers).run()
@@ -1,18 +1,32 @@
 import numpy as np
 
-from typing import List, Tuple, Callable, Dict, Any
+from abc import abstractmethod
+from collections import deque, namedtuple
+from typing import List, Tuple, Callable, Dict, Any, Iterable, Optional
 
-import talib
+from base import Base
+from utils import lazy_import
 
-from utils import timeit
+# TA-Lib is loaded on first indicator calculation
+talib = lazy_import("talib")
 
 # types
 
 Ohlcv = Dict[str, float]
 TMaCallable = Callable[[np.ndarray, int], np.ndarray]
 
+# signal emitted by CrossoverDetector, signal is 1 (golden cross) or -1 (death cross)
+Crossover = namedtuple("Crossover", ["signal", "provisional", "ma_short", "ma_long"])
+
 class Indicator:
+    # cache.SeriesCache of prices series, memoizes moving averages when set
+    cache = None
+
     def convert_to_ndarr(self, array: List[Any]) -> np.ndarray:
+        # arrays (e.g. CandleBuffer views) are used as they are, without copy
+        if isinstance(array, np.ndarray) and array.dtype == np.float64:
+            return array
+
         assert isinstance(array, list), "array must be a list"
         
         try:
@@ -41,7 +55,10 @@ class Indicator:
         """
         assert ta_func.__name__ in dir(talib), "ta_func must be a TA-Lib function"
 
-        moving_average = ta_func(self.prices, timeperiod=self.long_window)
+        if self.cache is not None:
+            return self.cache.get(ta_func.__name__.lower(), timeperiod=timeperiod)
+
+        moving_average = ta_func(self.prices, timeperiod=timeperiod)
 
         return moving_average
 
@@ -51,22 +68,35 @@ class GoldenCross(Indicator):
     Class representing Golden Cross indicator for both SMA and EMA
     """
 
-    def __init__(self, prices, short_window: int, long_window: int):
+    def __init__(self, prices, short_window: int, long_window: int, cache=None):
+        """
+        Args:
+            prices (dict | store.CandleBuffer): ohlcv columns, either lists or arrays, None when cache is given
+            short_window (int): short moving average timeperiod
+            long_window (int): long moving average timeperiod
+            cache (cache.SeriesCache, optional): indicator cache of candle buffer, prices default to its buffer
+        """
+        if cache is not None:
+            self.cache = cache
+            prices = cache.buffer if prices is None else prices
+
         self.prices = self.get_prices_from_ohlcv(prices)
         self.short_window = short_window
         self.long_window = long_window
 
 
     def _calculate_sma(self) -> (np.ndarray, np.ndarray):
-        ma_short = super()._calculate_ma(talib.SMA, self.timeperiod)
-        ma_long = super()._calculate_ma(talib.SMA)
-        
+        ma_short = super()._calculate_ma(talib.SMA, self.short_window)
+        ma_long = super()._calculate_ma(talib.SMA, self.long_window)
+        return ma_short, ma_long
+
 
     def _calculate_ema(self) -> (np.ndarray, np.ndarray):
-        return super()._calculate_ma(talib.EMA)
+        ma_short = super()._calculate_ma(talib.EMA, self.short_window)
+        ma_long = super()._calculate_ma(talib.EMA, self.long_window)
+        return ma_short, ma_long
 
 
-    @timeit
     def golden_cross(self, ma_short: np.ndarray, ma_long: np.ndarray) -> List[Tuple[int, bool]]:
         """Calculates golden crosses for 2 moving averages
 
@@ -79,28 +109,246 @@ class GoldenCross(Indicator):
         """
         assert len(ma_short) == len(ma_long), "Moving averages length does not match!"
 
-        index = 0
-        signal_arr = []
-
-        for i_short, i_long in zip(ma_short, ma_long):
-            gc = False      # gc flag default false
-            
-            # start calculation from first valid pair
-            if np.isnan(i_long):
-                signal_arr.append((np.nan, False))
-                index += 1
-                continue
-
-            if i_short > i_long:
-                signal = 1
-            if i_short < i_long:
-                signal = -1
-            
-            previous_signal = signal_arr[index - 1][0]
-            if previous_signal != signal and index != 0 and not np.isnan(previous_signal):
-                gc = True       # signal has changed, golden cross detected at this spot
-
-            signal_arr.append((signal, gc))
-            index += 1
-        
-        return signal_arr
+        signals, crosses = crossover_signals(np.atleast_2d(ma_short), np.atleast_2d(ma_long))
+
+        return list(zip(signals[0].tolist(), crosses[0].tolist()))
+
+
+def moving_average_matrix(closes: np.ndarray, timeperiod: int, ma: str = "sma") -> np.ndarray:
+    """Calculates moving average of every row of (symbols x time) close matrix
+
+    Leading NaNs (symbols with shorter history) are skipped, moving average
+    is NaN until `timeperiod` valid closes are available.
+
+    Args:
+        closes (np.ndarray): 2-D close matrix
+        timeperiod (int): moving average timeperiod
+        ma (str, optional): "sma" or "ema". Defaults to "sma".
+
+    Returns:
+        np.ndarray: moving averages, same shape as closes
+    """
+    if ma == "ema":
+        # EMA is recursive, TA-Lib runs the time loop in C for each symbol
+        return np.vstack([talib.EMA(row, timeperiod=timeperiod) for row in closes])
+
+    assert ma == "sma", f"Unknown moving average {ma}"
+
+    valid = ~np.isnan(closes)
+    total = np.cumsum(np.where(valid, closes, 0.0), axis=1)
+    count = np.cumsum(valid, axis=1)
+
+    window_total = total.copy()
+    window_total[:, timeperiod:] -= total[:, :-timeperiod]
+    window_count = count.copy()
+    window_count[:, timeperiod:] -= count[:, :-timeperiod]
+
+    return np.where(window_count == timeperiod, window_total / timeperiod, np.nan)
+
+
+def crossover_signals(ma_short: np.ndarray, ma_long: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Calculates crossover signals of 2 moving average matrices
+
+    Args:
+        ma_short (np.ndarray): (symbols x time) short moving averages
+        ma_long (np.ndarray): (symbols x time) long moving averages
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: signal (1, -1 or NaN during warm-up) and crossover mask
+    """
+    assert ma_short.shape == ma_long.shape, "Moving averages shape does not match!"
+
+    relation = np.sign(ma_short - ma_long)
+
+    # moving averages touching keep previous relation
+    index = np.where(relation != 0, np.arange(relation.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    relation = np.take_along_axis(relation, index, axis=1)
+    relation[relation == 0] = np.nan
+
+    valid = ~np.isnan(relation)
+    crosses = np.zeros(relation.shape, dtype=bool)
+    crosses[:, 1:] = (relation[:, 1:] != relation[:, :-1]) & valid[:, 1:] & valid[:, :-1]
+
+    return relation, crosses
+
+
+def batch_golden_cross(closes: np.ndarray, windows: List[Tuple[int, int]], ma: str = "sma") -> Tuple[np.ndarray, np.ndarray]:
+    """Calculates golden crosses for many symbols and window pairs at once
+
+    Moving average of every distinct window is calculated only once.
+
+    Args:
+        closes (np.ndarray): (symbols x time) close matrix, NaN padded at start for shorter histories
+        windows (List[Tuple[int, int]]): (short, long) window pairs
+        ma (str, optional): "sma" or "ema". Defaults to "sma".
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (windows x symbols x time) signals and crossover masks
+    """
+    closes = np.atleast_2d(np.asarray(closes, dtype=np.float64))
+
+    averages = {}
+    for window in {w for pair in windows for w in pair}:
+        averages[window] = moving_average_matrix(closes, window, ma)
+
+    shape = (len(windows), *closes.shape)
+    signals = np.empty(shape, dtype=np.float64)
+    crosses = np.empty(shape, dtype=bool)
+
+    for i, (short_window, long_window) in enumerate(windows):
+        signals[i], crosses[i] = crossover_signals(averages[short_window], averages[long_window])
+
+    return signals, crosses
+
+
+class StreamingMA(Base):
+    """
+    Moving average updated one close at a time.
+
+    `update` returns value including close of in-progress candle without
+    changing the state, `commit` includes close of closed candle for good.
+    Values are NaN until `timeperiod` closes were committed, same as TA-Lib.
+    """
+
+    def __init__(self, timeperiod: int):
+        assert timeperiod > 0, "timeperiod must be positive"
+        self.timeperiod = timeperiod
+        self.value = np.nan         # last committed value
+        self.count = 0              # committed closes
+
+    @abstractmethod
+    def update(self, close: float) -> float:
+        pass
+
+    @abstractmethod
+    def commit(self, close: float) -> float:
+        pass
+
+
+class StreamingSMA(StreamingMA):
+    def __init__(self, timeperiod: int):
+        super().__init__(timeperiod)
+        self.window = deque(maxlen=timeperiod)
+        self.total = 0.0
+
+    def update(self, close: float) -> float:
+        if self.count + 1 < self.timeperiod:
+            return np.nan
+
+        oldest = self.window[0] if len(self.window) == self.timeperiod else 0.0
+        return (self.total - oldest + close) / self.timeperiod
+
+    def commit(self, close: float) -> float:
+        if len(self.window) == self.timeperiod:
+            self.total -= self.window[0]
+        self.window.append(close)
+        self.total += close
+        self.count += 1
+
+        if self.count >= self.timeperiod:
+            self.value = self.total / self.timeperiod
+        return self.value
+
+
+class StreamingEMA(StreamingMA):
+    """
+    EMA seeded with SMA of first `timeperiod` closes, same as TA-Lib
+    """
+
+    def __init__(self, timeperiod: int):
+        super().__init__(timeperiod)
+        self.k = 2.0 / (timeperiod + 1)
+        self.seed_total = 0.0
+
+    def update(self, close: float) -> float:
+        if self.count + 1 < self.timeperiod:
+            return np.nan
+        if self.count + 1 == self.timeperiod:
+            return (self.seed_total + close) / self.timeperiod
+
+        return self.value + self.k * (close - self.value)
+
+    def commit(self, close: float) -> float:
+        self.value = self.update(close)
+        self.count += 1
+
+        if self.count < self.timeperiod:
+            self.seed_total += close
+        return self.value
+
+
+class CrossoverDetector:
+    """
+    Detects crossovers of short and long streaming moving averages.
+
+    Signal is emitted only when relation of short and long moving average flips.
+    Updates of in-progress candle emit provisional signal (at most once per
+    direction and candle), committing closed candle emits final signal.
+    """
+
+    def __init__(self, ma_short: StreamingMA, ma_long: StreamingMA):
+        self.ma_short = ma_short
+        self.ma_long = ma_long
+
+        self.relation = 0       # committed relation, 1 short above long, -1 below, 0 unknown
+        self._pending = 0       # relation of last provisional signal in current candle
+
+    @classmethod
+    def sma(cls, short_window: int, long_window: int) -> 'CrossoverDetector':
+        return cls(StreamingSMA(short_window), StreamingSMA(long_window))
+
+    @classmethod
+    def ema(cls, short_window: int, long_window: int) -> 'CrossoverDetector':
+        return cls(StreamingEMA(short_window), StreamingEMA(long_window))
+
+    def warm_up(self, closes: Iterable[float]) -> None:
+        """Commits history of closed candles without emitting signals
+
+        Args:
+            closes (Iterable[float]): closes in chronological order
+        """
+        for close in closes:
+            self.update(close, closed=True)
+
+    def update(self, close: float, closed: bool = False) -> Optional[Crossover]:
+        """Updates moving averages with close of newest candle
+
+        Args:
+            close (float): close price
+            closed (bool, optional): whether candle is closed. Defaults to False.
+
+        Returns:
+            Optional[Crossover]: signal if relation flipped, otherwise None
+        """
+        if closed:
+            ma_short, ma_long = self.ma_short.commit(close), self.ma_long.commit(close)
+        else:
+            ma_short, ma_long = self.ma_short.update(close), self.ma_long.update(close)
+
+        relation = self._relation(ma_short, ma_long)
+        flipped = relation != 0 and self.relation != 0 and relation != self.relation
+
+        if closed:
+            self._pending = 0
+            if relation != 0:
+                self.relation = relation
+            return Crossover(relation, False, ma_short, ma_long) if flipped else None
+
+        # provisional signal stays pending until candle closes, price crossing
+        # back and forth within candle doesn't emit it again
+        if not flipped or relation == self._pending:
+            return None
+
+        self._pending = relation
+        return Crossover(relation, True, ma_short, ma_long)
+
+    def _relation(self, ma_short: float, ma_long: float) -> int:
+        if np.isnan(ma_short) or np.isnan(ma_long):
+            return 0
+        if ma_short > ma_long:
+            return 1
+        if ma_short < ma_long:
+            return -1
+        # moving averages touching keep previous relation
+        return self.relation
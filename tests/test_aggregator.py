@@ -0,0 +1,101 @@
+import random
+import unittest
+
+import aggregator
+import binance
+from models import Kline
+
+MINUTE = 60 * 1000
+HOUR = 60 * MINUTE
+
+
+def minute_klines(start, count, seed=1):
+    rng = random.Random(seed)
+    price = 100.0
+    klines = []
+    for i in range(count):
+        open_time = start + i * MINUTE
+        open = price
+        price *= 1 + rng.gauss(0, 0.001)
+        high, low = max(open, price) * 1.001, min(open, price) * 0.999
+        klines.append(Kline(open_time, open, high, low, price, 2.0, open_time + MINUTE - 1, 200.0, 3, "BTCUSDT", "1m", True))
+    return klines
+
+
+class TestTimeframeAggregator(unittest.TestCase):
+    def test_builds_aligned_higher_intervals(self):
+        """
+        it closes higher interval candles on exchange boundaries and skips incomplete first ones
+        """
+        # starts 37 minutes into an hour
+        start = 1700000000000 - 1700000000000 % HOUR + 37 * MINUTE
+        klines = minute_klines(start, 6 * 60)
+        agg = aggregator.TimeframeAggregator("1m")
+        agg.add("btcusdt", ["1m", "5m", "1h"])
+
+        closed = [higher for kline in klines for higher in agg.update(kline)]
+        hours = [kline for kline in closed if kline.interval == "1h"]
+        fives = [kline for kline in closed if kline.interval == "5m"]
+
+        # 00:37 - 06:37, first partial hour and 00:35 five minutes are skipped
+        self.assertEqual(len(hours), 5)
+        self.assertEqual(len(fives), 71)
+        self.assertEqual(agg.skipped, 2)
+
+        hour = hours[0]
+        members = [kline for kline in klines if hour.open_time <= kline.open_time <= hour.close_time]
+        self.assertEqual(hour.open_time % HOUR, 0)
+        self.assertEqual(hour.close_time, hour.open_time + HOUR - 1)
+        self.assertEqual(len(members), 60)
+        self.assertEqual(hour.open, members[0].open)
+        self.assertEqual(hour.close, members[-1].close)
+        self.assertEqual(hour.high, max(kline.high for kline in members))
+        self.assertEqual(hour.low, min(kline.low for kline in members))
+        self.assertEqual(hour.volume, 120.0)
+        self.assertEqual(hour.trades_amount, 180)
+
+        # unclosed and other interval klines are ignored
+        self.assertEqual(agg.update(klines[0]._replace(closed=False)), [])
+        self.assertEqual(agg.partial("BTCUSDT", "1h").open_time, start + 6 * 60 * MINUTE - 37 * MINUTE)
+
+    def test_skips_candle_with_missing_base_candle(self):
+        """
+        it doesn't emit candle when a base candle is missing
+        """
+        klines = minute_klines(1700000000000 - 1700000000000 % HOUR, 15)
+        agg = aggregator.TimeframeAggregator()
+        agg.add("BTCUSDT", ["5m"])
+
+        closed = [higher for kline in klines if kline.open_time != klines[7].open_time for higher in agg.update(kline)]
+
+        self.assertEqual([kline.open_time for kline in closed], [klines[0].open_time, klines[10].open_time])
+        with self.assertRaises(ValueError):
+            agg.add("BTCUSDT", ["90s"])
+
+    def test_weeks_start_on_monday(self):
+        """
+        it aligns weekly candles to Monday 00:00 UTC
+        """
+        # Monday 2023-11-13 00:00 UTC
+        monday = 1699833600000
+        self.assertEqual(aggregator.bucket_start(monday + 3 * 24 * HOUR, "1w"), monday)
+
+
+class TestBinanceAggregation(unittest.TestCase):
+    def test_analyses_and_persists_aggregated_candles(self):
+        """
+        it runs TA on aggregated candles and passes them to persistence with base kline
+        """
+        client = binance.Binance()
+        client.aggregator.add("btcusdt", ["5m"])
+
+        results = [client._analyse(kline) for kline in minute_klines(1700000000000 - 1700000000000 % HOUR, 10)]
+
+        self.assertEqual(len(results[4]), 2)
+        self.assertEqual(results[4][1].interval, "5m")
+        self.assertEqual(results[3].interval, "1m")
+        self.assertEqual(len(client.store.get("btcusdt", "5m")), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
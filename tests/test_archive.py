@@ -0,0 +1,94 @@
+import tempfile
+import unittest
+
+from unittest import mock
+
+import numpy as np
+import talib
+
+import archive
+from models import Kline
+
+
+def kline(i):
+    return Kline(i * 60000, i, i + 1, i - 1, i + 0.5, 10, i * 60000 + 59999, 100, 5, "ETHUSDT", "1m", True)
+
+
+class TestArchiveSeries(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.series = archive.ArchiveSeries(self.tmp.name, segment_rows=4)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_appends_segments_and_reads_range(self):
+        """
+        it writes segment per segment_rows candles and reads open time range across segments
+        """
+        for i in range(10):
+            self.series.append(kline(i))
+        self.series.append(kline(3))   # already archived
+        self.series.flush()
+
+        self.assertEqual([s["rows"] for s in self.series.segments], [4, 4, 2])
+
+        columns = self.series.read(2 * 60000, 7 * 60000)
+        np.testing.assert_array_equal(columns["open_time"], np.arange(2, 7) * 60000)
+        np.testing.assert_array_equal(columns["close"], np.arange(2, 7) + 0.5)
+
+    def test_reopens_from_index(self):
+        """
+        it restores segments from index and ignores candles older than archived
+        """
+        for i in range(6):
+            self.series.append(kline(i))
+        self.series.flush()
+
+        reopened = archive.ArchiveSeries(self.tmp.name, segment_rows=4)
+        reopened.append(kline(5))
+        reopened.append(kline(6))
+        reopened.flush()
+
+        np.testing.assert_array_equal(reopened.read()["open_time"], np.arange(7) * 60000)
+
+    def test_compacts_into_zero_copy_segment(self):
+        """
+        it merges segments and returns memory-mapped views usable by talib
+        """
+        for i in range(30):
+            self.series.append(kline(i))
+        self.series.compact()
+
+        self.assertEqual(len(self.series.segments), 1)
+        close = self.series.read()["close"]
+        self.assertIsInstance(close.base, np.memmap)
+        self.assertTrue(close.flags.c_contiguous)
+        np.testing.assert_allclose(talib.SMA(close, 5)[-1], 27.5)
+
+    def test_interrupted_compaction_keeps_all_rows(self):
+        """
+        it keeps every candle readable after reopening when compaction fails part-way
+        """
+        failures = (
+            # second merged segment can't be saved
+            mock.patch("archive.np.save", side_effect=[None, OSError]),
+            mock.patch.object(archive.ArchiveSeries, "_write_index", side_effect=OSError),
+            mock.patch("archive.os.remove", side_effect=OSError),
+        )
+        for failure in failures:
+            with self.subTest(failing=failure.attribute), tempfile.TemporaryDirectory() as path:
+                series = archive.ArchiveSeries(path, segment_rows=4)
+                for i in range(30):
+                    series.append(kline(i))
+                series.flush()
+
+                with failure, self.assertRaises(OSError):
+                    series.compact(max_rows=12)
+
+                reopened = archive.ArchiveSeries(path, segment_rows=4)
+                self.assertEqual(reopened.read()["open_time"].tolist(), [i * 60000 for i in range(30)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+
+from datetime import timedelta
+from time import time
+
+import binance
+import database
+from backfill import Backfill
+from mock_exchange import MockExchange
+
+MINUTE = 60 * 1000
+
+
+def kline_row(open_time):
+    return [open_time, "1.0", "2.0", "1.0", "2.0", "10.0", open_time + MINUTE - 1, "15.0", 5, "5.0", "7.5", "0"]
+
+
+class TestBackfill(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        database.configure(f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}", statement_timeout=5)
+
+        self.exchange = MockExchange()
+        await self.exchange.start()
+
+        self.client = binance.Binance()
+        self.client.API_URL = self.exchange.url
+        self.client.KLINES_LIMIT = 4
+        await self.client.__aenter__()
+
+        # open time of closed candle an hour ago
+        self.start = (int(time() * 1000) // MINUTE - 60) * MINUTE
+
+    async def asyncTearDown(self):
+        await self.client.__aexit__(None, None, None)
+        await self.exchange.stop()
+        await database.async_engine.dispose()
+        database.engine.dispose()
+        self.tmp.cleanup()
+
+    async def test_plans_pages_of_lookback(self):
+        """
+        it splits lookback of series without stored candles into KLINES_LIMIT pages ending at end time
+        """
+        backfill = Backfill(self.client, lookback=timedelta(minutes=10))
+        end_time = self.start + 10 * MINUTE + 30000
+
+        pages = await backfill._plan("btcusdt", "1m", end_time)
+
+        self.assertEqual(pages, [
+            ("btcusdt", "1m", self.start, self.start + 4 * MINUTE - 1),
+            ("btcusdt", "1m", self.start + 4 * MINUTE, self.start + 8 * MINUTE - 1),
+            ("btcusdt", "1m", self.start + 8 * MINUTE, end_time),
+        ])
+
+    async def test_resumes_from_last_stored_candle(self):
+        """
+        it stores fetched candles and resumes from the newest stored one on next run
+        """
+        rows = self.exchange.klines[("BTCUSDT", "1m")] = [kline_row(self.start + i * MINUTE) for i in range(10)]
+
+        backfill = Backfill(self.client, lookback=timedelta(minutes=10))
+        await backfill.run(["btcusdt"], ["1m"], end_time=self.start + 10 * MINUTE)
+
+        self.assertEqual(backfill.pages, 3)
+        self.assertEqual(backfill.candlesticks, 10)
+        self.assertEqual(self.exchange.requests, 3)
+
+        rows.extend(kline_row(self.start + i * MINUTE) for i in range(10, 13))
+        resumed = Backfill(self.client, lookback=timedelta(minutes=10))
+        pages = await resumed._plan("btcusdt", "1m", self.start + 13 * MINUTE)
+        await resumed.run(["btcusdt"], ["1m"], end_time=self.start + 13 * MINUTE)
+
+        # newest stored candle is fetched again
+        self.assertEqual(pages, [("btcusdt", "1m", self.start + 9 * MINUTE, self.start + 13 * MINUTE - 1)])
+        self.assertEqual(resumed.candlesticks, 4)
+        self.assertEqual(self.exchange.requests, 4)
+
+        columns = self.client.db.load_range("BTCUSDT", "1m")
+        self.assertEqual(columns["open_time"].tolist(), [self.start + i * MINUTE for i in range(13)])
+
+    async def test_records_pages_failing_on_connection_errors(self):
+        """
+        it records pages failing on connection errors as failed and keeps backfilling
+        """
+        await self.exchange.stop()
+
+        backfill = Backfill(self.client, lookback=timedelta(minutes=10))
+        await backfill.run(["btcusdt"], ["1m"], end_time=self.start + 10 * MINUTE)
+
+        self.assertCountEqual(backfill.failed, [
+            ("btcusdt", "1m", self.start + i * MINUTE) for i in (0, 4, 8)
+        ])
+        self.assertEqual(backfill.pages, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
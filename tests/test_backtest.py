@@ -0,0 +1,58 @@
+import unittest
+from datetime import datetime, timedelta
+
+import backtest
+
+
+def candles(closes, lows=None, highs=None):
+    start = datetime(2021, 1, 1)
+    lows = lows or closes
+    highs = highs or closes
+    for i, (close, low, high) in enumerate(zip(closes, lows, highs)):
+        yield start + timedelta(minutes=i), close, high, low, close
+
+
+class TestBacktest(unittest.TestCase):
+    def config(self, **kw):
+        return backtest.BacktestConfig("BTCUSDT", "1m", 1, 2, fee=0.0, **kw)
+
+    def test_trades_on_crossovers(self):
+        """
+        it enters on golden cross and exits on death cross at next open
+        """
+        closes = [3, 2, 1, 2, 3, 4, 3, 2, 1]
+        result = backtest.Backtest(self.config()).replay(candles(closes))
+
+        self.assertEqual(len(result.trades), 1)
+        trade = result.trades[0]
+        self.assertEqual((trade.entry_price, trade.exit_price, trade.reason), (3, 2, "signal"))
+        self.assertAlmostEqual(result.final_balance, 1000 * 2 / 3)
+        self.assertGreater(result.max_drawdown, 0)
+
+    def test_stop_loss(self):
+        """
+        it exits at stop price when candle low reaches it
+        """
+        closes = [3, 2, 1, 2, 3, 4, 4, 4]
+        lows = [3, 2, 1, 2, 3, 4, 2, 4]
+        result = backtest.Backtest(self.config(stop_loss=0.1)).replay(candles(closes, lows=lows))
+
+        trade = result.trades[0]
+        self.assertEqual(trade.reason, "stop_loss")
+        self.assertAlmostEqual(trade.exit_price, 2.7)
+
+    def test_take_profit(self):
+        """
+        it exits at target price when candle high reaches it
+        """
+        closes = [3, 2, 1, 2, 3, 4, 4, 4]
+        highs = [3, 2, 1, 2, 3, 4, 5, 4]
+        result = backtest.Backtest(self.config(take_profit=0.5)).replay(candles(closes, highs=highs))
+
+        trade = result.trades[0]
+        self.assertEqual(trade.reason, "take_profit")
+        self.assertAlmostEqual(trade.exit_price, 4.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+import binance
+from records import Kline
+
+# combined stream frames as sent by exchange
+KLINE_FRAME = (
+    '{"stream":"btcusdt@kline_1m","data":{"e":"kline","E":1672515782136,"s":"BTCUSDT","k":{'
+    '"t":1672515780000,"T":1672515839999,"s":"BTCUSDT","i":"1m","f":100,"L":200,"o":"16500.10",'
+    '"c":"16510.50","h":"16512.00","l":"16499.90","v":"12.345","n":321,"x":false,"q":"203800.12",'
+    '"V":"6.1","Q":"100700.5","B":"0"}}}'
+)
+CLOSED_KLINE_FRAME = KLINE_FRAME.replace('"x":false', '"x":true')
+SUBSCRIPTION_REPLY = '{"result":null,"id":1}'
+
+
+class TestParseFrame(unittest.TestCase):
+    def setUp(self):
+        self.client = binance.Binance()
+        self.client.handlers["btcusdt@kline_1m"] = self.client._handle_kline
+
+    def test_parses_kline_frames(self):
+        """
+        it routes combined stream kline frame to kline handler and parses it with closed flag
+        """
+        kline = self.client._parse_frame(KLINE_FRAME)
+
+        self.assertEqual(kline, Kline(
+            1672515780000, 16500.10, 16512.00, 16499.90, 16510.50, 12.345, 1672515839999,
+            203800.12, 321, "BTCUSDT", "1m", False,
+        ))
+        self.assertTrue(self.client._parse_frame(CLOSED_KLINE_FRAME).closed)
+        self.assertTrue(binance.Binance._is_unclosed_frame(KLINE_FRAME))
+        self.assertFalse(binance.Binance._is_unclosed_frame(CLOSED_KLINE_FRAME))
+
+    def test_parses_raw_stream_frames(self):
+        """
+        it parses frames of raw stream which come without envelope
+        """
+        raw = KLINE_FRAME[len('{"stream":"btcusdt@kline_1m","data":'):-1]
+
+        self.assertEqual(self.client._parse_frame(raw), self.client._parse_frame(KLINE_FRAME))
+
+    def test_skips_other_frames(self):
+        """
+        it returns nothing for subscription replies, frames of unknown streams and events without kline
+        """
+        self.assertIsNone(self.client._parse_frame(SUBSCRIPTION_REPLY))
+        self.assertIsNone(self.client._parse_frame(KLINE_FRAME.replace("btcusdt@kline_1m", "ethusdt@kline_1m")))
+        self.assertIsNone(self.client._parse_frame('{"e":"24hrMiniTicker","s":"BTCUSDT","c":"16510.50"}'))
+
+
+if __name__ == "__main__":
+    unittest.main()
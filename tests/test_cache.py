@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+import talib
+
+import cache
+import indicators
+import store
+import ta
+from models import Kline
+
+
+def kline(i, close, closed=True):
+    return Kline(i * 60000, close, close, close, close, 1, i * 60000 + 59999, 1, 1, "ETHUSDT", "1m", closed)
+
+
+class TestIndicatorCache(unittest.TestCase):
+    def setUp(self):
+        self.store = store.CandleStore(capacity=100)
+        self.cache = cache.IndicatorCache(self.store)
+        self.closes = np.random.default_rng(1).normal(100, 5, 60)
+        for i, close in enumerate(self.closes):
+            self.store.update(kline(i, close))
+
+    def test_hits_until_candle_closes(self):
+        """
+        it returns cached values until new candle closes
+        """
+        first = self.cache.get("ETHUSDT", "1m", "sma", timeperiod=10)
+        second = self.cache.get("ethusdt", "1m", "sma", timeperiod=10)
+        self.assertIs(first, second)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+        self.store.update(kline(60, 101.0))
+        values = self.cache.get("ETHUSDT", "1m", "sma", timeperiod=10)
+        self.assertEqual(self.cache.misses, 2)
+        np.testing.assert_allclose(values, talib.SMA(np.append(self.closes, 101.0), 10))
+
+    def test_extends_prefix_for_in_progress_candle(self):
+        """
+        it reuses closed candle values and extends them with in-progress candle value
+        """
+        for name, function in (("sma", talib.SMA), ("ema", talib.EMA)):
+            self.cache.get("ETHUSDT", "1m", name, timeperiod=10)
+            for close in (99.0, 103.5):
+                self.store.update(kline(60, close, closed=False))
+                values = self.cache.get("ETHUSDT", "1m", name, timeperiod=10)
+                np.testing.assert_allclose(values, function(np.append(self.closes, close), 10))
+
+        self.assertEqual(self.cache.misses, 2)
+        # first ema call already extends in-progress candle left by sma loop
+        self.assertEqual(self.cache.partial_hits, 5)
+
+    def test_evicts_least_recently_used(self):
+        """
+        it evicts least recently used entries over memory budget
+        """
+        self.cache.max_bytes = 2 * 60 * 8
+        for timeperiod in (5, 10, 15):
+            self.cache.get("ETHUSDT", "1m", "sma", timeperiod=timeperiod)
+
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertEqual([key[3] for key in self.cache.entries], [(("timeperiod", 10),), (("timeperiod", 15),)])
+
+    def test_golden_cross_uses_cache(self):
+        """
+        it serves GoldenCross moving averages from cache
+        """
+        indicator = ta.GoldenCross(None, 5, 20, cache=self.cache.bind("ETHUSDT", "1m"))
+        ma_short, ma_long = indicator._calculate_sma()
+        indicator._calculate_sma()
+
+        np.testing.assert_allclose(ma_long, talib.SMA(self.closes, 20))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+
+    def test_evaluator_uses_cache(self):
+        """
+        it serves evaluator moving averages from cache with same results as computing them
+        """
+        evaluator = indicators.Evaluator([("crossover", {"short_window": 5, "long_window": 20}), ("macd", {})])
+        series = self.cache.bind("ETHUSDT", "1m")
+
+        cached = evaluator.evaluate(self.closes, cache=series)
+        self.assertEqual(cached, evaluator.evaluate(self.closes))
+        # sma 5 and 20, ema 12 and 26
+        self.assertEqual(self.cache.misses, 4)
+
+        evaluator.evaluate(self.closes, cache=series)
+        self.assertEqual((self.cache.hits, self.cache.misses), (4, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
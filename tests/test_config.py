@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_modules(statement):
+    """Heavy dependencies loaded after running statement in fresh interpreter"""
+    code = (
+        f"import sys; {statement}\n"
+        "loaded = [name for name in ('numpy', 'sqlalchemy', 'talib', 'aiohttp') if name in sys.modules\n"
+        "          and not type(sys.modules[name]).__name__.startswith('_Lazy')]\n"
+        "print(' '.join(loaded))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return output.stdout.split()
+
+
+class TestConfig(unittest.TestCase):
+    def test_reads_environment(self):
+        """
+        it reads settings from environment and keeps defaults of unset ones
+        """
+        loaded = config.Config.from_env({
+            config.DSN_ENV: "sqlite:///kubera.db",
+            config.STATEMENT_TIMEOUT_ENV: "2.5",
+        })
+
+        self.assertEqual(loaded.db_dsn, "sqlite:///kubera.db")
+        self.assertEqual(loaded.db_pool_size, 5)
+        self.assertEqual(loaded.db_statement_timeout, 2.5)
+        self.assertIsNone(loaded.metrics_port)
+        self.assertEqual(loaded.metrics_host, "127.0.0.1")
+
+    def test_metrics_are_exposed_only_when_configured(self):
+        """
+        it serves metrics only when port is set and on loopback unless host is set too
+        """
+        loaded = config.Config.from_env({config.METRICS_PORT_ENV: "9100", config.METRICS_HOST_ENV: "0.0.0.0"})
+
+        self.assertEqual(loaded.metrics_port, 9100)
+        self.assertEqual(loaded.metrics_host, "0.0.0.0")
+        self.assertIsNone(config.Config.from_env({config.METRICS_PORT_ENV: ""}).metrics_port)
+
+    def test_bot_import_defers_heavy_dependencies(self):
+        """
+        it imports bot without loading NumPy, SQLAlchemy, TA-Lib and aiohttp
+        """
+        self.assertEqual(loaded_modules("import bot"), [])
+
+    def test_connector_defers_talib(self):
+        """
+        it creates connector without loading TA-Lib until indicators are used
+        """
+        self.assertNotIn("talib", loaded_modules("import binance; binance.Binance()"))
+        self.assertIn("talib", loaded_modules("import binance; binance.Binance().indicators"))
+
+
+if __name__ == "__main__":
+    unittest.main()
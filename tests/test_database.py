@@ -0,0 +1,260 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+from sqlalchemy import TIMESTAMP, BigInteger, Double, inspect
+
+import database
+from models import Kline
+
+
+def candlestick(i, close=None):
+    open_time = 1700000000000 + i * 60000
+    return Kline(open_time, i, i, i, i if close is None else close, i, open_time + 59999, 1, 2, "ETHUSDT", "1m", True).to_candlestick()
+
+
+class TestAsyncDbManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        database.configure(f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}", statement_timeout=5)
+        self.db = database.DbManager()
+
+    def tearDown(self):
+        asyncio.run(database.async_engine.dispose())
+        database.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_upserts_and_loads(self):
+        """
+        it upserts rows, updating existing candlesticks, and loads them as columns
+        """
+        async def run():
+            await self.db.upsert([database.DbManager.to_row(candlestick(i)) for i in range(10)])
+            await self.db.upsert([database.DbManager.to_row(candlestick(3, close=42))])
+            await self.db.save(candlestick(10))
+            return await self.db.load("ETHUSDT", "1m")
+
+        columns = asyncio.run(run())
+
+        self.assertEqual(len(columns["close"]), 11)
+        self.assertEqual(columns["close"][3], 42)
+        self.assertEqual(columns["open_time"][0], 1700000000000)
+
+    def test_records_query_latency(self):
+        """
+        it records latency of every executed query
+        """
+        before = database.QUERY_LATENCY.count
+        asyncio.run(self.db.load("ETHUSDT", "1m"))
+
+        self.assertGreater(database.QUERY_LATENCY.count, before)
+        self.assertIn("async", database.pool_status())
+
+
+class TestSchema(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        database.configure(f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}", statement_timeout=5)
+        self.db = database.DbManager()
+
+    def tearDown(self):
+        database.async_engine.sync_engine.dispose()
+        database.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_numeric_columns_keyed_by_series(self):
+        """
+        it stores values as doubles and trades as integers, keyed by pair, interval and open time
+        """
+        inspector = inspect(database.get_engine())
+        types = {column["name"]: column["type"] for column in inspector.get_columns("candlestick")}
+
+        for name in ("open", "high", "low", "close", "volume", "quote_asset_volume"):
+            self.assertIsInstance(types[name], Double, name)
+        self.assertIsInstance(types["trades_amount"], BigInteger)
+        self.assertIsInstance(types["open_time"], TIMESTAMP)
+        self.assertNotIn("id", types)
+        self.assertEqual(inspector.get_pk_constraint("candlestick")["constrained_columns"], ["pair", "interval", "open_time"])
+
+    def test_keeps_candles_of_dst_fall_back_hour_apart(self):
+        """
+        it keys candles by UTC so the repeated local hour when clocks go back doesn't merge them
+        """
+        previous = os.environ.get("TZ")
+        os.environ["TZ"] = "Europe/Berlin"
+        time.tzset()
+        try:
+            # 2023-10-29 02:30 CEST and 02:30 CET
+            open_times = [1698539400000, 1698543000000]
+            klines = [
+                Kline(open_time, 1, 1, 1, close, 1, open_time + 3599999, 1, 2, "ETHUSDT", "1h", True)
+                for open_time, close in zip(open_times, (1.0, 2.0))
+            ]
+            self.db.bulk_upsert([database.DbManager.to_row(kline.to_candlestick()) for kline in klines])
+            columns = self.db.load_range("ETHUSDT", "1h")
+            latest = self.db.latest_open_time("ETHUSDT", "1h")
+        finally:
+            if previous is None:
+                del os.environ["TZ"]
+            else:
+                os.environ["TZ"] = previous
+            time.tzset()
+
+        self.assertEqual(columns["open_time"].tolist(), open_times)
+        self.assertEqual(columns["close"].tolist(), [1.0, 2.0])
+        self.assertEqual(latest, datetime(2023, 10, 29, 1, 30, tzinfo=timezone.utc))
+
+    def test_load_range_returns_numeric_columns(self):
+        """
+        it loads candles of range ordered by open time as epoch ms and float columns, end is exclusive
+        """
+        self.db.bulk_upsert([database.DbManager.to_row(candlestick(i)) for i in reversed(range(10))])
+        start, end = candlestick(2).open_time, candlestick(5).open_time
+
+        columns = self.db.load_range("ethusdt", "1m", start, end)
+
+        self.assertEqual(list(columns), [
+            "open_time", "open", "high", "low", "close", "volume", "close_time", "quote_asset_volume", "trades_amount",
+        ])
+        self.assertEqual(columns["open_time"].tolist(), [1700000000000 + i * 60000 for i in (2, 3, 4)])
+        self.assertEqual(columns["close_time"].tolist(), [1700000059999 + i * 60000 for i in (2, 3, 4)])
+        self.assertEqual(columns["close"].tolist(), [2.0, 3.0, 4.0])
+        self.assertEqual(columns["trades_amount"].tolist(), [2, 2, 2])
+        self.assertEqual({name: str(column.dtype) for name, column in columns.items()}, {
+            name: "int64" if name in ("open_time", "close_time", "trades_amount") else "float64" for name in columns
+        })
+
+        empty = self.db.load_range("BTCUSDT", "1m")
+        self.assertEqual([len(column) for column in empty.values()], [0] * 9)
+        self.assertEqual(empty["open_time"].dtype, np.int64)
+
+
+class FlakyDbManager(database.DbManager):
+    """Fails first `failures` upserts like lost database connection"""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    async def upsert(self, rows):
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("connection lost")
+        await super().upsert(rows)
+
+
+class TestCandlestickWriter(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        database.configure(f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}", statement_timeout=5)
+        self.db = database.DbManager()
+
+    async def asyncTearDown(self):
+        await database.async_engine.dispose()
+        database.engine.dispose()
+        self.tmp.cleanup()
+
+    async def stored(self):
+        return len((await self.db.load("ETHUSDT", "1m"))["close"])
+
+    async def wait_stored(self, count, timeout=5.0):
+        for _ in range(int(timeout / 0.01)):
+            if await self.stored() == count:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"{count} candlesticks were not stored in time")
+
+    async def test_flushes_at_batch_size(self):
+        """
+        it writes buffer as soon as it reaches batch size
+        """
+        writer = database.CandlestickWriter(self.db, batch_size=5, flush_interval=60)
+        writer.start()
+
+        writer.put([candlestick(i) for i in range(4)])
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(writer.buffer), 4)
+        self.assertEqual(await self.stored(), 0)
+
+        writer.put(candlestick(4))
+        await self.wait_stored(5)
+        self.assertEqual(writer.buffer, [])
+        await writer.stop()
+
+    async def test_flushes_on_interval(self):
+        """
+        it writes partial batch once flush interval passes
+        """
+        writer = database.CandlestickWriter(self.db, batch_size=100, flush_interval=0.05)
+        writer.start()
+
+        writer.put([candlestick(i) for i in range(3)])
+        await self.wait_stored(3)
+        await writer.stop()
+
+    async def test_retries_failed_write(self):
+        """
+        it keeps rows of failed write and writes them on next flush
+        """
+        writer = database.CandlestickWriter(FlakyDbManager(failures=1), batch_size=100, flush_interval=0.05)
+        writer.start()
+
+        writer.put([candlestick(i) for i in range(3)])
+        await self.wait_stored(3)
+        self.assertEqual(writer.db.failures, 0)
+        self.assertEqual(writer.buffer, [])
+        await writer.stop()
+
+    async def test_drains_on_stop(self):
+        """
+        it writes buffered candlesticks when stopped before batch size or interval is reached
+        """
+        writer = database.CandlestickWriter(self.db, batch_size=100, flush_interval=60)
+        writer.start()
+
+        writer.put([candlestick(i) for i in range(7)])
+        await writer.stop()
+
+        self.assertEqual(writer.buffer, [])
+        self.assertEqual(await self.stored(), 7)
+
+    async def test_caps_buffer_while_database_is_down(self):
+        """
+        it drops oldest rows once buffer exceeds max_buffered and counts them
+        """
+        writer = database.CandlestickWriter(FlakyDbManager(failures=2), batch_size=100, max_buffered=5)
+        dropped = database.ROWS_DROPPED.value
+
+        writer.put([candlestick(i) for i in range(4)])
+        await writer.flush()
+        writer.put([candlestick(i) for i in range(4, 8)])
+        await writer.flush()
+
+        self.assertEqual([row["close"] for row in writer.buffer], [3.0, 4.0, 5.0, 6.0, 7.0])
+        self.assertEqual(database.ROWS_DROPPED.value - dropped, 3)
+
+        await writer.flush()
+        self.assertEqual(await self.stored(), 5)
+
+    async def test_stops_when_final_flush_fails(self):
+        """
+        it logs failed final flush and stops without raising
+        """
+        writer = database.CandlestickWriter(FlakyDbManager(failures=1), batch_size=100, flush_interval=60)
+        writer.start()
+
+        writer.put([candlestick(i) for i in range(3)])
+        with self.assertLogs(writer.logger, "ERROR"):
+            await writer.stop()
+
+        self.assertEqual(len(writer.buffer), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
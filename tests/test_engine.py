@@ -0,0 +1,331 @@
+import asyncio
+import json
+import unittest
+
+from time import monotonic, time
+from unittest import mock
+
+import aiohttp
+
+import binance
+import indicators
+from records import Kline
+from mock_exchange import MockExchange
+
+MINUTE = 60 * 1000
+
+
+def kline_frame(open_time, closed=True):
+    """Combined stream frame of btcusdt 1m kline, compact like the exchange sends it"""
+    kline = {
+        "t": open_time, "T": open_time + MINUTE - 1, "s": "BTCUSDT", "i": "1m",
+        "o": "1.0", "c": "2.0", "h": "2.0", "l": "1.0", "v": "10.0", "n": 5, "x": closed, "q": "15.0",
+    }
+    data = {"e": "kline", "E": open_time, "s": "BTCUSDT", "k": kline}
+    return json.dumps({"stream": "btcusdt@kline_1m", "data": data}, separators=(",", ":"))
+
+
+def kline_row(open_time):
+    return [open_time, "1.0", "2.0", "1.0", "2.0", "10.0", open_time + MINUTE - 1, "15.0", 5, "5.0", "7.5", "0"]
+
+
+class FakeWebSocket:
+    """Websocket serving pushed frames, drop() simulates connection lost by exchange"""
+
+    def __init__(self, frames=()):
+        self.closed = False
+        self.sent = []
+        self._messages = asyncio.Queue()
+        for frame in frames:
+            self.push(frame)
+
+    def push(self, frame):
+        self._messages.put_nowait(aiohttp.WSMessage(aiohttp.WSMsgType.TEXT, frame, None))
+
+    def drop(self):
+        self.closed = True
+        self._messages.put_nowait(aiohttp.WSMessage(aiohttp.WSMsgType.CLOSED, None, None))
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            self._messages.put_nowait(aiohttp.WSMessage(aiohttp.WSMsgType.CLOSE, None, None))
+
+    async def receive(self):
+        return await self._messages.get()
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def pong(self, data):
+        pass
+
+
+class FakeSession:
+    """
+    Session whose websocket connects take outcomes in order, exceptions are
+    raised and sockets returned, then fresh sockets. REST requests go to wrapped session.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.outcomes = []
+        self.sockets = []
+        self.urls = []
+        self.attempts = []      # monotonic time of every connect attempt
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    async def ws_connect(self, url, **kwargs):
+        self.attempts.append(monotonic())
+        self.urls.append(url)
+        outcome = self.outcomes.pop(0) if self.outcomes else FakeWebSocket()
+        if isinstance(outcome, Exception):
+            raise outcome
+
+        self.sockets.append(outcome)
+        return outcome
+
+
+class RecordingBinance(binance.Binance):
+    """Records klines entering TA stage and closed klines persisted, instead of writing them to db"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.analysed = []
+        self.persisted = []
+
+    def _analyse(self, kline):
+        self.analysed.append(kline)
+        return super()._analyse(kline)
+
+    def _persist(self, klines):
+        self.persisted.extend(klines if isinstance(klines, list) else [klines])
+
+
+class TestStreamConnection(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.exchange = MockExchange()
+        await self.exchange.start()
+
+        self.client = RecordingBinance()
+        self.client.API_URL = self.exchange.url
+        await self.client.__aenter__()
+        self.session = self.client.session = FakeSession(self.client.session)
+
+        # open time of closed candle 20 minutes ago
+        self.start = (int(time() * 1000) // MINUTE - 20) * MINUTE
+
+    async def asyncTearDown(self):
+        await self.client.__aexit__(None, None, None)
+        await self.exchange.stop()
+
+    async def wait_for(self, condition, timeout=5.0):
+        deadline = monotonic() + timeout
+        while not condition():
+            self.assertLess(monotonic(), deadline, "Condition not met in time")
+            await asyncio.sleep(0.005)
+
+    def open_times(self, klines):
+        return [(kline.open_time - self.start) // MINUTE for kline in klines]
+
+    async def test_reconnects_with_backoff(self):
+        """
+        it retries dropped connection with exponential backoff capped at BACKOFF_MAX
+        """
+        self.client.BACKOFF_BASE = 0.05
+        self.client.BACKOFF_MAX = 0.1
+        first = FakeWebSocket()
+        error = aiohttp.ClientConnectionError("refused")
+        self.session.outcomes = [first, error, error, error, FakeWebSocket()]
+
+        with mock.patch("engine.random.uniform", return_value=1.0):
+            await self.client.subscribe_klines(["btcusdt"], ["1m"])
+            first.drop()
+            await self.wait_for(lambda: len(self.session.sockets) == 2)
+
+        connection = self.client.connections[0]
+        self.assertEqual(connection.reconnects, 1)
+        self.assertIs(connection.wss, self.session.sockets[1])
+
+        attempts = self.session.attempts[1:]
+        delays = [later - earlier for earlier, later in zip(attempts, attempts[1:])]
+        self.assertEqual(len(delays), 3)
+        self.assertGreaterEqual(delays[0], 0.05)
+        self.assertGreaterEqual(delays[1], 0.1)
+        # capped, uncapped delay would be 0.2s
+        self.assertGreaterEqual(delays[2], 0.1)
+        self.assertLess(delays[2], 0.2)
+
+    async def test_fills_gap_before_frames_of_new_connection(self):
+        """
+        it queues candles closed while disconnected before frames of new connection and drops duplicates
+        """
+        self.client.KLINES_LIMIT = 4
+        self.exchange.klines[("BTCUSDT", "1m")] = [kline_row(self.start + i * MINUTE) for i in range(10)]
+
+        first = FakeWebSocket([kline_frame(self.start)])
+        # new connection repeats last candle of the gap
+        second = FakeWebSocket([kline_frame(self.start + 9 * MINUTE), kline_frame(self.start + 10 * MINUTE)])
+        self.session.outcomes = [first, second]
+
+        await self.client.subscribe_klines(["btcusdt"], ["1m"])
+        await self.wait_for(lambda: len(self.client.persisted) == 1)
+        first.drop()
+        await self.wait_for(lambda: len(self.client.persisted) == 11)
+        await self.client.pipeline.stop()
+
+        self.assertEqual(self.open_times(self.client.analysed), [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 9, 10])
+        self.assertEqual(self.open_times(self.client.persisted), list(range(11)))
+        # pages of 4, 4 and 1 candles
+        self.assertEqual(self.exchange.requests, 3)
+
+    async def test_fill_gap_pages_until_unclosed_candle(self):
+        """
+        it pages through missing candles and stops at the one still in progress
+        """
+        self.client.KLINES_LIMIT = 3
+        now = int(time() * 1000) // MINUTE * MINUTE
+        rows = [kline_row(self.start + i * MINUTE) for i in range(6)] + [kline_row(now)]
+        self.exchange.klines[("BTCUSDT", "1m")] = rows
+
+        filled = await self.client._fill_gap("btcusdt", "1m", self.start)
+        await self.client.pipeline.stop()
+
+        self.assertEqual(filled, 6)
+        self.assertEqual(self.exchange.requests, 3)
+        self.assertEqual(self.open_times(self.client.persisted), [0, 1, 2, 3, 4, 5])
+
+    async def test_rollover_hands_over_without_loss_or_duplicates(self):
+        """
+        it rolls aged connection over, frames of new one wait until old one is closed
+        """
+        self.client.MAX_CONNECTION_AGE = 0.2
+        self.client.ROLLOVER_OVERLAP = 0.1
+
+        old = FakeWebSocket([kline_frame(self.start), kline_frame(self.start + MINUTE)])
+        new = FakeWebSocket([kline_frame(self.start + 2 * MINUTE), kline_frame(self.start + 3 * MINUTE)])
+        self.session.outcomes = [old, new]
+
+        await self.client.subscribe_klines(["btcusdt"], ["1m"])
+        await self.wait_for(lambda: len(self.session.sockets) == 2)
+        # candle closes during overlap, both connections carry it
+        old.push(kline_frame(self.start + 2 * MINUTE))
+        await self.wait_for(lambda: len(self.client.persisted) == 4)
+        await self.client.pipeline.stop()
+
+        self.assertTrue(old.closed)
+        self.assertEqual(self.client.connections[0].reconnects, 0)
+        self.assertEqual(self.open_times(self.client.analysed), [0, 1, 2, 2, 3])
+        self.assertEqual(self.open_times(self.client.persisted), [0, 1, 2, 3])
+
+    async def test_suppresses_duplicate_closed_candles(self):
+        """
+        it drops klines of candles at or before last closed one
+        """
+        def kline(minute, closed):
+            open_time = self.start + minute * MINUTE
+            return Kline(open_time, 1.0, 2.0, 1.0, 2.0, 10.0, open_time + MINUTE - 1, 15.0, 5, "BTCUSDT", "1m", closed)
+
+        self.assertTrue(self.client._analyse_kline(kline(0, True)))
+        self.assertFalse(self.client._analyse_kline(kline(0, True)))
+        self.assertFalse(self.client._analyse_kline(kline(0, False)))
+        self.assertTrue(self.client._analyse_kline(kline(1, False)))
+        self.assertTrue(self.client._analyse_kline(kline(1, True)))
+        self.assertEqual(self.client.last_closed[("BTCUSDT", "1m")], self.start + MINUTE)
+
+    def test_evaluators_share_cached_indicators(self):
+        """
+        it evaluates closed candles with indicators from cache, computing shared ones once per candle
+        """
+        for indicator in (("sma", {"timeperiod": 2}), ("crossover", {"short_window": 2, "long_window": 3})):
+            self.client.add_evaluator("BTCUSDT", "1m", indicators.Evaluator([indicator]))
+
+        for minute in range(3):
+            open_time = self.start + minute * MINUTE
+            self.client._analyse_kline(
+                Kline(open_time, 1.0, 2.0, 1.0, 2.0, 10.0, open_time + MINUTE - 1, 15.0, 5, "BTCUSDT", "1m", True)
+            )
+
+        # sma 2 and sma 3 once per candle, sma 2 of crossover from cache
+        self.assertEqual((self.client.indicators.misses, self.client.indicators.hits), (6, 3))
+
+
+
+class TestConnectorSharding(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.client = RecordingBinance()
+        self.client.MAX_STREAMS_PER_CONNECTION = 3
+        await self.client.__aenter__()
+        self.session = self.client.session = FakeSession(self.client.session)
+
+    async def asyncTearDown(self):
+        await self.client.__aexit__(None, None, None)
+
+    async def wait_for(self, condition, timeout=5.0):
+        deadline = monotonic() + timeout
+        while not condition():
+            self.assertLess(monotonic(), deadline, "Condition not met in time")
+            await asyncio.sleep(0.005)
+
+    async def test_fills_free_slots_before_opening_connections(self):
+        """
+        it adds streams to connections with free slots and opens new ones for the rest
+        """
+        await self.client.subscribe([f"s{i}" for i in range(5)], print)
+
+        self.assertEqual([sorted(c.streams) for c in self.client.connections], [["s0", "s1", "s2"], ["s3", "s4"]])
+        self.assertEqual(self.session.urls, [
+            self.client._combined_stream_url(["s0", "s1", "s2"]),
+            self.client._combined_stream_url(["s3", "s4"]),
+        ])
+
+        # already subscribed streams are skipped
+        await self.client.subscribe(["s4", "s5", "s6"], print)
+
+        self.assertEqual([sorted(c.streams) for c in self.client.connections], [["s0", "s1", "s2"], ["s3", "s4", "s5"], ["s6"]])
+        self.assertEqual(self.session.sockets[0].sent, [])
+        self.assertEqual(self.session.sockets[1].sent, [{"method": "SUBSCRIBE", "params": ["s5"], "id": 1}])
+        self.assertEqual(len(self.session.sockets), 3)
+
+    async def test_closes_connections_left_empty(self):
+        """
+        it closes connection once all its streams are unsubscribed and unsubscribes others in place
+        """
+        await self.client.subscribe([f"s{i}" for i in range(5)], print)
+        first, second = self.client.connections
+        first_socket, second_socket = self.session.sockets
+
+        await self.client.unsubscribe(["s0", "s1", "s2", "s3"])
+
+        self.assertEqual(self.client.connections, [second])
+        self.assertTrue(first_socket.closed)
+        self.assertTrue(first.task.done())
+        self.assertFalse(second_socket.closed)
+        self.assertEqual(second.streams, {"s4"})
+        self.assertEqual(second_socket.sent, [{"method": "UNSUBSCRIBE", "params": ["s3"], "id": 1}])
+        self.assertEqual(sorted(self.client.handlers), ["s4"])
+
+    async def test_routes_frames_to_stream_handlers(self):
+        """
+        it routes combined stream envelopes to handler of their stream and skips other frames
+        """
+        received = []
+        await self.client.subscribe(["a@trade"], lambda data: received.append(("a", data)))
+        await self.client.subscribe(["b@trade", "c@trade"], lambda data: received.append(("bc", data)))
+        await self.client.unsubscribe(["c@trade"])
+
+        socket = self.session.sockets[0]
+        socket.push(json.dumps({"result": None, "id": 1}))
+        socket.push(json.dumps({"stream": "c@trade", "data": {"p": 0}}))
+        socket.push(json.dumps({"stream": "b@trade", "data": {"p": 2}}))
+        socket.push(json.dumps({"stream": "a@trade", "data": {"p": 1}}))
+        await self.wait_for(lambda: len(received) == 2)
+        await self.client.pipeline.stop()
+
+        self.assertEqual(received, [("bc", {"p": 2}), ("a", {"p": 1})])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+import talib
+
+import indicators
+
+
+class TestEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.closes = np.cumsum(np.random.default_rng(7).normal(0, 1, 300)) + 100
+
+    def test_computes_shared_nodes_once(self):
+        """
+        it adds node shared by indicators to the graph only once
+        """
+        evaluator = indicators.Evaluator([
+            ("macd", {"fast": 12, "slow": 26, "signal": 9}),
+            ("crossover", {"short_window": 12, "long_window": 26, "ma": "ema"}),
+            indicators.Bollinger(20, 2),
+            ("sma", {"timeperiod": 20}),
+        ])
+
+        names = [node.name for node in evaluator.order]
+        self.assertEqual(names.count("ema"), 2)
+        self.assertEqual(names.count("sma"), 1)
+        self.assertEqual(names.count("close"), 1)
+        self.assertEqual(len(evaluator.outputs), 4)
+
+    def test_matches_talib(self):
+        """
+        it computes indicators equal to TA-Lib ones
+        """
+        evaluator = indicators.Evaluator([indicators.MACD(12, 26, 9), indicators.Bollinger(20, 2), indicators.RSI(14)])
+        results = evaluator.compute(self.closes)
+
+        macd, signal, histogram = results[indicators.MACD(12, 26, 9).key]
+        expected = talib.EMA(self.closes, 12) - talib.EMA(self.closes, 26)
+        np.testing.assert_allclose(macd, expected)
+        np.testing.assert_allclose(signal, talib.EMA(expected, 9))
+
+        upper, middle, lower = results[indicators.Bollinger(20, 2).key]
+        for actual, expected in zip((upper, middle, lower), talib.BBANDS(self.closes, 20, 2, 2)):
+            np.testing.assert_allclose(actual, expected)
+
+        np.testing.assert_allclose(results[indicators.RSI(14).key], talib.RSI(self.closes, 14))
+
+    def test_returns_signals_of_newest_candle(self):
+        """
+        it returns signal set with crossover fired by newest candle
+        """
+        evaluator = indicators.Evaluator([indicators.Crossover(2, 4)])
+        closes = np.array([5, 4, 3, 2, 1, 1.5, 6], dtype=np.float64)
+
+        quiet = evaluator.evaluate(closes[:-1], "ETHUSDT", "1m", 0)
+        signal_set = evaluator.evaluate(closes, "ETHUSDT", "1m", 60000)
+
+        self.assertEqual(quiet.signals, [])
+        self.assertEqual([(s.kind, s.direction) for s in signal_set.signals], [("golden_cross", 1)])
+        self.assertEqual(signal_set.values["crossover(long_window=4, ma=sma, short_window=2)"], (3.75, 2.625))
+
+    def test_registry(self):
+        """
+        it creates registered indicators by name
+        """
+        self.assertIsInstance(indicators.create("rsi", timeperiod=7), indicators.RSI)
+        with self.assertRaises(KeyError):
+            indicators.create("unknown")
+
+    def test_node_must_implement_compute(self):
+        """
+        it refuses indicator node not overriding compute
+        """
+        with self.assertRaises(NotImplementedError):
+            class Incomplete(indicators.Node):
+                name = "incomplete"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import logging
+import unittest
+
+import aiohttp
+
+import metrics
+from utils import SampledLogger
+
+
+class TestRegistry(unittest.TestCase):
+    def test_renders_prometheus_text(self):
+        """
+        it renders counters, labeled gauges and cumulative histogram buckets
+        """
+        registry = metrics.Registry()
+        frames = registry.register(metrics.Counter("frames_total", "Frames received"))
+        depth = registry.register(metrics.Gauge("queue_depth", labels=("stage",)))
+        latency = registry.register(metrics.Histogram("latency_seconds", buckets=(0.1, 1.0)))
+
+        frames.inc(3)
+        depth.labels("parse").set(5)
+        depth.labels("ta").set_function(lambda: 7)
+        for value in (0.05, 0.5, 2.0):
+            latency.observe(value)
+
+        lines = registry.render().splitlines()
+        self.assertIn("# HELP frames_total Frames received", lines)
+        self.assertIn("# TYPE frames_total counter", lines)
+        self.assertIn("frames_total 3", lines)
+        self.assertIn('queue_depth{stage="parse"} 5', lines)
+        self.assertIn('queue_depth{stage="ta"} 7', lines)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 2', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn("latency_seconds_count 3", lines)
+
+        with self.assertRaises(AssertionError):
+            registry.register(metrics.Counter("frames_total"))
+
+
+class TestHistogram(unittest.TestCase):
+    def test_estimates_quantiles(self):
+        """
+        it interpolates quantiles inside buckets
+        """
+        histogram = metrics.Histogram("test", buckets=(1, 2, 4))
+        for value in (0.5, 1.5, 1.5, 3, 10):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.counts, [1, 2, 1, 1])
+        self.assertAlmostEqual(histogram.quantile(0.5), 1.75)
+        self.assertEqual(histogram.quantile(1.0), 4)
+        self.assertIsNone(metrics.Histogram("empty").quantile(0.5))
+
+
+class TestMetricsServer(unittest.IsolatedAsyncioTestCase):
+    async def test_serves_registry(self):
+        """
+        it serves registry on /metrics of loopback interface by default
+        """
+        registry = metrics.Registry()
+        registry.register(metrics.Counter("frames_total")).inc()
+
+        server = metrics.MetricsServer(registry)
+        url = await server.start(port=0)
+        try:
+            async with aiohttp.ClientSession() as session, session.get(url) as response:
+                text = await response.text()
+        finally:
+            await server.stop()
+
+        self.assertTrue(url.startswith("http://127.0.0.1:"))
+        self.assertEqual(response.status, 200)
+        self.assertIn("text/plain", response.headers["Content-Type"])
+        self.assertIn("frames_total 1", text)
+
+
+class TestSampledLogger(unittest.TestCase):
+    def test_logs_every_nth_message(self):
+        """
+        it passes one of every n messages to logger
+        """
+        logger = logging.getLogger("Binance_bot.test_sampled")
+        logger.setLevel(logging.DEBUG)
+        sampled = SampledLogger(logger, every=10)
+
+        with self.assertLogs(logger, logging.DEBUG) as logs:
+            for i in range(25):
+                sampled.debug("frame %d", i)
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn("frame 19", logs.output[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import TIMESTAMP, BigInteger, Column, MetaData, String, Table, create_engine, inspect
+
+import database
+import migrate
+
+
+def legacy_table():
+    """Candlestick table before migration, serial id and string values"""
+    return Table(
+        "candlestick", MetaData(),
+        Column("id", BigInteger, primary_key=True),
+        Column("open_time", TIMESTAMP(False)),
+        *(Column(name, String) for name in ("open", "high", "low", "close", "volume")),
+        Column("close_time", TIMESTAMP(False)),
+        Column("quote_asset_volume", String),
+        Column("trades_amount", String),
+        Column("pair", String),
+        Column("interval", String),
+    )
+
+
+def legacy_row(id, open_time, close):
+    return {
+        "id": id, "open_time": open_time, "open": "1.50000000", "high": "2.25000000", "low": "1.00000000",
+        "close": close, "volume": "148976.11427815", "close_time": open_time + timedelta(seconds=59),
+        "quote_asset_volume": "2434.19055334", "trades_amount": "308", "pair": "ethusdt", "interval": "1m",
+    }
+
+
+class TestMigrate(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dsn = f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}"
+
+        # rows across month boundary, last one stored twice by legacy code
+        self.open_times = [datetime(2023, 1, 31, 23, 58), datetime(2023, 1, 31, 23, 59), datetime(2023, 2, 1)]
+        rows = [legacy_row(i, open_time, f"{i + 1}.00000000") for i, open_time in enumerate(self.open_times)]
+        rows.append(legacy_row(3, self.open_times[-1], "3.00000000"))
+
+        legacy = legacy_table()
+        engine = create_engine(self.dsn)
+        legacy.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(legacy.insert(), rows)
+        engine.dispose()
+
+        # existing candlestick table is left alone
+        database.configure(self.dsn, statement_timeout=5)
+
+    def tearDown(self):
+        database.async_engine.sync_engine.dispose()
+        database.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_migrates_legacy_string_rows(self):
+        """
+        it copies legacy string rows into numeric table with upper case pairs and drops legacy table
+        """
+        self.assertTrue(migrate._is_legacy(database.get_engine()))
+
+        migrate.migrate(drop_legacy=True)
+
+        inspector = inspect(database.get_engine())
+        self.assertFalse(inspector.has_table(migrate.LEGACY_TABLE))
+        self.assertFalse(migrate._is_legacy(database.get_engine()))
+
+        columns = database.DbManager().load_range("ETHUSDT", "1m")
+        self.assertEqual(columns["open_time"].tolist(), [int(t.timestamp() * 1000) for t in self.open_times])
+        self.assertEqual(columns["close"].tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(columns["open"].tolist(), [1.5] * 3)
+        self.assertEqual(columns["volume"].tolist(), [148976.11427815] * 3)
+        self.assertEqual(columns["trades_amount"].tolist(), [308] * 3)
+
+    def test_keeps_legacy_table_and_is_rerunnable(self):
+        """
+        it keeps legacy table unless asked to drop it and copies nothing twice when run again
+        """
+        migrate.migrate()
+        migrate.migrate()
+
+        self.assertTrue(inspect(database.get_engine()).has_table(migrate.LEGACY_TABLE))
+        self.assertEqual(len(database.DbManager().load_range("ETHUSDT", "1m")["close"]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
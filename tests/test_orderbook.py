@@ -0,0 +1,118 @@
+import asyncio
+import random
+import unittest
+
+import numpy as np
+
+import orderbook
+
+
+class FakeClient:
+    """Serves depth snapshots of reference book at requested moment"""
+
+    def __init__(self):
+        self.snapshots = []
+        self.requests = []
+
+    async def subscribe(self, streams, handler):
+        self.streams = streams
+
+    async def request(self, endpoint, params=None, weight=1):
+        self.requests.append((endpoint, params, weight))
+        return self.snapshots.pop(0)
+
+
+def random_events(rng, count, first_id=100):
+    """Depth events and reference book snapshot after each of them"""
+    book = {"bids": {}, "asks": {}}
+    events, states = [], []
+    update_id = first_id
+    for i in range(count):
+        diff = {"b": [], "a": []}
+        for side, key, base in (("bids", "b", 9800), ("asks", "a", 10100)):
+            # prices are unique within event like on exchange
+            for cents in rng.sample(range(base, base + 100), rng.randint(1, 5)):
+                price = cents / 100
+                quantity = 0.0 if rng.random() < 0.3 else round(rng.uniform(0.1, 5), 3)
+                diff[key].append([f"{price:.2f}", f"{quantity:.3f}"])
+                if quantity:
+                    book[side][price] = quantity
+                else:
+                    book[side].pop(price, None)
+
+        ids = rng.randint(1, 3)
+        events.append({"e": "depthUpdate", "E": i, "s": "BTCUSDT", "U": update_id + 1, "u": update_id + ids, **diff})
+        update_id += ids
+        states.append({
+            "lastUpdateId": update_id,
+            "bids": [[f"{p:.2f}", f"{q:.3f}"] for p, q in sorted(book["bids"].items(), reverse=True)],
+            "asks": [[f"{p:.2f}", f"{q:.3f}"] for p, q in sorted(book["asks"].items())],
+        })
+    return events, states
+
+
+class TestOrderBook(unittest.TestCase):
+    def test_applies_diffs_best_first(self):
+        """
+        it keeps levels sorted best first and removes zero quantities
+        """
+        book = orderbook.OrderBook("BTCUSDT", capacity=3)
+        book.apply_snapshot({"lastUpdateId": 10, "bids": [["99", "1"], ["98", "2"]], "asks": [["101", "1"]]})
+
+        self.assertTrue(book.apply_diff({"E": 1, "U": 5, "u": 10, "b": [["97", "9"]], "a": []}))
+        self.assertEqual(len(book.bids), 2)
+
+        self.assertTrue(book.apply_diff({"E": 2, "U": 9, "u": 12, "b": [["99.5", "3"], ["98", "0"], ["97", "4"], ["96", "1"]], "a": [["100.5", "2"]]}))
+        bid_prices, bid_quantities, ask_prices, _ = book.top(10)
+        self.assertEqual(list(bid_prices), [99.5, 99, 97])
+        self.assertEqual(list(bid_quantities), [3, 1, 4])
+        self.assertEqual(list(ask_prices), [100.5, 101])
+        self.assertEqual(book.spread, 1.0)
+
+        self.assertFalse(book.apply_diff({"E": 3, "U": 14, "u": 15, "b": [], "a": []}))
+
+
+class TestOrderBooks(unittest.IsolatedAsyncioTestCase):
+    async def test_syncs_from_snapshot_and_resyncs_on_gap(self):
+        """
+        it buffers events until snapshot, then matches reference book and resyncs after lost events
+        """
+        events, states = random_events(random.Random(3), 300)
+        client = FakeClient()
+        books = orderbook.OrderBooks(client, depth=1000)
+        books.RETRY_DELAY = 0
+        await books.subscribe(["btcusdt"])
+        self.assertEqual(client.streams, ["btcusdt@depth@100ms"])
+
+        # snapshot is taken while first events are buffered
+        client.snapshots.append(states[5])
+        for event in events[:20]:
+            books.handle(event)
+        await asyncio.sleep(0)
+        self.assertEqual(client.requests[0], ("depth", {"symbol": "BTCUSDT", "limit": 1000}, 50))
+
+        for event in events[20:150]:
+            books.handle(event)
+        self.assert_matches(books["btcusdt"], states[149])
+
+        # events 150-159 are lost
+        client.snapshots.append(states[170])
+        for event in events[160:200]:
+            books.handle(event)
+        await asyncio.sleep(0)
+        for event in events[200:]:
+            books.handle(event)
+
+        self.assertEqual(books.resyncs, 1)
+        self.assert_matches(books["btcusdt"], states[-1])
+        await books.close()
+
+    def assert_matches(self, book, state):
+        self.assertTrue(book.synced)
+        self.assertEqual(book.last_update_id, state["lastUpdateId"])
+        np.testing.assert_array_equal(book.bids.prices, np.array(state["bids"], dtype=float)[:, 0])
+        np.testing.assert_array_equal(book.asks.quantities, np.array(state["asks"], dtype=float)[:, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import asyncio
+import unittest
+
+import binance
+import orders
+from exceptions import BadResponseError
+from mock_exchange import MockExchange
+
+
+class TestOrderManager(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.exchange = MockExchange(prices={"ETHUSDT": 2000.0})
+        await self.exchange.start()
+
+        self.client = binance.Binance(api_key="test-key", api_secret="test-secret")
+        self.client.API_URL = self.exchange.url
+        await self.client.__aenter__()
+
+        self.manager = orders.OrderManager(self.client, max_in_flight=5)
+        self.manager.RETRY_DELAY = 0
+
+    async def asyncTearDown(self):
+        await self.client.__aexit__(None, None, None)
+        await self.exchange.stop()
+
+    async def test_places_signed_orders_concurrently(self):
+        """
+        it places signed orders concurrently and records signal to ack latency
+        """
+        placed = await asyncio.gather(*(self.manager.place("ethusdt", "BUY", 0.01) for _ in range(20)))
+
+        self.assertTrue(all(order.status == "FILLED" for order in placed))
+        self.assertEqual(len(self.exchange.orders), 20)
+        self.assertEqual(self.manager.latency.count, 20)
+        self.assertTrue(all(order.latency > 0 for order in placed))
+
+    async def test_client_order_id_is_idempotent(self):
+        """
+        it sends order once per client order id and recovers order with lost response
+        """
+        first, second = await asyncio.gather(
+            self.manager.place("ETHUSDT", "BUY", 1, client_order_id="same"),
+            self.manager.place("ETHUSDT", "BUY", 1, client_order_id="same"),
+        )
+        self.assertIs(first, second)
+
+        self.exchange.fail_next = 1
+        order = await self.manager.place("ETHUSDT", "SELL", 1, client_order_id="lost")
+
+        self.assertEqual(order.status, "FILLED")
+        self.assertEqual(order.attempts, 2)
+        self.assertEqual(len(self.exchange.orders), 2)
+
+    async def test_rejects_and_cancels(self):
+        """
+        it marks rejected orders and cancels open limit orders
+        """
+        rejected = await self.manager.place("ETHUSDT", "BUY", 1, order_type="LIMIT", price=1500.0)
+        self.assertEqual(rejected.status, orders.REJECTED)
+
+        order = await self.manager.place("ETHUSDT", "BUY", 1, order_type="LIMIT", price=1500.0, time_in_force="GTC")
+        self.assertEqual(order.status, "NEW")
+        await self.manager.cancel(order)
+        self.assertEqual(order.status, "CANCELED")
+
+        with self.assertRaises(BadResponseError):
+            await self.manager.cancel(order)
+
+    async def test_rejects_bad_signature(self):
+        """
+        it is refused by exchange when signed with wrong secret
+        """
+        self.client.api_secret = "wrong"
+        order = await self.manager.place("ETHUSDT", "BUY", 1)
+
+        self.assertEqual(order.status, orders.REJECTED)
+        self.assertEqual(orders._error_body(order.error).get("code"), -1022)
+
+    async def test_rejects_non_duplicate_new_order_error(self):
+        """
+        it rejects order refused with -2010 for other reason than duplicate without looking it up
+        """
+        self.exchange.reject_next = 1
+        order = await self.manager.place("ETHUSDT", "BUY", 1000)
+
+        self.assertEqual(order.status, orders.REJECTED)
+        self.assertEqual(orders._error_body(order.error).get("code"), -2010)
+        self.assertEqual(order.attempts, 1)
+        self.assertEqual(self.exchange.requests, 1)
+
+    async def test_rejects_duplicate_which_cannot_be_found(self):
+        """
+        it rejects order refused as duplicate when looking it up fails
+        """
+        await self.manager.place("ETHUSDT", "BUY", 1, client_order_id="taken")
+
+        async def get_order(pair, client_order_id):
+            raise BadResponseError({"status": 400, "text": '{"code":-2013,"msg":"Order does not exist."}'})
+        self.client.get_order = get_order
+
+        # another manager (e.g. after restart) places the same id again
+        order = await orders.OrderManager(self.client).place("ETHUSDT", "BUY", 1, client_order_id="taken")
+
+        self.assertEqual(order.status, orders.REJECTED)
+        self.assertEqual(orders._error_body(order.error).get("code"), -2013)
+
+
+if __name__ == "__main__":
+    unittest.main()
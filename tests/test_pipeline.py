@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+
+import pipeline
+
+
+class TestStageQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_drop_oldest_evicts_droppable(self):
+        """
+        it evicts oldest droppable item when full
+        """
+        queue = pipeline.StageQueue(2, pipeline.DROP_OLDEST, droppable=lambda item: item != "keep")
+        await queue.put((0, "keep"))
+        await queue.put((0, "a"))
+        await queue.put((0, "b"))
+
+        self.assertEqual(queue.dropped, 1)
+        self.assertEqual([queue.get_nowait()[1] for _ in range(2)], ["keep", "b"])
+
+    async def test_drop_oldest_blocks_without_droppable(self):
+        """
+        it waits for free slot when nothing can be dropped
+        """
+        queue = pipeline.StageQueue(1, pipeline.DROP_OLDEST, droppable=lambda item: False)
+        await queue.put((0, "keep"))
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(queue.put((0, "next")), 0.01)
+        self.assertEqual(queue.dropped, 0)
+
+
+class TestPipeline(unittest.IsolatedAsyncioTestCase):
+    async def test_items_pass_through_stages(self):
+        """
+        it passes handler results to next stage and stops on None
+        """
+        results = []
+
+        async def collect(item):
+            results.append(item)
+
+        p = pipeline.Pipeline([
+            pipeline.Stage("double", lambda x: x * 2, workers=2),
+            pipeline.Stage("filter", lambda x: x if x > 2 else None),
+            pipeline.Stage("collect", collect),
+        ])
+        p.start()
+        for i in range(4):
+            await p.put(i)
+        await p.stop()
+
+        self.assertEqual(sorted(results), [4, 6])
+        metrics = p.metrics()
+        self.assertEqual(metrics["double"]["processed"], 4)
+        self.assertEqual(metrics["collect"]["processed"], 2)
+        self.assertEqual(metrics["collect"]["depth"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
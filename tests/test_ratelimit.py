@@ -0,0 +1,72 @@
+import unittest
+
+from time import monotonic
+from types import SimpleNamespace
+
+import binance
+from ratelimit import WeightLimiter
+
+
+class TestWeightLimiter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # refills 10 weight per second
+        self.limiter = WeightLimiter(600)
+
+    async def test_refills_tokens_over_time(self):
+        """
+        it refills bucket at weight per minute rate up to capacity and waits for missing weight
+        """
+        self.limiter.tokens = 0.0
+        self.limiter._updated_at = monotonic() - 0.5
+        self.limiter._refill()
+        self.assertAlmostEqual(self.limiter.tokens, 5, delta=0.5)
+
+        self.limiter._updated_at = monotonic() - 3600
+        self.limiter._refill()
+        self.assertEqual(self.limiter.tokens, 600)
+
+        await self.limiter.acquire(600)
+        started = monotonic()
+        await self.limiter.acquire(2)
+        self.assertGreaterEqual(monotonic() - started, 0.15)
+
+    def test_syncs_with_used_weight_header(self):
+        """
+        it shrinks bucket to weight exchange reports as unused and ignores responses without header
+        """
+        self.limiter.update({"X-MBX-USED-WEIGHT-1M": "550"})
+        self.assertEqual(self.limiter.used, 550)
+        self.assertLessEqual(self.limiter.tokens, 50)
+
+        # reported weight never adds tokens
+        self.limiter.tokens = 10.0
+        self.limiter.update({"X-MBX-USED-WEIGHT-1M": "0"})
+        self.assertLess(self.limiter.tokens, 11)
+
+        self.limiter.update({})
+        self.assertEqual(self.limiter.used, 0)
+
+    async def test_pauses_on_rate_limit_responses(self):
+        """
+        it pauses all requests for Retry-After seconds on 429 and 418 responses
+        """
+        client = binance.Binance()
+        client.rate_limiter = self.limiter
+
+        client._update_rate_limiter(SimpleNamespace(status=200, headers={"X-MBX-USED-WEIGHT-1M": "5"}))
+        self.assertLessEqual(self.limiter._paused_until, monotonic())
+
+        for status, retry_after in ((429, "1"), (418, "2")):
+            client._update_rate_limiter(SimpleNamespace(status=status, headers={"Retry-After": retry_after}))
+            self.assertEqual(self.limiter.tokens, 0)
+            self.assertGreater(self.limiter._paused_until, monotonic() + int(retry_after) - 0.5)
+
+        self.limiter._paused_until = 0.0
+        self.limiter.pause(0.1)
+        started = monotonic()
+        await self.limiter.acquire(1)
+        self.assertGreaterEqual(monotonic() - started, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
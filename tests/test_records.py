@@ -0,0 +1,58 @@
+import unittest
+
+from records import Kline
+
+# payload of kline event as sent by exchange
+WSS_KLINE = {
+    "t": 1672515780000, "T": 1672515839999, "s": "BNBBTC", "i": "1m", "f": 100, "L": 200,
+    "o": "0.0010", "c": "0.0020", "h": "0.0025", "l": "0.0015", "v": "1000", "n": 100, "x": False,
+    "q": "1.0000", "V": "500", "Q": "0.500", "B": "123456",
+}
+
+# row of klines REST response
+API_KLINE = [
+    1499040000000, "0.01634790", "0.80000000", "0.01575800", "0.01577100", "148976.11427815",
+    1499644799999, "2434.19055334", 308, "1756.87402397", "28.46694368", "17928899.62484339",
+]
+
+
+class TestKline(unittest.TestCase):
+    def test_from_wss(self):
+        """
+        it maps kline event fields in order with numeric types and closed flag
+        """
+        kline = Kline.from_wss(WSS_KLINE)
+
+        self.assertEqual(kline, (
+            1672515780000, 0.0010, 0.0025, 0.0015, 0.0020, 1000.0, 1672515839999, 1.0, 100, "BNBBTC", "1m", False
+        ))
+        self.assertEqual([type(value) for value in kline], [int, float, float, float, float, float, int, float, int, str, str, bool])
+        self.assertTrue(Kline.from_wss({**WSS_KLINE, "x": True}).closed)
+
+    def test_from_api(self):
+        """
+        it maps klines response row in order with numeric types, pair and interval come from request
+        """
+        kline = Kline.from_api(API_KLINE, "BNBBTC", "1w")
+
+        self.assertEqual(kline, (
+            1499040000000, 0.0163479, 0.8, 0.015758, 0.015771, 148976.11427815, 1499644799999,
+            2434.19055334, 308, "BNBBTC", "1w", True
+        ))
+        self.assertEqual([type(value) for value in kline], [int, float, float, float, float, float, int, float, int, str, str, bool])
+        self.assertFalse(Kline.from_api(API_KLINE, "BNBBTC", "1w", closed=False).closed)
+
+    def test_to_candlestick(self):
+        """
+        it converts kline to candlestick with the same values
+        """
+        candlestick = Kline.from_api(API_KLINE, "BNBBTC", "1w").to_candlestick()
+
+        self.assertEqual(round(candlestick.open_time.timestamp() * 1000), 1499040000000)
+        self.assertEqual(round(candlestick.close_time.timestamp() * 1000), 1499644799999)
+        self.assertEqual((candlestick.open, candlestick.close, candlestick.trades_amount), (0.0163479, 0.015771, 308))
+        self.assertEqual((candlestick.pair, candlestick.interval), ("BNBBTC", "1w"))
+
+
+if __name__ == "__main__":
+    unittest.main()
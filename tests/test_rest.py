@@ -0,0 +1,145 @@
+import asyncio
+import unittest
+
+import binance
+import engine
+import rest
+from mock_exchange import MockExchange
+
+MINUTE = 60 * 1000
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_expires_and_evicts_least_recently_used(self):
+        """
+        it drops expired entries and evicts least recently used one when full
+        """
+        clock = FakeClock()
+        cache = rest.ResponseCache(max_entries=2, clock=clock)
+        cache.put("a", 1, ttl=10)
+        cache.put("b", 2, ttl=1)
+
+        self.assertEqual(cache.get("a"), 1)
+        clock.now = 5
+        cache.put("c", 3, ttl=10)
+        self.assertIsNone(cache.get("b"))
+
+        clock.now = 10
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(rest.request_key("klines", {"b": 1, "a": 2}), rest.request_key("klines", {"a": 2, "b": 1}))
+
+    def test_bounds_cached_rows(self):
+        """
+        it evicts least recently used entries once rows of all entries exceed max_rows
+        """
+        cache = rest.ResponseCache(max_entries=10, max_rows=1000, clock=FakeClock())
+        cache.put("page 1", [0] * 600, ttl=10, rows=600)
+        cache.put("page 2", [0] * 600, ttl=10, rows=600)
+        cache.put("too large", [0] * 1001, ttl=10, rows=1001)
+
+        self.assertIsNone(cache.get("page 1"))
+        self.assertIsNone(cache.get("too large"))
+        self.assertIsNotNone(cache.get("page 2"))
+        self.assertEqual(cache.rows, 600)
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def test_coalesces_and_survives_cancelled_caller(self):
+        """
+        it runs concurrent calls with the same key once, even when the first caller is cancelled
+        """
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        flights = rest.SingleFlight()
+        first = asyncio.ensure_future(flights.do("key", fetch))
+        others = [asyncio.ensure_future(flights.do("key", fetch)) for _ in range(5)]
+        await asyncio.sleep(0)
+        first.cancel()
+
+        self.assertEqual(await asyncio.gather(*others), ["result"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(flights), 0)
+
+
+class TestConnectorRequests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.exchange = MockExchange(prices={"BTCUSDT": 30000.0}, latency=0.02)
+        await self.exchange.start()
+
+        self.client = binance.Binance()
+        self.client.API_URL = self.exchange.url
+        await self.client.__aenter__()
+
+    async def asyncTearDown(self):
+        await self.client.__aexit__(None, None, None)
+        await self.exchange.stop()
+
+    async def test_coalesces_and_caches_identical_requests(self):
+        """
+        it sends concurrent identical requests once and answers later ones from cache
+        """
+        coalesced = engine.REST_COALESCED.labels("exchangeInfo").value
+        weight = engine.REST_WEIGHT.labels("exchangeInfo").value
+
+        infos = await asyncio.gather(*(self.client.get_exchange_info(["btcusdt"]) for _ in range(10)))
+        self.assertEqual(self.exchange.requests, 1)
+        self.assertEqual(infos[0]["symbols"], [{"symbol": "BTCUSDT", "status": "TRADING"}])
+        self.assertEqual(engine.REST_COALESCED.labels("exchangeInfo").value - coalesced, 9)
+        self.assertEqual(engine.REST_WEIGHT.labels("exchangeInfo").value - weight, 20)
+
+        await self.client.get_exchange_info(["btcusdt"])
+        self.assertEqual(self.exchange.requests, 1)
+
+        # different parameters are a different request
+        await self.client.get_exchange_info()
+        self.assertEqual(self.exchange.requests, 2)
+
+    def test_caches_only_closed_kline_pages(self):
+        """
+        it treats kline page as cacheable only when its last candle is closed
+        """
+        now = 1700000000000
+        self.assertTrue(binance.Binance._is_closed_page("1m", 10, None, now - 2 * MINUTE, now))
+        self.assertFalse(binance.Binance._is_closed_page("1m", 10, None, now - 30 * 1000, now))
+        self.assertTrue(binance.Binance._is_closed_page("1m", 10, now - 10 * MINUTE, None, now))
+        self.assertFalse(binance.Binance._is_closed_page("1m", 10, now - 5 * MINUTE, None, now))
+        self.assertFalse(binance.Binance._is_closed_page("1m", 10, None, None, now))
+        self.assertFalse(binance.Binance._is_closed_page("1M", 10, now - 400 * 24 * 60 * MINUTE, None, now))
+
+    async def test_fetches_monthly_klines(self):
+        """
+        it fetches klines of variable length interval without caching them
+        """
+        month = 30 * 24 * 60 * MINUTE
+        self.exchange.klines[("BTCUSDT", "1M")] = [
+            [1672531200000 + i * month, "1.0", "2.0", "1.0", "2.0", "10.0", 1672531200000 + (i + 1) * month - 1,
+             "15.0", 5, "5.0", "7.5", "0"]
+            for i in range(3)
+        ]
+
+        klines = await self.client.fetch_klines("btcusdt", 3, "1M", start_time=1672531200000)
+        candlesticks = await self.client.fetch_candlesticks("btcusdt", 3, "1M", start_time=1672531200000)
+
+        self.assertEqual(len(klines), 3)
+        self.assertTrue(all(kline.closed for kline in klines))
+        self.assertEqual(len(candlesticks), 3)
+        self.assertEqual(len(self.client.cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
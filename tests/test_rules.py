@@ -0,0 +1,85 @@
+import random
+import unittest
+
+import rules
+
+
+class NaiveRules:
+    """Linear scan reference of rule semantics"""
+
+    def __init__(self):
+        self.rules = []
+
+    def on_price(self, price):
+        fired = []
+        for rule in self.rules:
+            if rule["kind"] == rules.TRAILING_STOP:
+                rule["peak"] = max(rule["peak"], price)
+                hit = price <= rule["peak"] * (1 - rule["trail"])
+            elif rule["kind"] == rules.STOP_LOSS:
+                hit = price <= rule["level"]
+            else:
+                hit = price >= rule["level"]
+            if hit:
+                fired.append(rule["id"])
+        self.rules = [rule for rule in self.rules if rule["id"] not in fired]
+        return sorted(fired)
+
+
+class TestRuleEngine(unittest.TestCase):
+    def test_matches_linear_scan(self):
+        """
+        it fires the same rules as linear scan on random walk with rules added and canceled
+        """
+        rng = random.Random(3)
+        engine = rules.RuleEngine()
+        naive = NaiveRules()
+        added = []
+        price = 100.0
+
+        for tick in range(3000):
+            price *= 1 + rng.gauss(0, 0.003)
+
+            if tick % 3 == 0:
+                kind = rng.choice([rules.STOP_LOSS, rules.TAKE_PROFIT, rules.TRAILING_STOP])
+                if kind == rules.STOP_LOSS:
+                    rule = engine.add_stop_loss("ETHUSDT", price * (1 - rng.uniform(0.001, 0.05)))
+                    naive.rules.append({"id": rule.id, "kind": kind, "level": rule.level})
+                elif kind == rules.TAKE_PROFIT:
+                    rule = engine.add_take_profit("ETHUSDT", price * (1 + rng.uniform(0.001, 0.05)))
+                    naive.rules.append({"id": rule.id, "kind": kind, "level": rule.level})
+                else:
+                    rule = engine.add_trailing_stop("ETHUSDT", rng.uniform(0.001, 0.05), price)
+                    naive.rules.append({"id": rule.id, "kind": kind, "trail": rule.trail, "peak": price})
+                added.append(rule)
+
+            if tick % 17 == 0 and added:
+                rule = added.pop(rng.randrange(len(added)))
+                engine.cancel(rule)
+                naive.rules = [r for r in naive.rules if r["id"] != rule.id]
+
+            fired = sorted(rule.id for rule in engine.on_price("ETHUSDT", price))
+            self.assertEqual(fired, naive.on_price(price), f"tick {tick}")
+
+        self.assertEqual(len(engine), len(naive.rules))
+
+    def test_trailing_stop_ratchets(self):
+        """
+        it raises trailing stop with new highs and fires on pullback
+        """
+        fired = []
+        engine = rules.RuleEngine(on_trigger=lambda rule, price: fired.append((rule.id, price)))
+        rule = engine.add_trailing_stop("ETHUSDT", 0.1, 100.0)
+
+        for price in (105.0, 120.0, 110.0):
+            engine.on_price("ETHUSDT", price)
+        self.assertAlmostEqual(engine.stop_level(rule), 108.0)
+        self.assertEqual(fired, [])
+
+        engine.on_price("ETHUSDT", 107.0)
+        self.assertEqual(fired, [(rule.id, 107.0)])
+        self.assertAlmostEqual(rule.level, 108.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
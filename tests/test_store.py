@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+
+import store
+
+
+class TestCandleBuffer(unittest.TestCase):
+    def _fill(self, buffer, count, start=0):
+        for i in range(start, start + count):
+            buffer.update(i * 60000, i, i, i, i, i, True)
+
+    def test_returns_contiguous_window_after_wraparound(self):
+        """
+        it returns newest candles in order as contiguous zero-copy view
+        """
+        buffer = store.CandleBuffer(capacity=5)
+        self._fill(buffer, 12)
+
+        close = buffer.column("close")
+        np.testing.assert_array_equal(close, [7, 8, 9, 10, 11])
+        np.testing.assert_array_equal(buffer.column("close", n=2), [10, 11])
+        self.assertTrue(close.flags.c_contiguous)
+        self.assertTrue(np.shares_memory(close, buffer._data))
+        self.assertFalse(close.flags.writeable)
+
+    def test_overwrites_in_progress_candle(self):
+        """
+        it overwrites newest slot while candle is in progress
+        """
+        buffer = store.CandleBuffer(capacity=5)
+        self._fill(buffer, 3)
+        buffer.update(3 * 60000, 3, 3, 3, 3.5, 3, False)
+        buffer.update(3 * 60000, 3, 4, 3, 3.8, 3, False)
+
+        self.assertEqual(len(buffer), 4)
+        np.testing.assert_array_equal(buffer.column("close"), [0, 1, 2, 3.8])
+        np.testing.assert_array_equal(buffer.column("close", closed_only=True), [0, 1, 2])
+
+        buffer.update(3 * 60000, 3, 4, 3, 3.9, 3, True)
+        np.testing.assert_array_equal(buffer.column("close", closed_only=True), [0, 1, 2, 3.9])
+
+    def test_ignores_older_candles(self):
+        """
+        it ignores candles older than newest one
+        """
+        buffer = store.CandleBuffer(capacity=5)
+        self._fill(buffer, 3)
+
+        self.assertFalse(buffer.update(0, 9, 9, 9, 9, 9, True))
+        np.testing.assert_array_equal(buffer["close"], [0, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+from time import monotonic
+
+import supervisor
+
+
+def crashing_worker(worker, pairs, intervals, connection, report_interval):
+    connection.send((supervisor.HEALTH, {"worker": worker, "pairs": pairs, "throughput": 1.0, "reconnects": 0}))
+    raise SystemExit(1)
+
+
+class TestAssign(unittest.TestCase):
+    def test_balances_pairs(self):
+        """
+        it spreads pairs so that shard sizes differ by at most one
+        """
+        shards = supervisor.assign([f"pair{i}" for i in range(10)], 3)
+
+        self.assertEqual(sorted(len(shard) for shard in shards.values()), [3, 3, 4])
+        self.assertEqual(set().union(*shards.values()), {f"pair{i}" for i in range(10)})
+
+    def test_keeps_current_assignment(self):
+        """
+        it moves only pairs needed to rebalance after pairs are added or removed
+        """
+        current = supervisor.assign(["a", "b", "c", "d"], 2)
+        shards = supervisor.assign(["a", "b", "c", "d", "e", "f"], 2, current)
+
+        for worker, pairs in current.items():
+            self.assertTrue(pairs <= shards[worker])
+
+        remaining = shards[1]
+        shards = supervisor.assign(remaining, 2, shards)
+        self.assertEqual(sorted(len(shard) for shard in shards.values()), [1, 2])
+        self.assertEqual(set().union(*shards.values()), remaining)
+
+
+class TestSupervisor(unittest.TestCase):
+    def test_restarts_crashed_worker(self):
+        """
+        it collects worker reports and restarts workers which exit
+        """
+        sup = supervisor.Supervisor(["a", "b"], ["1m"], workers=2, target=crashing_worker)
+        sup.RESTART_BACKOFF_BASE = 0.05
+        delays = {worker: [] for worker in range(2)}
+        sup.start()
+        try:
+            deadline = monotonic() + 30
+            while min(sup.restarts.values()) < 3 and monotonic() < deadline:
+                scheduled = dict(sup.restart_at)
+                sup.poll(0.05)
+                for worker, restart_at in sup.restart_at.items():
+                    if scheduled.get(worker, None) != restart_at:
+                        delays[worker].append(restart_at - monotonic())
+        finally:
+            sup.stop()
+
+        # every crash is followed by restart, health reports of crashing worker don't reset backoff
+        self.assertTrue(all(restarts >= 3 for restarts in sup.restarts.values()))
+        self.assertTrue(all(sup.failures[worker] >= sup.restarts[worker] for worker in range(2)))
+        for worker_delays in delays.values():
+            self.assertGreater(worker_delays[2], worker_delays[0])
+
+    def test_resets_backoff_after_worker_stays_up(self):
+        """
+        it forgets failures of worker which stayed up for stale_after seconds
+        """
+        sup = supervisor.Supervisor(["a"], ["1m"], workers=1, stale_after=60.0)
+
+        class Running:
+            name = "worker-0"
+            is_alive = staticmethod(lambda: True)
+
+        sup.processes[0] = Running()
+        sup.failures[0] = 3
+        sup.last_seen[0] = sup.started_at[0] = monotonic()
+        sup._check_workers()
+        self.assertEqual(sup.failures[0], 3)
+
+        sup.started_at[0] -= 61
+        sup._check_workers()
+        self.assertEqual(sup.failures[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
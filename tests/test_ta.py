@@ -0,0 +1,144 @@
+import unittest
+
+import numpy as np
+import talib
+
+import ta
+
+
+class TestStreamingMA(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.closes = 100 + np.cumsum(rng.normal(0, 1, 500))
+
+    def _stream(self, ma):
+        return np.array([ma.commit(close) for close in self.closes])
+
+    def test_sma_matches_talib(self):
+        """
+        it matches TA-Lib SMA output including NaN warm-up
+        """
+        np.testing.assert_allclose(self._stream(ta.StreamingSMA(20)), talib.SMA(self.closes, 20))
+
+    def test_ema_matches_talib(self):
+        """
+        it matches TA-Lib EMA output including NaN warm-up
+        """
+        np.testing.assert_allclose(self._stream(ta.StreamingEMA(20)), talib.EMA(self.closes, 20))
+
+    def test_update_does_not_change_state(self):
+        """
+        it returns provisional value without committing it
+        """
+        ma = ta.StreamingEMA(3)
+        for close in (1.0, 2.0, 3.0):
+            ma.commit(close)
+
+        provisional = ma.update(10.0)
+        self.assertEqual(ma.value, 2.0)
+        self.assertEqual(ma.commit(10.0), provisional)
+
+    def test_subclass_must_implement_commit(self):
+        """
+        it refuses subclass not overriding abstract methods
+        """
+        with self.assertRaises(NotImplementedError):
+            class UpdateOnly(ta.StreamingMA):
+                def update(self, close):
+                    return close
+
+
+class TestCrossoverDetector(unittest.TestCase):
+    def test_signals_match_batch_crossovers(self):
+        """
+        it emits signals exactly where batch moving averages cross
+        """
+        rng = np.random.default_rng(3)
+        closes = 100 + np.cumsum(rng.normal(0, 1, 1000))
+
+        detector = ta.CrossoverDetector.sma(5, 20)
+        streamed = [i for i, close in enumerate(closes) if detector.update(close, closed=True)]
+
+        relation = np.sign(talib.SMA(closes, 5) - talib.SMA(closes, 20))
+        valid = ~np.isnan(relation)
+        expected = [i for i in range(1, len(closes)) if valid[i - 1] and relation[i] != relation[i - 1]]
+        self.assertEqual(streamed, expected)
+
+    def test_provisional_signal_emitted_once_per_candle(self):
+        """
+        it emits provisional signal once and confirms it on close
+        """
+        detector = ta.CrossoverDetector.sma(1, 2)
+        detector.warm_up([3.0, 2.0])        # short below long
+
+        first = detector.update(5.0)
+        second = detector.update(6.0)
+        final = detector.update(6.0, closed=True)
+
+        self.assertEqual(first.signal, 1)
+        self.assertTrue(first.provisional)
+        self.assertIsNone(second)
+        self.assertEqual(final.signal, 1)
+        self.assertFalse(final.provisional)
+
+    def test_oscillating_price_emits_provisional_signal_once(self):
+        """
+        it doesn't repeat provisional signal when price crosses back and forth within one candle
+        """
+        detector = ta.CrossoverDetector.sma(1, 2)
+        detector.warm_up([3.0, 2.0])        # short below long
+
+        signals = [detector.update(close) for close in (5.0, 1.0, 5.0, 1.0, 5.0)]
+        final = detector.update(5.0, closed=True)
+
+        self.assertEqual([s.signal for s in signals if s is not None], [1])
+        self.assertFalse(final.provisional)
+
+        # next candle may emit again
+        self.assertEqual(detector.update(1.0).signal, -1)
+
+
+class TestBatchGoldenCross(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        self.closes = 100 + np.cumsum(rng.normal(0, 1, (4, 300)), axis=1)
+        self.closes[1, :50] = np.nan        # symbol with shorter history
+
+    def test_moving_averages_match_talib(self):
+        """
+        it matches TA-Lib moving averages row by row, skipping leading NaNs
+        """
+        for ma, ta_func in (("sma", talib.SMA), ("ema", talib.EMA)):
+            result = ta.moving_average_matrix(self.closes, 10, ma)
+            for row, expected in zip(result, self.closes):
+                np.testing.assert_allclose(row, ta_func(expected, 10))
+
+    def test_matches_per_symbol_golden_cross(self):
+        """
+        it returns same signals and crossovers as GoldenCross for each symbol and window pair
+        """
+        windows = [(5, 20), (10, 30)]
+        signals, crosses = ta.batch_golden_cross(self.closes, windows)
+        self.assertEqual(signals.shape, (2, 4, 300))
+
+        for i, (short_window, long_window) in enumerate(windows):
+            for j, row in enumerate(self.closes):
+                gc = ta.GoldenCross({"close": row}, short_window, long_window)
+                expected = gc.golden_cross(*gc._calculate_sma())
+                np.testing.assert_array_equal(signals[i, j], [signal for signal, _ in expected])
+                np.testing.assert_array_equal(crosses[i, j], [cross for _, cross in expected])
+
+    def test_ties_keep_previous_signal(self):
+        """
+        it keeps previous signal when moving averages touch
+        """
+        signals, crosses = ta.crossover_signals(
+            np.array([[np.nan, 2.0, 1.0, 1.0, 0.5, 1.0]]),
+            np.array([[np.nan, 1.0, 1.0, 1.0, 1.0, 1.0]]),
+        )
+        np.testing.assert_array_equal(signals[0], [np.nan, 1, 1, 1, -1, -1])
+        np.testing.assert_array_equal(crosses[0], [False, False, False, False, True, False])
+
+
+if __name__ == "__main__":
+    unittest.main()
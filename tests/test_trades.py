@@ -0,0 +1,169 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+import binance
+import database
+import trades
+
+START = 1700000000000
+
+
+def trade_events(count, seed=1, step=7):
+    rng = random.Random(seed)
+    price = 30000.0
+    events = []
+    for i in range(count):
+        price *= 1 + rng.gauss(0, 0.0001)
+        first = i * 3
+        events.append({
+            "e": "aggTrade", "E": START + i * step, "s": "BTCUSDT", "a": i, "p": f"{price:.2f}",
+            "q": f"{rng.uniform(0.01, 2):.5f}", "f": first, "l": first + rng.randint(0, 2),
+            "T": START + i * step, "m": rng.random() < 0.5, "M": True,
+        })
+    return events
+
+
+class TestBarBuilders(unittest.TestCase):
+    def test_time_bars_match_trades_regardless_of_batching(self):
+        """
+        it builds aligned candles equal to ones built trade by trade and closes last one by clock
+        """
+        decoded = trades.decode(trade_events(2000))
+        builder = trades.TimeBars("1s")
+
+        bars = []
+        for start in range(0, len(decoded), 137):
+            bars.extend(builder.update("BTCUSDT", decoded[start:start + 137]))
+
+        seconds = decoded["time"] // 1000
+        self.assertEqual(len(bars), len(np.unique(seconds)) - 1)
+        for bar in bars[:5] + bars[-5:]:
+            members = decoded[seconds == bar.open_time // 1000]
+            self.assertEqual(bar.close_time, bar.open_time + 999)
+            self.assertEqual(bar.open, members["price"][0])
+            self.assertEqual(bar.close, members["price"][-1])
+            self.assertEqual(bar.high, members["price"].max())
+            self.assertEqual(bar.low, members["price"].min())
+            self.assertAlmostEqual(bar.volume, members["quantity"].sum())
+            self.assertEqual(bar.trades_amount, members["trades"].sum())
+
+        last_time = int(decoded["time"][-1])
+        self.assertEqual(builder.flush("BTCUSDT", last_time), [])
+        closed = builder.flush("BTCUSDT", last_time + 2000)
+        self.assertEqual(closed[0].open_time, last_time - last_time % 1000)
+        self.assertIsNone(builder.partial)
+
+    def test_threshold_bars_carry_excess_over(self):
+        """
+        it closes bars on crossing trade, keeps open times increasing and sizes averaging threshold
+        """
+        decoded = trades.decode(trade_events(3000, step=0))
+        volume_bars = trades.VolumeBars(50)
+        tick_bars = trades.TickBars(100)
+
+        volumes, ticks = [], []
+        for start in range(0, len(decoded), 250):
+            volumes.extend(volume_bars.update("BTCUSDT", decoded[start:start + 250]))
+            ticks.extend(tick_bars.update("BTCUSDT", decoded[start:start + 250]))
+
+        total = decoded["quantity"].sum()
+        self.assertEqual(len(volumes), int(total // 50))
+        self.assertAlmostEqual(sum(bar.volume for bar in volumes) / len(volumes), 50, delta=1)
+        self.assertTrue(all(bar.volume >= 50 - 2 for bar in volumes))
+
+        # all trades share timestamp, open times are still unique
+        open_times = [bar.open_time for bar in volumes]
+        self.assertEqual(open_times, sorted(set(open_times)))
+        self.assertEqual(volumes[0].interval, "50v")
+        self.assertEqual(trades.DollarBars(2e6).name, "2Md")
+        # aggregate trade holds up to 3 trades, excess of previous bar counts towards next one
+        self.assertTrue(all(98 <= bar.trades_amount <= 102 for bar in ticks))
+
+    def test_bars_within_same_second_are_stored_separately(self):
+        """
+        it keeps millisecond open times of threshold bars when they are saved, so none overwrites another
+        """
+        events = trade_events(6, step=100)
+        for event in events:
+            event["q"] = "1.00000"
+        bars = trades.VolumeBars(1).update("BTCUSDT", trades.decode(events))
+        self.assertEqual(len(bars), 6)
+
+        with tempfile.TemporaryDirectory() as directory:
+            database.configure(f"sqlite:///{os.path.join(directory, 'bars.db')}")
+            try:
+                db = database.DbManager()
+                db.bulk_upsert([database.DbManager.to_row(bar.to_candlestick()) for bar in bars])
+                columns = db.load_range("BTCUSDT", bars[0].interval)
+            finally:
+                database.engine.dispose()
+
+        self.assertEqual(columns["open_time"].tolist(), [bar.open_time for bar in bars])
+        self.assertEqual(columns["close_time"].tolist(), [bar.close_time for bar in bars])
+
+    def test_threshold_bars_must_implement_measure(self):
+        """
+        it refuses threshold bars not overriding measure of trades
+        """
+        with self.assertRaises(NotImplementedError):
+            class UnmeasuredBars(trades.ThresholdBars):
+                suffix = "u"
+
+
+class TestTradeIngest(unittest.IsolatedAsyncioTestCase):
+    async def test_queues_closed_bars_to_ta_stage_and_archives_trades(self):
+        """
+        it decodes batched events into bars queued to TA stage and raw trades in archive
+        """
+        events = trade_events(1500)
+        with tempfile.TemporaryDirectory() as root:
+            client = binance.Binance()
+            archive = trades.TradeArchive(root, segment_rows=1000)
+            ingest = trades.TradeIngest(client, archive=archive)
+            ingest.builders["BTCUSDT"] = [trades.TimeBars("1s")]
+
+            # two flushes write two archive segments
+            for start in (0, 1000):
+                for event in events[start:start + 1000]:
+                    self.assertIsNone(ingest.handle(event))
+                await ingest.flush()
+            await ingest.close()
+
+            queued = [item for _, item in client.pipeline.stage("ta").queue._queue]
+            self.assertEqual(ingest.trades, 1500)
+            self.assertEqual(len(queued), ingest.bars)
+            self.assertTrue(all(bar.interval == "1s" and bar.closed for bar in queued))
+
+            archived = archive.read("btcusdt")
+            self.assertEqual(len(archived), 1500)
+            self.assertEqual(archived["id"].tolist(), list(range(1500)))
+            window = archive.read("BTCUSDT", START + 7000, START + 14000)
+            self.assertEqual(window["id"].tolist(), list(range(1000, 1500)))
+            self.assertEqual(len(archive._segments("BTCUSDT")), 2)
+
+    async def test_persists_open_bars_on_close(self):
+        """
+        it persists bars still in progress and bars of last flush on close as pipeline is already stopped
+        """
+        events = trade_events(100)
+        client = binance.Binance()
+        ingest = trades.TradeIngest(client)
+        ingest.builders["BTCUSDT"] = [trades.VolumeBars(10_000)]
+
+        for event in events:
+            ingest.handle(event)
+        await ingest.close()
+
+        self.assertEqual(client.pipeline.stage("ta").queue.qsize(), 0)
+        self.assertEqual(len(client.writer.buffer), ingest.bars)
+        self.assertEqual(ingest.bars, 1)
+        self.assertAlmostEqual(client.writer.buffer[0]["volume"], sum(float(event["q"]) for event in events))
+        self.assertIsNone(ingest.builders["BTCUSDT"][0].partial)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from datetime import datetime
+from datetime import datetime, timezone
 
 import utils
 
@@ -39,6 +39,18 @@ class TestConvertTimestamp(unittest.TestCase):
         self.assertEquals(result_s.year, now.year)
 
 
+class TestMsToDatetime(unittest.TestCase):
+    def test_round_trips_utc_milliseconds(self):
+        """
+        it converts epoch ms to aware UTC datetime and back without losing milliseconds
+        """
+        value = utils.ms_to_datetime(1698539400123)
+
+        self.assertEqual(value, datetime(2023, 10, 29, 0, 30, 0, 123000, tzinfo=timezone.utc))
+        self.assertEqual(utils.datetime_to_ms(value), 1698539400123)
+        self.assertEqual(utils.datetime_to_ms(value.replace(tzinfo=None)), 1698539400123)
+
+
 class ConvertSnakeCase(unittest.TestCase):
     def test_returns_correctly_converted_string(self):
         """
@@ -49,5 +61,23 @@ class ConvertSnakeCase(unittest.TestCase):
         self.assertEqual(utils.from_sc_to_human("snake"), "Snake")
 
 
+class TestIntervalToMs(unittest.TestCase):
+    def test_converts_intervals(self):
+        """
+        it converts kline intervals to milliseconds
+        """
+        self.assertEqual(utils.interval_to_ms("1m"), 60000)
+        self.assertEqual(utils.interval_to_ms("15m"), 900000)
+        self.assertEqual(utils.interval_to_ms("4h"), 14400000)
+        self.assertEqual(utils.interval_to_ms("1w"), 604800000)
+
+    def test_rejects_months(self):
+        """
+        it raises ValueError for intervals with variable length
+        """
+        with self.assertRaises(ValueError):
+            utils.interval_to_ms("1M")
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,419 @@
+import os
+
+from abc import abstractmethod
+from time import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from archive import read_index, write_index
+from base import Base
+from pipeline import Batcher
+from records import Kline
+from utils import setup_logging, interval_to_ms
+
+logger = setup_logging(__name__)
+
+# decoded aggTrade, one row per aggregate trade
+TRADE_DTYPE = np.dtype([
+    ("id", np.int64),           # aggregate trade id
+    ("time", np.int64),         # trade time in ms
+    ("price", np.float64),
+    ("quantity", np.float64),
+    ("trades", np.int64),       # exchange trades aggregated into this one
+    ("buyer_maker", np.bool_),
+])
+
+
+def decode(events: List[dict]) -> np.ndarray:
+    """Decodes batch of aggTrade payloads
+
+    Args:
+        events (List[dict]): aggTrade event payloads of single pair in order
+
+    Returns:
+        np.ndarray: TRADE_DTYPE structured array
+    """
+    trades = np.empty(len(events), dtype=TRADE_DTYPE)
+    trades["id"] = [event["a"] for event in events]
+    trades["time"] = [event["T"] for event in events]
+    # float() is faster than NumPy string to float conversion
+    trades["price"] = [float(event["p"]) for event in events]
+    trades["quantity"] = [float(event["q"]) for event in events]
+    trades["trades"] = [event["l"] - event["f"] + 1 for event in events]
+    trades["buyer_maker"] = [event["m"] for event in events]
+    return trades
+
+
+class BarBuilder(Base):
+    """
+    Builds bars of single pair from batches of trades.
+
+    Subclasses assign nondecreasing bar id to every trade, trades of the
+    same id form one bar. Bars are aggregated with reduceat over the whole
+    batch, bar still in progress at the end of batch is carried over and
+    merged with the first bar of next batch.
+    """
+
+    def __init__(self, name: str):
+        # interval column of candlestick table holds 4 characters
+        assert len(name) <= 4, f"Bar name {name} is longer than 4 characters"
+        self.name = name
+        self.partial = None         # in-progress bar: [id, first time, last time, open, high, low, close, volume, quote volume, trades]
+
+    @abstractmethod
+    def _bar_ids(self, trades: np.ndarray) -> np.ndarray:
+        pass
+
+    def _is_complete(self, bar: list) -> bool:
+        """Whether bar at the end of batch is already complete"""
+        return False
+
+    def _times(self, bar: list):
+        """Returns open and close time of bar"""
+        return bar[1], bar[2]
+
+    def update(self, pair: str, trades: np.ndarray) -> List[Kline]:
+        """Adds batch of trades
+
+        Args:
+            pair (str): pair e.g. "BTCUSDT"
+            trades (np.ndarray): TRADE_DTYPE trades in order
+
+        Returns:
+            List[Kline]: closed bars
+        """
+        if not len(trades):
+            return []
+
+        ids = self._bar_ids(trades)
+        starts = np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1])))
+        ends = np.concatenate((starts[1:], [len(trades)])) - 1
+
+        price, quantity, times = trades["price"], trades["quantity"], trades["time"]
+        columns = zip(
+            ids[starts].tolist(), times[starts].tolist(), times[ends].tolist(),
+            price[starts].tolist(), np.maximum.reduceat(price, starts).tolist(),
+            np.minimum.reduceat(price, starts).tolist(), price[ends].tolist(),
+            np.add.reduceat(quantity, starts).tolist(), np.add.reduceat(price * quantity, starts).tolist(),
+            np.add.reduceat(trades["trades"], starts).tolist(),
+        )
+        bars = [list(bar) for bar in columns]
+
+        if self.partial is not None:
+            if self.partial[0] == bars[0][0]:
+                bars[0] = self._merge(self.partial, bars[0])
+            else:
+                bars.insert(0, self.partial)
+
+        self.partial = None if self._is_complete(bars[-1]) else bars.pop()
+        return [self._to_kline(pair, bar) for bar in bars]
+
+    def flush(self, pair: str, now: float) -> List[Kline]:
+        """Closes in-progress bar when it can't get more trades
+
+        Args:
+            pair (str): pair e.g. "BTCUSDT"
+            now (float): current time in ms
+
+        Returns:
+            List[Kline]: closed bars
+        """
+        return []
+
+    def close(self, pair: str) -> List[Kline]:
+        """Closes in-progress bar regardless of time, e.g. on shutdown
+
+        Args:
+            pair (str): pair e.g. "BTCUSDT"
+
+        Returns:
+            List[Kline]: in-progress bar if there is one
+        """
+        if self.partial is None:
+            return []
+        bar, self.partial = self.partial, None
+        return [self._to_kline(pair, bar)]
+
+    @staticmethod
+    def _merge(bar, other):
+        return [
+            bar[0], bar[1], other[2], bar[3], max(bar[4], other[4]), min(bar[5], other[5]), other[6],
+            bar[7] + other[7], bar[8] + other[8], bar[9] + other[9],
+        ]
+
+    def _to_kline(self, pair, bar):
+        open_time, close_time = self._times(bar)
+        return Kline(open_time, bar[3], bar[4], bar[5], bar[6], bar[7], close_time, bar[8], bar[9], pair, self.name, True)
+
+
+class TimeBars(BarBuilder):
+    """
+    Candles of fixed duration e.g. "1s", aligned like exchange klines.
+
+    Seconds without trades produce no candle.
+    """
+
+    def __init__(self, interval: str = "1s", grace: float = 500):
+        """
+        Args:
+            interval (str, optional): candle interval. Defaults to "1s".
+            grace (float, optional): ms after candle end before it is closed without next trade. Defaults to 500.
+        """
+        super().__init__(interval)
+        self.length = interval_to_ms(interval)
+        self.grace = grace
+
+    def _bar_ids(self, trades):
+        return trades["time"] // self.length
+
+    def _times(self, bar):
+        return bar[0] * self.length, bar[0] * self.length + self.length - 1
+
+    def flush(self, pair, now):
+        if self.partial is None or (self.partial[0] + 1) * self.length + self.grace > now:
+            return []
+        bar, self.partial = self.partial, None
+        return [self._to_kline(pair, bar)]
+
+
+class ThresholdBars(BarBuilder):
+    """
+    Bars closing once cumulative measure of trades reaches threshold.
+
+    Trade which crosses threshold closes the bar, its excess is carried to
+    following bars so bar sizes average out to threshold. Open times are
+    kept strictly increasing at millisecond precision, which is stored, so
+    bars of pair stay unique by (pair, interval, open_time) key.
+    """
+
+    suffix = None
+
+    def __init__(self, threshold: float, name: str = None):
+        super().__init__(name or f"{_compact(threshold)}{self.suffix}")
+        self.threshold = threshold
+        self.total = 0.0            # cumulative measure of all trades
+        self.last_open_time = -1
+
+    @abstractmethod
+    def _measure(self, trades):
+        pass
+
+    def _bar_ids(self, trades):
+        cumulative = self.total + np.cumsum(self._measure(trades))
+        self.total = float(cumulative[-1])
+        # bar of trade is given by measure before it
+        return np.floor((cumulative - self._measure(trades)) / self.threshold).astype(np.int64)
+
+    def _is_complete(self, bar):
+        return self.total >= (bar[0] + 1) * self.threshold
+
+    def _times(self, bar):
+        open_time = max(bar[1], self.last_open_time + 1)
+        self.last_open_time = open_time
+        return open_time, max(bar[2], open_time)
+
+
+class TickBars(ThresholdBars):
+    """Bars of fixed number of exchange trades"""
+    suffix = "t"
+
+    def _measure(self, trades):
+        return trades["trades"]
+
+
+class VolumeBars(ThresholdBars):
+    """Bars of fixed base asset volume"""
+    suffix = "v"
+
+    def _measure(self, trades):
+        return trades["quantity"]
+
+
+class DollarBars(ThresholdBars):
+    """Bars of fixed quote asset volume"""
+    suffix = "d"
+
+    def _measure(self, trades):
+        return trades["price"] * trades["quantity"]
+
+
+def _compact(number):
+    for divisor, unit in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if number >= divisor:
+            return f"{number / divisor:g}{unit}"
+    return f"{number:g}"
+
+
+class TradeArchive:
+    """
+    Append-only archive of raw trades, .npy segments of TRADE_DTYPE rows per pair.
+
+    Segments are named by first and last trade id and listed in json index
+    like in archive.ArchiveSeries, reads memory-map them.
+    """
+
+    def __init__(self, root="trades", segment_rows=100_000):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.buffers: Dict[str, List[np.ndarray]] = {}
+        self.buffered: Dict[str, int] = {}
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    def append(self, pair: str, trades: np.ndarray) -> None:
+        self.buffers.setdefault(pair, []).append(trades)
+        self.buffered[pair] = self.buffered.get(pair, 0) + len(trades)
+        if self.buffered[pair] >= self.segment_rows:
+            self._flush_pair(pair)
+
+    def flush(self) -> None:
+        for pair in list(self.buffers):
+            self._flush_pair(pair)
+
+    def _flush_pair(self, pair):
+        chunks = self.buffers.pop(pair, [])
+        self.buffered.pop(pair, None)
+        if not chunks:
+            return
+
+        data = np.concatenate(chunks)
+        path = os.path.join(self.root, pair)
+        os.makedirs(path, exist_ok=True)
+
+        name = f"{data['id'][0]}_{data['id'][-1]}.npy"
+        np.save(os.path.join(path, name), data)
+
+        segments = self._segments(pair)
+        segments.append({"file": name, "start": int(data["time"][0]), "end": int(data["time"][-1]), "rows": len(data)})
+        write_index(path, segments)
+
+    def _segments(self, pair):
+        return read_index(os.path.join(self.root, pair))
+
+    def read(self, pair: str, start: int = None, end: int = None) -> np.ndarray:
+        """Reads archived trades with trade time in [start, end)
+
+        Returns:
+            np.ndarray: TRADE_DTYPE trades
+        """
+        chunks = []
+        for segment in self._segments(pair.upper()):
+            if (start is not None and segment["end"] < start) or (end is not None and segment["start"] >= end):
+                continue
+            data = np.load(os.path.join(self.root, pair.upper(), segment["file"]), mmap_mode="r")
+            mask = np.ones(len(data), dtype=bool)
+            if start is not None:
+                mask &= data["time"] >= start
+            if end is not None:
+                mask &= data["time"] < end
+            chunks.append(data[mask])
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=TRADE_DTYPE)
+
+
+class TradeIngest(Batcher):
+    """
+    aggTrade stream ingestion building bars of pairs.
+
+    Frames are only appended to per pair batch in the parse stage, batches
+    are decoded into structured arrays every flush_interval seconds or
+    once batch_size trades are waiting, then bars are built and closed
+    bars are queued to TA stage like klines (and persisted from there).
+    Decoded trades are optionally appended to raw trade archive.
+    """
+
+    def __init__(self, client, batch_size=1000, flush_interval=0.1, archive=None):
+        """
+        Args:
+            client (binance.Binance): connector with "ta" pipeline stage
+            batch_size (int, optional): waiting trades triggering flush. Defaults to 1000.
+            flush_interval (float, optional): seconds between flushes. Defaults to 0.1.
+            archive (TradeArchive, optional): raw trade archive. Defaults to None.
+        """
+        super().__init__(flush_interval)
+        self.client = client
+        self.batch_size = batch_size
+        self.archive = archive
+
+        self.builders: Dict[str, List[BarBuilder]] = {}     # pair -> bar builders
+        self.trades = 0
+        self.bars = 0
+
+        self._batches: Dict[str, List[dict]] = {}
+        self._waiting = 0
+
+        self.logger = setup_logging(self, class_name=True, prefix_path=__name__)
+
+    @staticmethod
+    def stream(pair):
+        return f"{pair.lower()}@aggTrade"
+
+    async def subscribe(self, pairs: List[str], builders: Callable[[], List[BarBuilder]]) -> None:
+        """Subscribes to aggTrade streams of pairs
+
+        Args:
+            pairs (List[str]): pairs e.g. ["btcusdt"]
+            builders (Callable): returns new bar builders for a pair e.g. lambda: [TimeBars("1s"), VolumeBars(10)]
+        """
+        for pair in pairs:
+            self.builders.setdefault(pair.upper(), builders())
+        if self._task is None:
+            self.start()
+        await self.client.subscribe([self.stream(pair) for pair in pairs], self.handle)
+
+    async def unsubscribe(self, pairs: List[str]) -> None:
+        await self.client.unsubscribe([self.stream(pair) for pair in pairs])
+        await self.flush()
+        for pair in pairs:
+            self.builders.pop(pair.upper(), None)
+
+    async def close(self) -> None:
+        """Flushes waiting trades, in-progress bars and archive
+
+        Called as shutdown hook after pipeline is stopped, so bars closed by
+        the last flush and bars still in progress are persisted without
+        being analysed, raw trades are archived.
+        """
+        await self.stop()
+        if self.archive is not None:
+            self.archive.flush()
+
+    def handle(self, event: dict) -> None:
+        """Batches aggTrade event, called by connector for every frame"""
+        batch = self._batches.get(event["s"], None)
+        if batch is None:
+            batch = self._batches[event["s"]] = []
+        batch.append(event)
+
+        self._waiting += 1
+        if self._waiting >= self.batch_size:
+            self.request_flush()
+
+    async def flush(self) -> None:
+        batches, self._batches = self._batches, {}
+        self._waiting = 0
+        now = time() * 1000
+
+        closed = []
+        for pair, builders in self.builders.items():
+            events = batches.get(pair, None)
+            trades = decode(events) if events else None
+            if trades is not None:
+                self.trades += len(trades)
+                if self.archive is not None:
+                    self.archive.append(pair, trades)
+
+            for builder in builders:
+                if trades is not None:
+                    closed.extend(builder.update(pair, trades))
+                closed.extend(builder.close(pair) if self._closing else builder.flush(pair, now))
+
+        self.bars += len(closed)
+        if self._closing:
+            if closed:
+                self.client._persist(closed)
+            return
+
+        ta_stage = self.client.pipeline.stage("ta")
+        for bar in closed:
+            await ta_stage.put(bar)
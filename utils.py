@@ -1,7 +1,40 @@
+import importlib.util
 import logging
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta, timezone
 from time import time
 
+# optional faster json backend
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+
+def lazy_import(name):
+    """Imports module on first attribute access
+
+    Used for heavy modules (SQLAlchemy, TA-Lib) which only some code paths
+    need, so importing their users stays cheap. Module is a regular module
+    once loaded.
+
+    Args:
+        name (string): absolute module name e.g. "talib"
+
+    Returns:
+        module: module, loaded one if it was imported already
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
 
 # wrappers
 
@@ -9,10 +42,10 @@ def timeit(f):
     def wrapper(*a, **kw):
         now = time()
         res = f(*a, **kw)
-        print(f"Operation {f.__name__} took {time() - now} seconds")
+        setup_logging().debug("Operation %s took %s seconds", f.__name__, time() - now)
         return res
     return wrapper
-    
+
 # logging
 
 def setup_logging(name="", initial=False, prefix_path="", class_name=False):
@@ -37,6 +70,30 @@ def setup_logging(name="", initial=False, prefix_path="", class_name=False):
 
     return logger
 
+class SampledLogger:
+    """
+    Logs every n-th message, replaces per frame / per request log lines on hot path.
+
+    Messages are formatted lazily with logging %-style arguments, skipped
+    calls cost a counter increment.
+    """
+
+    def __init__(self, logger, every=1000):
+        """
+        Args:
+            logger (logging.Logger): logger sampled messages are passed to
+            every (int, optional): log one of every n messages. Defaults to 1000.
+        """
+        self.logger = logger
+        self.every = every
+        self.seen = 0
+
+    def debug(self, msg, *args):
+        self.seen += 1
+        if self.seen % self.every == 0 and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"{msg} [1 of {self.every}]", *args)
+
+
 def _get_logger_name(source, prefix_path, class_name):
     root_logger_name = "Binance_bot"
     logger_name = [root_logger_name]
@@ -61,17 +118,75 @@ def convert_timestamp(timestamp):
     # convert to integer
     timestamp = int(timestamp)
 
-    # convert to seconds from ms
-    if len(str(timestamp)) == 13:
-        timestamp = int(timestamp / 1000)
+    # convert to seconds from ms (13 digits)
+    if 1_000_000_000_000 <= timestamp < 10_000_000_000_000:
+        timestamp //= 1000
     
-    assert (len(str(timestamp)) == 10), f"Bad timestamp! {timestamp}"
+    assert 1_000_000_000 <= timestamp < 10_000_000_000, f"Bad timestamp! {timestamp}"
 
     return datetime.fromtimestamp(timestamp)
 
 # print(convert_timestamp([datetime.timestamp(datetime.now()) for i in range(10)]))
 
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def ms_to_datetime(timestamp):
+    """Converts epoch ms to UTC datetime, keeping milliseconds
+
+    Local time is ambiguous when clocks go back, stored candlesticks are keyed by UTC.
+
+    Args:
+        timestamp (int): epoch ms
+
+    Returns:
+        datetime: timezone aware UTC datetime
+    """
+    return EPOCH + timedelta(milliseconds=int(timestamp))
+
+
+def datetime_to_ms(value):
+    """Converts datetime to epoch ms, naive datetimes are taken as UTC
+
+    Args:
+        value (datetime): datetime
+
+    Returns:
+        int: epoch ms
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // timedelta(milliseconds=1)
+
+
+INTERVAL_UNITS_MS = {
+    "s": 1000,
+    "m": 60 * 1000,
+    "h": 60 * 60 * 1000,
+    "d": 24 * 60 * 60 * 1000,
+    "w": 7 * 24 * 60 * 60 * 1000,
+}
+
+def interval_to_ms(interval: str) -> int:
+    """Converts kline interval to milliseconds
+
+    Args:
+        interval (str): kline interval e.g. "15m"
+
+    Raises:
+        ValueError: interval has variable length (months) or unknown unit
+
+    Returns:
+        int: interval length in ms
+    """
+    unit = interval[-1]
+    if unit not in INTERVAL_UNITS_MS:
+        raise ValueError(f"Unsupported interval {interval}")
+
+    return int(interval[:-1]) * INTERVAL_UNITS_MS[unit]
+
+
 def from_sc_to_human(msg: str) -> str:
     """Converts snkce_case to Human readable
 